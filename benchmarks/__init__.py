@@ -0,0 +1,5 @@
+#!/usr/bin/python3
+"""
+Init file for the benchmarks package
+Run it with: python3 -m benchmarks.run --help
+"""
@@ -0,0 +1,46 @@
+#!/usr/bin/python3
+"""Compares two benchmark result files written by benchmarks.run
+
+    python3 -m benchmarks.compare old.json new.json [--threshold 1.2]
+
+Prints the time ratio (new / old) of every operation measured in both
+files and exits with status 1 if any ratio exceeds the threshold.
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    """Returns {(engine, size, op): seconds} from a result file"""
+    with open(path, "r", encoding="utf-8") as f:
+        report = json.load(f)
+    return {(r["engine"], r["size"], r["op"]): r["seconds"]
+            for r in report["results"]}
+
+
+def main(argv=None):
+    """Prints the comparison table and returns the exit status"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="new/old time ratio counted as a regression")
+    args = parser.parse_args(argv)
+    old, new = load(args.old), load(args.new)
+    status = 0
+    print("{:<6} {:>8} {:<18} {:>10} {:>10} {:>7}".format(
+        "engine", "size", "op", "old (s)", "new (s)", "ratio"))
+    for key in sorted(old.keys() & new.keys()):
+        ratio = new[key] / old[key] if old[key] else float("inf")
+        flag = ""
+        if ratio > args.threshold:
+            flag = " slower"
+            status = 1
+        print("{:<6} {:>8} {:<18} {:>10.4f} {:>10.4f} {:>7.2f}{}".format(
+            *key, old[key], new[key], ratio, flag))
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
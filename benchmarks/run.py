@@ -0,0 +1,193 @@
+#!/usr/bin/python3
+"""Runs the storage, model and console benchmarks and writes JSON results
+
+Every (engine, size) pair runs in a fresh interpreter inside a temporary
+directory, so file.json and the SQLite database stand-in for DBStorage
+never touch the working tree:
+
+    python3 -m benchmarks.run --sizes 1000 100000 --output new.json
+    python3 -m benchmarks.compare old.json new.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+from io import StringIO
+
+ENGINES = ("file", "db", "sqlite")
+SIZES = (1000, 100000, 1000000)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def timed(results, op, count, func, *args):
+    """Runs func(*args) once and records it as count operations"""
+    start = time.perf_counter()
+    func(*args)
+    seconds = time.perf_counter() - start
+    results.append({"op": op, "count": count, "seconds": seconds,
+                    "ops_per_sec": count / seconds if seconds else None})
+
+
+def make_objects(size):
+    """Builds size instances spread evenly over the six model classes"""
+    from models.amenity import Amenity
+    from models.city import City
+    from models.place import Place
+    from models.review import Review
+    from models.state import State
+    from models.user import User
+    objects = []
+    for i in range(size):
+        kind = i % 6
+        if kind == 0:
+            state = State(name="state{}".format(i))
+            obj = state
+        elif kind == 1:
+            city = City(name="city{}".format(i), state_id=state.id)
+            obj = city
+        elif kind == 2:
+            user = User(email="user{}@hbnb.io".format(i), password="pwd")
+            obj = user
+        elif kind == 3:
+            place = Place(name="place{}".format(i), city_id=city.id,
+                          user_id=user.id, price_by_night=i % 300,
+                          max_guest=i % 8, latitude=(i * 37) % 160 - 80,
+                          longitude=(i * 53) % 340 - 170)
+            obj = place
+        elif kind == 4:
+            obj = Review(text="review{}".format(i), place_id=place.id,
+                         user_id=user.id)
+        else:
+            obj = Amenity(name="amenity{}".format(i))
+        objects.append(obj)
+    return objects
+
+
+def work(size):
+    """Benchmarks models.storage at one size in this interpreter"""
+    import models
+    from console import HBNBCommand
+    from models.user import User
+    storage = models.storage
+    results = []
+    objects = make_objects(size)
+    users = [obj for obj in objects if isinstance(obj, User)][:20]
+    sample = users[0]
+
+    def add_all():
+        for obj in objects:
+            storage.new(obj)
+
+    def save_one():
+        sample.first_name = "Betty"
+        sample.save()
+
+    def reload_all():
+        fresh = type(storage)()
+        fresh.reload()
+        fresh.all()
+
+    def delete_some():
+        for obj in objects[:size // 10]:
+            storage.delete(obj)
+        storage.save()
+
+    console = HBNBCommand()
+
+    def run(commands):
+        with redirect_stdout(StringIO()):
+            for command in commands:
+                console.onecmd(command)
+
+    timed(results, "new", size, add_all)
+    timed(results, "save", 1, storage.save)
+    timed(results, "save_one_changed", 1, save_one)
+    timed(results, "reload_all", size, reload_all)
+    timed(results, "all", 1, storage.all)
+    timed(results, "all_cls", 1, storage.all, User)
+    timed(results, "count_cls", 1, storage.count, User)
+    timed(results, "to_dict", size, lambda: [o.to_dict() for o in objects])
+    timed(results, "str", size, lambda: [str(o) for o in objects])
+    if os.getenv("HBNB_TYPE_STORAGE") != "db":
+        # create takes no attributes, which the NOT NULL columns reject
+        timed(results, "console_create", 5, run, ["create User"] * 5)
+    timed(results, "console_show", len(users), run,
+          ["show User {}".format(user.id) for user in users])
+    timed(results, "console_update", 5, run,
+          ['update User {} first_name "Holberton"'.format(user.id)
+           for user in users[:5]])
+    timed(results, "console_count", 1, run, ["count User"])
+    timed(results, "console_all", 1, run, ["all User"])
+    timed(results, "delete", size // 10, delete_some)
+    return results
+
+
+def spawn(engine, size):
+    """Runs work(size) for engine in a child interpreter and returns it"""
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        env.pop("HBNB_TYPE_STORAGE", None)
+        if engine == "db":
+            env["HBNB_TYPE_STORAGE"] = "db"
+            env["HBNB_DB_URL"] = "sqlite:///" + os.path.join(tmp, "hbnb.db")
+        elif engine == "sqlite":
+            env["HBNB_TYPE_STORAGE"] = "sqlite"
+            env["HBNB_SQLITE_PATH"] = os.path.join(tmp, "hbnb.db")
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks.run", "--worker", str(size)],
+            cwd=tmp, env=env, stdout=subprocess.PIPE, check=True)
+    results = json.loads(proc.stdout.decode().splitlines()[-1])
+    for result in results:
+        result.update(engine=engine, size=size)
+    return results
+
+
+def commit():
+    """Returns the commit being measured, or None outside a checkout"""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT,
+                              stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL,
+                              check=True).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    """Parses the command line and runs the requested benchmarks"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--engines", nargs="+", choices=ENGINES,
+                        default=list(ENGINES))
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(SIZES))
+    parser.add_argument("--output", help="JSON file (default: stdout)")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.worker is not None:
+        results = work(args.worker)
+        print(json.dumps(results))
+        return
+    report = {"commit": commit(),
+              "date": datetime.now().isoformat(),
+              "python": platform.python_version(),
+              "platform": platform.platform(),
+              "results": []}
+    for engine in args.engines:
+        for size in args.sizes:
+            print("{} {}".format(engine, size), file=sys.stderr)
+            report["results"].extend(spawn(engine, size))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/python3
+"""Measures DBStorage read throughput as worker threads are added
+
+Each thread uses its own scoped session and pooled connection to a
+file-backed SQLite database in a temporary directory:
+
+    python3 -m benchmarks.threads --threads 1 2 4 8 --rows 20000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.run import ROOT
+
+THREADS = (1, 2, 4, 8)
+
+
+def work(rows, threads, ops):
+    """Seeds rows places, then times ops queries per thread count"""
+    import models
+    from models.city import City
+    from models.place import Place
+    from models.state import State
+    from models.user import User
+    storage = models.storage
+    state = State(name="CA")
+    user = User(email="bench@hbnb.io", password="pwd")
+    cities = [City(name="city{}".format(i), state_id=state.id)
+              for i in range(100)]
+    storage.bulk_new([state, user] + cities)
+    storage.bulk_new(Place(name="place{}".format(i), user_id=user.id,
+                           city_id=cities[i % 100].id, number_rooms=i % 5,
+                           number_bathrooms=1, max_guest=i % 8,
+                           price_by_night=i % 300)
+                     for i in range(rows))
+    storage.close()
+
+    def reader(index, count):
+        for i in range(count):
+            city = cities[(index * count + i) % len(cities)]
+            storage.filter(Place, city_id=city.id, max_guest=i % 8)
+            storage.query(Place, price_by_night=(i % 300, i % 300),
+                          number_rooms=(i % 5, i % 5))
+        storage.close()
+
+    results = []
+    for size in threads:
+        workers = [threading.Thread(target=reader, args=(i, ops // size))
+                   for i in range(size)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        seconds = time.perf_counter() - start
+        done = ops // size * size
+        results.append({"threads": size, "ops": done, "seconds": seconds,
+                        "ops_per_sec": done / seconds})
+    return results
+
+
+def main(argv=None):
+    """Runs the benchmark in a child interpreter and prints the table"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", nargs="+", type=int,
+                        default=list(THREADS))
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--ops", type=int, default=400)
+    parser.add_argument("--worker", action="store_true",
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.worker:
+        print(json.dumps(work(args.rows, args.threads, args.ops)))
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, PYTHONPATH=ROOT, HBNB_TYPE_STORAGE="db",
+                   HBNB_DB_URL="sqlite:///" + os.path.join(tmp, "hbnb.db"))
+        env.setdefault("HBNB_DB_POOL_SIZE", str(max(args.threads)))
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks.threads", "--worker",
+             "--rows", str(args.rows), "--ops", str(args.ops),
+             "--threads"] + [str(size) for size in args.threads],
+            cwd=tmp, env=env, stdout=subprocess.PIPE, check=True)
+    results = json.loads(proc.stdout.decode().splitlines()[-1])
+    print("{:>7} {:>6} {:>10} {:>10}".format("threads", "ops", "seconds",
+                                             "ops/s"))
+    for result in results:
+        print("{threads:>7} {ops:>6} {seconds:>10.3f} {ops_per_sec:>10.1f}"
+              .format(**result))
+
+
+if __name__ == "__main__":
+    main()
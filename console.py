@@ -1,8 +1,17 @@
 #!/usr/bin/python3
 """Defines the HBnB command interpreter."""
+import argparse
+import ast
 import cmd
+import csv
+import itertools
+import json
+import math
+import os
 import re
 import shlex
+import sys
+import time
 from models import storage
 from models.base_model import BaseModel
 from models.user import User
@@ -27,19 +36,89 @@ class HBNBCommand(cmd.Cmd):
         "Review": Review
     }
 
+    in_batch = False
+    # rows checked, then written and committed, together by import
+    chunk_size = 1000
+
     def emptyline(self):
         """Do nothing upon receiving an empty line."""
         pass
 
     def do_quit(self, arg):
         """Quit command to exit the program."""
+        if self.in_batch:
+            self.do_commit("")
         return True
 
     def do_EOF(self, arg):
         """EOF signal to exit the program."""
         print()
+        if self.in_batch:
+            self.do_commit("")
         return True
 
+    def do_begin(self, arg):
+        """Start a batch: later saves are written once at commit."""
+        if self.in_batch:
+            print("** batch already started **")
+            return
+        storage.begin()
+        self.in_batch = True
+
+    def do_commit(self, arg):
+        """Write every change made since begin in a single save."""
+        if not self.in_batch:
+            print("** no batch started **")
+            return
+        storage.commit()
+        self.in_batch = False
+
+    def do_rollback(self, arg):
+        """Discard every change made since begin."""
+        if not self.in_batch:
+            print("** no batch started **")
+            return
+        storage.rollback()
+        self.in_batch = False
+
+    def run_batch(self, lines, every=None):
+        """Run commands without a prompt, saving at the end (or every N).
+
+        A command that raises is reported on stderr with its line number
+        and the run goes on; whatever stops the run, the commands run so
+        far are committed.
+        """
+        storage.begin()
+        self.in_batch = True
+        count = 0
+        start = time.perf_counter()
+        try:
+            for number, line in enumerate(lines, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                count += 1
+                try:
+                    stop = self.onecmd(line)
+                except Exception as error:
+                    print(f"** error on line {number}: "
+                          f"{type(error).__name__}: {error} **",
+                          file=sys.stderr)
+                    continue
+                if stop:
+                    break
+                if every and count % every == 0 and self.in_batch:
+                    storage.checkpoint()
+        finally:
+            if self.in_batch:
+                storage.commit()
+                self.in_batch = False
+        seconds = time.perf_counter() - start
+        print(f"{count} commands in {seconds:.2f}s "
+              f"({count / seconds if seconds else 0:.0f} commands/s)",
+              file=sys.stderr)
+        return count
+
     def do_create(self, arg):
         """Create a new class instance and print its id."""
         args = arg.split()
@@ -65,12 +144,11 @@ class HBNBCommand(cmd.Cmd):
         if len(args) < 2:
             print("** instance id missing **")
             return
-        key = f"{args[0]}.{args[1]}"
-        all_objs = storage.all()
-        if key not in all_objs:
+        obj = storage.get(args[0], args[1])
+        if obj is None:
             print("** no instance found **")
             return
-        print(all_objs[key])
+        print(obj)
 
     def do_destroy(self, arg):
         """Delete an instance based on class name and id."""
@@ -84,29 +162,193 @@ class HBNBCommand(cmd.Cmd):
         if len(args) < 2:
             print("** instance id missing **")
             return
-        key = f"{args[0]}.{args[1]}"
-        all_objs = storage.all()
-        if key not in all_objs:
+        obj = storage.get(args[0], args[1])
+        if obj is None:
             print("** no instance found **")
             return
-        del all_objs[key]
+        storage.delete(obj)
         storage.save()
 
     def do_all(self, arg):
-        """Display all instances or all instances of a class."""
+        """Display all instances or all instances of a class.
+
+        Usage: all [<class>] [limit=N] [offset=N] [after=<key>]
+        [order=[-]<attribute>] [lines]
+        Instances are printed one at a time as they are read, as a list
+        or, with lines, one per line.
+        """
         args = arg.split()
-        all_objs = storage.all()
+        cls = None
+        if args and "=" not in args[0] and args[0] != "lines":
+            cls = args.pop(0)
+            if cls not in HBNBCommand.__classes:
+                print("** class doesn't exist **")
+                return
+        options = {}
+        lines = False
+        for option in args:
+            name, sep, value = option.partition("=")
+            if option == "lines":
+                lines = True
+            elif name in ("limit", "offset") and value.isdigit():
+                options[name] = int(value)
+            elif name == "after" and value:
+                options[name] = value
+            elif name == "order" and value.lstrip("-").isidentifier():
+                options[name] = value
+            else:
+                print("** invalid option **")
+                return
+        if "order" in options and cls is None:
+            print("** class name missing **")
+            return
+        if "order" in options and "after" in options:
+            print("** invalid option **")
+            return
+        pairs = storage.iter(cls, **options)
+        try:
+            first = next(pairs, None)
+        except AttributeError:
+            # DBStorage: order names a column the table does not have
+            print("** invalid option **")
+            return
+        pairs = itertools.chain([first] if first else [], pairs)
+        if lines:
+            for _, obj in pairs:
+                print(obj)
+            return
+        print("[", end="")
+        sep = ""
+        for _, obj in pairs:
+            print(sep + repr(str(obj)), end="")
+            sep = ", "
+        print("]")
+
+    def do_import(self, arg):
+        """Load instances of a class from a .jsonl or .csv file."""
+        args = shlex.split(arg)
         if not args:
-            print([str(obj) for obj in all_objs.values()])
+            print("** class name missing **")
             return
         if args[0] not in HBNBCommand.__classes:
             print("** class doesn't exist **")
             return
-        print([str(obj) for key, obj in all_objs.items()
-              if key.split('.')[0] == args[0]])
+        if len(args) < 2:
+            print("** file name missing **")
+            return
+        path = args[1]
+        if not path.endswith((".jsonl", ".csv")):
+            print("** unsupported file type **")
+            return
+        if not os.path.isfile(path):
+            print("** file doesn't exist **")
+            return
+        cls = HBNBCommand.__classes[args[0]]
+        start = time.perf_counter()
+        errors = []
+        with open(path, newline="", encoding="utf-8") as f:
+            count = storage.bulk_new(
+                self.__read(cls, path, f, self.chunk_size, errors),
+                chunk_size=self.chunk_size)
+        seconds = time.perf_counter() - start
+        if errors:
+            print(f"** {errors[0]} **")
+            if not count:
+                return
+        print(f"{count} rows in {seconds:.2f}s "
+              f"({count / seconds if seconds else 0:.0f} rows/s)")
 
-    def do_update(self, arg):
-        """Update an instance by adding or updating an attribute."""
+    @classmethod
+    def __read(cls, model, path, f, size, errors):
+        """Yield an instance per row of an import file, size at a time.
+
+        Every row of a chunk is checked before any is yielded. At a row
+        that is not a JSON object or that the class does not accept, or
+        at text that is not UTF-8 or not CSV, the error is added to
+        errors and the rows of its chunk are dropped.
+        """
+        if path.endswith(".csv"):
+            reader = csv.DictReader(f)
+            rows = ((reader.line_num,
+                     {key: cls.__cast(model, key, value)
+                      for key, value in row.items() if value != ""})
+                    for row in reader)
+        else:
+            reader = None
+            rows = ((number, line) for number, line in enumerate(f, 1)
+                    if line.strip())
+        chunk = []
+        try:
+            for number, row in rows:
+                try:
+                    if isinstance(row, str):
+                        row = json.loads(row)
+                    if not isinstance(row, dict):
+                        raise TypeError(row)
+                    chunk.append(model(**row))
+                except (TypeError, ValueError):
+                    errors.append(f"invalid row on line {number}")
+                    return
+                if len(chunk) >= size:
+                    yield from chunk
+                    chunk = []
+        except UnicodeDecodeError:
+            errors.append("file is not UTF-8 text")
+            return
+        except csv.Error:
+            errors.append(f"invalid row on line {reader.reader.line_num}")
+            return
+        yield from chunk
+
+    @staticmethod
+    def __cast(model, key, value):
+        """Convert a CSV cell to the type of the attribute it sets.
+
+        Only cells of attributes whose class default, or column, is an
+        int or a float are converted; every other cell stays a string.
+        """
+        table = getattr(model, "__table__", None)
+        if table is not None and key in table.columns:
+            kind = table.columns[key].type.python_type
+        else:
+            kind = type(getattr(model, key, ""))
+        if kind not in (int, float):
+            return value
+        try:
+            number = kind(value)
+        except ValueError:
+            return value
+        return number if math.isfinite(number) else value
+
+    def do_near(self, arg):
+        """Display instances of a class within a radius (km) of a point."""
+        args = arg.split()
+        if not args:
+            print("** class name missing **")
+            return
+        if args[0] not in HBNBCommand.__classes:
+            print("** class doesn't exist **")
+            return
+        if not HBNBCommand.__classes[args[0]].__geo__:
+            print("** class has no location **")
+            return
+        if len(args) < 4:
+            print("** coordinates missing **")
+            return
+        try:
+            lat, lon, radius_km = (float(value) for value in args[1:4])
+        except ValueError:
+            print("** invalid coordinates **")
+            return
+        print([str(obj) for obj in
+               storage.near(args[0], lat, lon, radius_km).values()])
+
+    def do_search(self, arg):
+        """Display the instances of a class matching words, best first.
+
+        Usage: search <class> <words>
+        A word ending with * matches every word it starts.
+        """
         args = shlex.split(arg)
         if not args:
             print("** class name missing **")
@@ -115,27 +357,57 @@ class HBNBCommand(cmd.Cmd):
             print("** class doesn't exist **")
             return
         if len(args) < 2:
-            print("** instance id missing **")
+            print("** query missing **")
             return
-        key = f"{args[0]}.{args[1]}"
-        all_objs = storage.all()
-        if key not in all_objs:
-            print("** no instance found **")
+        print([str(obj) for obj in
+               storage.search(args[0], " ".join(args[1:])).values()])
+
+    def do_update(self, arg):
+        """Update an instance from attribute/value pairs or a dictionary.
+
+        Every attribute is set before the instance is saved, once.
+        """
+        match = re.fullmatch(r"\s*(\S+)\s+(\S+)\s+(\{.*\})\s*", arg)
+        args = shlex.split(match.expand(r"\1 \2") if match else arg)
+        if not args:
+            print("** class name missing **")
             return
-        if len(args) < 3:
-            print("** attribute name missing **")
+        if args[0] not in HBNBCommand.__classes:
+            print("** class doesn't exist **")
             return
-        if len(args) < 4:
-            print("** value missing **")
+        if len(args) < 2:
+            print("** instance id missing **")
             return
-        obj = all_objs[key]
-        attr_name = args[2]
-        attr_value = args[3]
-        try:
-            attr_value = eval(attr_value)
-        except (NameError, SyntaxError):
-            pass
-        setattr(obj, attr_name, attr_value)
+        obj = storage.get(args[0], args[1])
+        if obj is None:
+            print("** no instance found **")
+            return
+        if match:
+            try:
+                attrs = ast.literal_eval(match.group(3))
+            except (ValueError, SyntaxError):
+                attrs = None
+            if not (isinstance(attrs, dict) and
+                    all(isinstance(key, str) and key.isidentifier()
+                        for key in attrs)):
+                print("** invalid dictionary **")
+                return
+        else:
+            if len(args) < 3:
+                print("** attribute name missing **")
+                return
+            if len(args) % 2:
+                print("** value missing **")
+                return
+            attrs = {}
+            for attr_name, attr_value in zip(args[2::2], args[3::2]):
+                try:
+                    attr_value = ast.literal_eval(attr_value)
+                except (ValueError, SyntaxError):
+                    pass
+                attrs[attr_name] = attr_value
+        for attr_name, attr_value in attrs.items():
+            setattr(obj, attr_name, attr_value)
         obj.save()
 
     def default(self, arg):
@@ -145,7 +417,9 @@ class HBNBCommand(cmd.Cmd):
             "count": self.do_count,
             "show": self.do_show,
             "destroy": self.do_destroy,
-            "update": self.do_update
+            "update": self.do_update,
+            "near": self.do_near,
+            "search": self.do_search
         }
         match = re.fullmatch(r"(\w+)\.(\w+)\((.*)\)", arg)
         if not match:
@@ -153,21 +427,45 @@ class HBNBCommand(cmd.Cmd):
         class_name, method_name, args_str = match.groups()
         if method_name not in methods:
             return super().default(arg)
-        if method_name in ["all", "count"]:
+        if method_name == "count":
             return methods[method_name](class_name)
-        args = args_str.split(", ")
-        if len(args) == 1 and args[0].strip('"') == "":
-            args = []
-        elif len(args) >= 1:
-            args[0] = args[0].strip('"\'')
-        if method_name in ["show", "destroy"]:
-            return methods[method_name](f"{class_name} {args[0]}")
+        attrs = ""
         if method_name == "update":
-            if len(args) >= 2:
-                args[1] = args[1].strip('"\'')
-            if len(args) >= 3:
-                args[2] = args[2].strip('"\'')
-            return methods[method_name](f"{class_name} {' '.join(args)}")
+            # <class>.update(id, {dict}): hand the dictionary over as is
+            dict_match = re.fullmatch(r"([^{]*?),\s*(\{.*\})\s*", args_str)
+            if dict_match:
+                args_str, attrs = dict_match.groups()
+        lexer = shlex.shlex(args_str, posix=True)
+        lexer.whitespace = ", \t"
+        lexer.whitespace_split = True
+        args = list(lexer)
+        if not args or args[0] == "":
+            return methods[method_name](class_name)
+        args = " ".join(shlex.quote(arg) for arg in args)
+        return methods[method_name](f"{class_name} {args} {attrs}".strip())
+
+    def do_stats(self, arg):
+        """Display storage operation latencies and counters.
+
+        Usage: stats [reset]
+        Needs HBNB_METRICS=1; reset starts the metrics over once shown.
+        """
+        if arg.strip() not in ("", "reset"):
+            print("** invalid option **")
+            return
+        data = storage.metrics(reset=arg.strip() == "reset")
+        if not data:
+            print("** metrics disabled **")
+            return
+        print(f"{'operation':<10} {'calls':>8} {'total s':>9} "
+              f"{'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+              f"{'max ms':>9}")
+        for name, op in sorted(data["operations"].items()):
+            print(f"{name:<10} {op['count']:>8} {op['total']:>9.3f} "
+                  + " ".join(f"{op[field] * 1000:>9.3f}" for field in
+                             ("mean", "p50", "p95", "p99", "max")))
+        for name, value in sorted(data["counters"].items()):
+            print(f"{name} {value}")
 
     def do_count(self, arg):
         """Count the number of instances of a class."""
@@ -178,9 +476,27 @@ class HBNBCommand(cmd.Cmd):
         if args[0] not in HBNBCommand.__classes:
             print("** class doesn't exist **")
             return
-        count = sum(1 for key in storage.all() if key.split('.')[0] == args[0])
-        print(count)
+        print(storage.count(args[0]))
+
+
+def main(argv=None):
+    """Run the interpreter, or the commands of a file with --batch."""
+    parser = argparse.ArgumentParser(description="HBNB console")
+    parser.add_argument("--batch", metavar="FILE", nargs="?", const="-",
+                        help="run the commands of FILE (default: stdin) "
+                             "and save once at the end")
+    parser.add_argument("--every", metavar="N", type=int,
+                        help="with --batch, also save every N commands")
+    args = parser.parse_args(argv)
+    console = HBNBCommand()
+    if args.batch is None:
+        console.cmdloop()
+    elif args.batch == "-":
+        console.run_batch(sys.stdin, args.every)
+    else:
+        with open(args.batch, "r", encoding="utf-8") as f:
+            console.run_batch(f, args.every)
 
 
 if __name__ == '__main__':
-    HBNBCommand().cmdloop()
+    main()
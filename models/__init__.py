@@ -6,6 +6,10 @@ if os.getenv("HBNB_TYPE_STORAGE") == "db":
     from models.engine.db_storage import DBStorage
     storage = DBStorage()
     storage.reload()
+elif os.getenv("HBNB_TYPE_STORAGE") == "sqlite":
+    from models.engine.sqlite_storage import SQLiteStorage
+    storage = SQLiteStorage()
+    storage.reload()
 else:
     from models.engine.file_storage import FileStorage
     storage = FileStorage()
@@ -1,8 +1,14 @@
 #!/usr/bin/python3
 """Amenity class that inherits from BaseModel"""
-from models.base_model import BaseModel
+from os import getenv
+from sqlalchemy import Column, String
+from models.base_model import BaseModel, Base
 
 
-class Amenity(BaseModel):
+class Amenity(BaseModel, Base):
     """Amenity class with public attribute name"""
-    name = ""
+    if getenv("HBNB_TYPE_STORAGE") == "db":
+        __tablename__ = "amenities"
+        name = Column(String(128), nullable=False)
+    else:
+        name = ""
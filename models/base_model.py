@@ -2,15 +2,38 @@
 """This module defines a base class for all models in our hbnb clone"""
 from sqlalchemy.ext.declarative import declarative_base
 import uuid
+import weakref
 import models
 from datetime import datetime
 from sqlalchemy import Column, Integer, String, DateTime
+from os import getenv
 
-Base = declarative_base()
+if getenv("HBNB_TYPE_STORAGE") == "db":
+    Base = declarative_base()
+else:
+    Base = object
 
 
 class BaseModel:
-    """A base class for all hbnb models"""
+    """A base class for all hbnb models
+
+    Assigning any attribute sets _changed, which storage engines clear
+    once they have serialized the instance. In-place changes to mutable
+    attributes are not seen; save() always flags the instance.
+    Assigning an attribute listed in __indexes__, __columns__, __geo__
+    or __text__ also calls reindex() on every storage in _storages, so
+    the ones holding the instance move it in their indexes, which keep
+    relationship properties such as State.cities current.
+    Storages with an open batch add themselves to _batches, and are
+    told of an instance before it changes so they can roll it back.
+    """
+    __slots__ = ("__dict__", "__weakref__", "_changed")
+    __indexes__ = ()
+    __columns__ = ()
+    __geo__ = ()
+    __text__ = ()
+    _batches = []
+    _storages = weakref.WeakSet()
     id = Column(String(60), primary_key=True, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow(), nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow(), nullable=False)
@@ -20,7 +43,7 @@ class BaseModel:
         if kwargs:
             for key, value in kwargs.items():
                 if key == "created_at" or key == "updated_at":
-                    value = datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%f")
+                    value = datetime.fromisoformat(value)
                 if key != "__class__":
                     setattr(self, key, value)
             if "id" not in kwargs:
@@ -34,6 +57,41 @@ class BaseModel:
             self.created_at = datetime.now()
             self.updated_at = datetime.now()
 
+    @classmethod
+    def from_dict(cls, dictionary):
+        """Rebuilds an instance from to_dict() output in one step
+
+        Skips the per-key setattr loop of __init__ and parses the dates
+        with datetime.fromisoformat; used by FileStorage.reload().
+        """
+        if getattr(cls, "__table__", None) is not None:
+            return cls(**dictionary)
+        obj = cls.__new__(cls)
+        attrs = obj.__dict__
+        attrs.update(dictionary)
+        attrs.pop("__class__", None)
+        try:
+            attrs["created_at"] = datetime.fromisoformat(attrs["created_at"])
+            attrs["updated_at"] = datetime.fromisoformat(attrs["updated_at"])
+            attrs["id"]
+        except KeyError:
+            return cls(**dictionary)
+        obj._changed = False
+        return obj
+
+    def __setattr__(self, name, value):
+        """Sets an attribute and flags the instance as changed"""
+        if name != "_changed":
+            for storage in BaseModel._batches:
+                storage.touch(self)
+        super().__setattr__(name, value)
+        if name != "_changed":
+            super().__setattr__("_changed", True)
+            if (name in self.__indexes__ or name in self.__columns__ or
+                    name in self.__geo__ or name in self.__text__):
+                for storage in list(BaseModel._storages):
+                    storage.reindex(self)
+
     def __str__(self):
         """Returns a string representation of the instance"""
         cls = (str(type(self)).split('.')[-1]).split('\'')[0]
@@ -55,6 +113,8 @@ class BaseModel:
         dictionary['updated_at'] = self.updated_at.isoformat()
         if '_sa_instance_state' in dictionary.keys():
             del dictionary['_sa_instance_state']
+            for name in type(self).__mapper__.relationships.keys():
+                dictionary.pop(name, None)
         return dictionary
 
     def delete(self):
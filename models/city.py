@@ -1,9 +1,18 @@
 #!/usr/bin/python3
 """City class that inherits from BaseModel"""
-from models.base_model import BaseModel
+from os import getenv
+from sqlalchemy import Column, ForeignKey, String
+from models.base_model import BaseModel, Base
 
 
-class City(BaseModel):
+class City(BaseModel, Base):
     """City class with public attributes state_id and name"""
-    state_id = ""
-    name = ""
+    __indexes__ = ("state_id",)
+    if getenv("HBNB_TYPE_STORAGE") == "db":
+        __tablename__ = "cities"
+        state_id = Column(String(60), ForeignKey("states.id"),
+                          nullable=False, index=True)
+        name = Column(String(128), nullable=False)
+    else:
+        state_id = ""
+        name = ""
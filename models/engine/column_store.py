@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+"""Defines the ColumnStore class used by storage for range queries"""
+from array import array
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class ColumnStore:
+    """Keeps numeric attributes of one class in parallel float arrays
+
+    Row i of every column belongs to keys[i]; removing a row moves the
+    last row into its place so the arrays stay dense. Values that are
+    not numbers are stored as NaN and never match a range. Queries are
+    evaluated as NumPy masks when NumPy is installed.
+    """
+
+    def __init__(self, fields):
+        """Creates one empty column per field name"""
+        self.fields = tuple(fields)
+        self.keys = []
+        self.rows = {}
+        self.columns = {field: array('d') for field in self.fields}
+
+    def __len__(self):
+        """Returns the number of rows"""
+        return len(self.keys)
+
+    def set(self, key, obj):
+        """Inserts or refreshes the row of key from obj's attributes"""
+        row = self.rows.get(key)
+        if row is None:
+            self.rows[key] = len(self.keys)
+            self.keys.append(key)
+            for field, column in self.columns.items():
+                column.append(self.__number(getattr(obj, field, None)))
+        else:
+            for field, column in self.columns.items():
+                column[row] = self.__number(getattr(obj, field, None))
+
+    def remove(self, key):
+        """Drops the row of key, if any"""
+        row = self.rows.pop(key, None)
+        if row is None:
+            return
+        last = self.keys.pop()
+        if last != key:
+            self.keys[row] = last
+            self.rows[last] = row
+        for column in self.columns.values():
+            value = column.pop()
+            if last != key:
+                column[row] = value
+
+    def query(self, **ranges):
+        """Returns the keys whose fields lie in the (low, high) ranges
+
+        Both bounds are inclusive and either may be None.
+        """
+        for field in ranges:
+            if field not in self.columns:
+                raise KeyError(field)
+        if numpy is not None:
+            mask = numpy.ones(len(self.keys), dtype=bool)
+            for field, (low, high) in ranges.items():
+                column = numpy.frombuffer(self.columns[field],
+                                          dtype=numpy.float64)
+                if low is not None:
+                    mask &= column >= low
+                if high is not None:
+                    mask &= column <= high
+            return [self.keys[row] for row in numpy.flatnonzero(mask)]
+        rows = range(len(self.keys))
+        for field, (low, high) in ranges.items():
+            column = self.columns[field]
+            if low is not None:
+                rows = [row for row in rows if column[row] >= low]
+            if high is not None:
+                rows = [row for row in rows if column[row] <= high]
+        return [self.keys[row] for row in rows]
+
+    @staticmethod
+    def __number(value):
+        """Returns value as a float, or NaN if it is not a number"""
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return float('nan')
@@ -1,9 +1,19 @@
 #!/usr/bin/python3
 """ new class for sqlAlchemy """
+import math
+import threading
+from contextlib import contextmanager
 from os import getenv
 from sqlalchemy.orm import sessionmaker, scoped_session
-from sqlalchemy import (create_engine)
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy import (create_engine, event, or_)
 from models.base_model import Base
+from models.engine.geo_index import EARTH_RADIUS_KM, bounds, distance
+from models.engine.lru_cache import LRUCache
+from models.engine.metrics import Metrics, instrument
+from models.engine.text_index import QUERY_WORD, TextIndex
 from models.state import State
 from models.city import City
 from models.user import User
@@ -11,9 +21,38 @@ from models.place import Place
 from models.review import Review
 from models.amenity import Amenity
 
+classes = {
+    "Amenity": Amenity,
+    "City": City,
+    "Place": Place,
+    "Review": Review,
+    "State": State,
+    "User": User
+}
+
+caches = {}
+caches_lock = threading.Lock()
+
 
 class DBStorage:
-    """ create tables in environmental"""
+    """ create tables in environmental
+
+    __session is a scoped_session registry: each thread that uses the
+    storage gets its own session and pooled connection, and its own batch
+    depth. The pool is sized by HBNB_DB_POOL_SIZE, HBNB_DB_MAX_OVERFLOW,
+    HBNB_DB_POOL_TIMEOUT and HBNB_DB_POOL_RECYCLE when they are set.
+
+    get() is fronted by an LRUCache of the column values of the last
+    HBNB_DB_CACHE_SIZE rows it loaded (1024 by default). There is one
+    cache per database URL in the process, shared by every thread and
+    every DBStorage on that URL. A flush or commit from any thread drops
+    the rows it changed or deleted, and delete() drops its row at once.
+    A hit is attached to the calling thread's session without a query;
+    cache_info() returns the hit and miss counters.
+
+    With HBNB_METRICS=1 the public operations are timed and the SQL
+    statements run are counted; see metrics().
+    """
     __engine = None
     __session = None
 
@@ -24,60 +63,398 @@ class DBStorage:
         host = getenv("HBNB_MYSQL_HOST")
         env = getenv("HBNB_ENV")
 
-        self.__engine = create_engine('mysql+mysqldb://{}:{}@{}/{}'
-                                      .format(user, passwd, host, db),
-                                      pool_pre_ping=True)
+        url = getenv("HBNB_DB_URL")
+        if not url:
+            url = 'mysql+mysqldb://{}:{}@{}/{}'.format(user, passwd, host, db)
+        pool = {}
+        for option in ("pool_size", "max_overflow", "pool_timeout",
+                       "pool_recycle"):
+            value = getenv("HBNB_DB_" + option.upper())
+            if value:
+                pool[option] = int(value)
+        self.__engine = create_engine(url, pool_pre_ping=True, **pool)
+        self.__local = threading.local()
+        with caches_lock:
+            if url not in caches:
+                caches[url] = LRUCache(int(getenv("HBNB_DB_CACHE_SIZE",
+                                                  1024)))
+            self.__cache = caches[url]
+        self.__metrics = None
+        if getenv("HBNB_METRICS") == "1":
+            self.__metrics = Metrics()
+            instrument(self, self.__metrics)
+            event.listen(self.__engine, "before_cursor_execute",
+                         self.__count_statement)
 
         if env == "test":
             Base.metadata.drop_all(self.__engine)
+            self.__cache.clear()
 
     def all(self, cls=None):
         """returns a dictionary
         Return:
             returns a dictionary of __object
         """
-        dic = {}
+        return dict(self.iter(cls))
+
+    def get(self, cls, id):
+        """returns the row of cls with that primary key, or None
+        """
+        cls = self.__class(cls)
+        if cls is None:
+            return None
+        session = self.__session
+        cache = self.__cache
+        key = "{}.{}".format(cls.__name__, id)
+        version = cache.version
+        row = cache.get(key)
+        if row is not None:
+            obj = session.identity_map.get(identity_key(cls, id))
+            if obj is None:
+                obj = cls.__mapper__.class_manager.new_instance()
+                for name, value in row.items():
+                    set_committed_value(obj, name, value)
+                make_transient_to_detached(obj)
+                session.add(obj)
+            return obj
+        obj = session.get(cls, id)
+        if (obj is not None and not self.__batch_depth and
+                obj not in session.dirty and obj not in session.new and
+                key not in session.info.get("stale", ())):
+            cache.put(key, {attr.key: getattr(obj, attr.key)
+                            for attr in cls.__mapper__.column_attrs},
+                      version)
+        return obj
+
+    def cache_info(self):
+        """returns the get() cache counters, shared by every thread
+        """
+        return self.__cache.info()
+
+    def metrics(self, reset=False):
+        """returns the counters and operation latencies, {} if disabled;
+        reset starts them over once they are read
+        """
+        if self.__metrics is None:
+            return {}
+        data = self.__metrics.snapshot()
+        if reset:
+            self.__metrics.reset()
+        return data
+
+    @staticmethod
+    def __class(cls):
+        """returns the mapped class of a class or class name, or None
+        for one without a table, such as BaseModel
+        """
+        name = cls if isinstance(cls, str) else cls.__name__
+        return classes.get(name)
+
+    def __count_statement(self, conn, cursor, statement, parameters,
+                          context, executemany):
+        """counts an SQL statement, and its rows when run as executemany
+        """
+        self.__metrics.add("statements")
+        if executemany:
+            self.__metrics.add("statement_rows", len(parameters))
+
+    def iter(self, cls=None, batch_size=1000, limit=None, offset=0,
+             after=None, order=None):
+        """yields (key, obj) pairs of one class, or of all, ordered by key
+
+        Rows are streamed from a server-side cursor batch_size at a time.
+        limit and offset page through the pairs and after resumes past
+        the last key of a previous page without scanning the skipped rows.
+        order ("attr" or "-attr" for descending) sorts one class by a
+        column instead; it cannot be combined with after.
+        """
+        if order and (not cls or after):
+            raise ValueError("order needs a class and no after key")
+        if cls:
+            cls = self.__class(cls)
+            lista = [] if cls is None else [cls]
+        else:
+            lista = sorted(classes.values(), key=lambda clase: clase.__name__)
+        for clase in lista:
+            if limit is not None and limit <= 0:
+                return
+            name = clase.__name__
+            query = self.__session.query(clase)
+            if after:
+                after_name, after_id = after.split('.', 1)
+                if name < after_name:
+                    continue
+                if name == after_name:
+                    query = query.filter(clase.id > after_id)
+            if offset:
+                total = query.count()
+                if total <= offset:
+                    offset -= total
+                    continue
+            if order:
+                column = getattr(clase, order.lstrip('-'))
+                if order.startswith('-'):
+                    column = column.desc()
+                query = query.order_by(column, clase.id)
+            else:
+                query = query.order_by(clase.id)
+            query = query.offset(offset or None)
+            offset = 0
+            if limit is not None:
+                query = query.limit(limit)
+            query = query.execution_options(stream_results=True)
+            for elem in query.yield_per(batch_size):
+                if limit is not None:
+                    limit -= 1
+                yield "{}.{}".format(name, elem.id), elem
+
+    def count(self, cls=None):
+        """returns the number of rows of one class, or of every class
+        """
         if cls:
-            if isinstance(cls, str):
-                cls = eval(cls)
-            query = self.__session.query(cls)
-            for elem in query:
-                key = "{}.{}".format(type(elem).__name__, elem.id)
-                dic[key] = elem
+            cls = self.__class(cls)
+            if cls is None:
+                return 0
+            return self.__session.query(cls).count()
+        return sum(self.__session.query(clase).count()
+                   for clase in classes.values())
+
+    def filter(self, cls, **equals):
+        """returns a dictionary of the rows of cls whose columns equal
+        the given values, using the database indexes on foreign keys
+        """
+        cls = self.__class(cls)
+        if cls is None:
+            return {}
+        dic = {}
+        for elem in self.__session.query(cls).filter_by(**equals):
+            key = "{}.{}".format(type(elem).__name__, elem.id)
+            dic[key] = elem
+        return (dic)
+
+    def query(self, cls, **ranges):
+        """returns a dictionary of the rows of cls whose columns lie in
+        the inclusive (low, high) ranges; None leaves a bound open
+        """
+        cls = self.__class(cls)
+        if cls is None:
+            return {}
+        query = self.__session.query(cls)
+        for attr, (low, high) in ranges.items():
+            column = getattr(cls, attr)
+            if low is not None:
+                query = query.filter(column >= low)
+            if high is not None:
+                query = query.filter(column <= high)
+        dic = {}
+        for elem in query:
+            key = "{}.{}".format(type(elem).__name__, elem.id)
+            dic[key] = elem
+        return (dic)
+
+    def within(self, cls, south, west, north, east):
+        """returns a dictionary of the rows of cls inside a bounding box;
+        west greater than east crosses the antimeridian, and a class
+        without __geo__ has no rows there
+        """
+        cls = self.__class(cls)
+        if cls is None or not cls.__geo__:
+            return {}
+        lat, lon = (getattr(cls, attr) for attr in cls.__geo__)
+        query = self.__session.query(cls).filter(lat.between(south, north))
+        if west <= east:
+            query = query.filter(lon.between(west, east))
         else:
-            lista = [State, City, User, Place, Review, Amenity]
-            for clase in lista:
-                query = self.__session.query(clase)
-                for elem in query:
-                    key = "{}.{}".format(type(elem).__name__, elem.id)
-                    dic[key] = elem
+            query = query.filter(or_(lon >= west, lon <= east))
+        dic = {}
+        for elem in query:
+            key = "{}.{}".format(type(elem).__name__, elem.id)
+            dic[key] = elem
         return (dic)
 
+    def near(self, cls, lat, lon, radius_km):
+        """returns a dictionary of the rows of cls within radius_km of a
+        point, closest first
+        """
+        cls = self.__class(cls)
+        if cls is None or not cls.__geo__:
+            return {}
+        south, west, north, east = bounds(lat, lon, radius_km)
+        if east - west < 360:
+            if west < -180:
+                west += 360
+            if east > 180:
+                east -= 360
+        lat_attr, lon_attr = cls.__geo__
+        found = []
+        for key, elem in self.within(cls, south, west, north, east).items():
+            km = distance(lat, lon, getattr(elem, lat_attr),
+                          getattr(elem, lon_attr))
+            if km <= radius_km:
+                found.append((km, key, elem))
+        found.sort(key=lambda item: item[:2])
+        return {key: elem for _, key, elem in found}
+
+    def nearest(self, cls, lat, lon, k=1):
+        """returns a dictionary of the k rows of cls closest to a point,
+        widening the search radius until k rows are found
+        """
+        radius_km = 1.0
+        while True:
+            dic = self.near(cls, lat, lon, radius_km)
+            if len(dic) >= k or radius_km > math.pi * EARTH_RADIUS_KM:
+                return dict(list(dic.items())[:k])
+            radius_km *= 4
+
+    def search(self, cls, query, limit=None):
+        """returns a dictionary of the rows of cls matching the words of
+        query, best first: the rows holding any word in their __text__
+        columns are read with LIKE and ranked by a TextIndex over them
+        """
+        cls = self.__class(cls)
+        words = [word.rstrip('*') for word in
+                 QUERY_WORD.findall(query.lower())]
+        if cls is None or not cls.__text__ or not words:
+            return {}
+        index = TextIndex(cls.__text__)
+        dic = {}
+        for elem in self.__session.query(cls).filter(or_(
+                *(getattr(cls, field).ilike('%{}%'.format(word))
+                  for field in cls.__text__ for word in words))):
+            key = "{}.{}".format(type(elem).__name__, elem.id)
+            dic[key] = elem
+            index.set(key, elem)
+        return {key: dic[key] for _, key in
+                index.search(query, limit, total=self.count(cls))}
+
     def new(self, obj):
         """add a new element in the table
         """
         self.__session.add(obj)
 
+    def bulk_new(self, objects, chunk_size=1000):
+        """insert objects with one executemany per class and chunk
+
+        Each chunk is committed unless a batch is open. The rows bypass
+        the session, so the objects are not attached to it afterwards.
+        Returns the number of objects inserted.
+        """
+        total = 0
+        chunk = []
+        for obj in objects:
+            chunk.append(obj)
+            if len(chunk) >= chunk_size:
+                total += self.__insert(chunk)
+                chunk = []
+        if chunk:
+            total += self.__insert(chunk)
+        return total
+
+    def __insert(self, chunk):
+        """insert one chunk of objects and commit it"""
+        rows = {}
+        for obj in chunk:
+            table = type(obj).__table__
+            rows.setdefault(table, []).append(
+                {column.key: getattr(obj, column.key, None)
+                 for column in table.columns})
+        for table, values in rows.items():
+            self.__session.execute(table.insert(), values)
+        if not self.__batch_depth:
+            self.__session.commit()
+        return len(chunk)
+
     def save(self):
-        """save changes
+        """save changes, or only flush them while a batch is open
         """
-        self.__session.commit()
+        if self.__batch_depth:
+            self.__session.flush()
+        else:
+            self.__session.commit()
+
+    def begin(self):
+        """start a batch: save() flushes without committing
+        """
+        self.__batch_depth += 1
+
+    def commit(self):
+        """end a batch, committing once when the outermost one ends
+        """
+        if self.__batch_depth:
+            self.__batch_depth -= 1
+            if not self.__batch_depth:
+                self.__session.commit()
+
+    def checkpoint(self):
+        """commit what the open batch wrote so far, keeping it open
+        """
+        if self.__batch_depth:
+            self.__session.commit()
+
+    def rollback(self):
+        """abandon every open batch and roll the session back
+        """
+        if self.__batch_depth:
+            self.__batch_depth = 0
+            self.__session.rollback()
+
+    @contextmanager
+    def batch(self):
+        """defer the commit to the end of the block, rolling back on error
+        """
+        self.begin()
+        try:
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        self.commit()
 
     def delete(self, obj=None):
         """delete an element in the table
         """
         if obj:
-            self.session.delete(obj)
+            self.__session.delete(obj)
+            self.__cache.discard(
+                "{}.{}".format(type(obj).__name__, obj.id))
 
     def reload(self):
         """configuration
         """
         Base.metadata.create_all(self.__engine)
         sec = sessionmaker(bind=self.__engine, expire_on_commit=False)
-        Session = scoped_session(sec)
-        self.__session = Session()
+        event.listen(sec, "after_flush", self.__flushed)
+        event.listen(sec, "after_commit", self.__ended)
+        event.listen(sec, "after_rollback", self.__ended)
+        self.__session = scoped_session(sec)
+
+    def __flushed(self, session, context):
+        """drops the rows a flush changed or deleted from the get() cache
+        and remembers them to drop again once they are committed
+        """
+        keys = session.info.setdefault("stale", set())
+        for obj in list(session.dirty) + list(session.deleted):
+            keys.add("{}.{}".format(type(obj).__name__, obj.id))
+        self.__cache.discard(*keys)
+
+    def __ended(self, session):
+        """drops the flushed rows again once the transaction ends, in
+        case another thread cached their old values in between
+        """
+        self.__cache.discard(*session.info.pop("stale", ()))
 
     def close(self):
-        """ calls remove()
+        """ calls remove() on the session of the calling thread
         """
-        self.__session.close()
+        self.__session.remove()
+        self.__local.batch_depth = 0
+
+    @property
+    def __batch_depth(self):
+        """the batch depth of the calling thread"""
+        return getattr(self.__local, "batch_depth", 0)
+
+    @__batch_depth.setter
+    def __batch_depth(self, value):
+        """sets the batch depth of the calling thread"""
+        self.__local.batch_depth = value
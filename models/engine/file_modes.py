@@ -0,0 +1,524 @@
+#!/usr/bin/python3
+"""Defines how FileStorage reads and writes its data files
+
+FileStorage keeps the objects and their indexes in memory; the mode it
+is created with decides how save() and reload() reach the disk. A mode
+only talks to its storage through the underscore methods FileStorage
+keeps for them, such as _objects(), _take_changes() and _put().
+"""
+import atexit
+import json
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+JOURNAL_LIMIT = 4 * 1024 * 1024
+
+
+def make_mode(storage, journal=False, journal_limit=JOURNAL_LIMIT,
+              shared=False, write_behind=0, shards=0, workers=None,
+              lazy=False, snapshot=False):
+    """Returns the mode of a storage for its settings
+
+    The journal, shared, write-behind, sharded and snapshot modes each
+    write the data files their own way, so at most one of them can be
+    set; lazy loading works with any of them.
+    """
+    chosen = [name for name, value in (("journal", journal),
+                                       ("shared", shared),
+                                       ("write-behind", write_behind),
+                                       ("sharded", shards),
+                                       ("snapshot", snapshot)) if value]
+    if len(chosen) > 1:
+        raise ValueError("the {} modes cannot be combined".format(
+            " and ".join(chosen)))
+    if journal:
+        return Journal(storage, journal_limit)
+    if shared:
+        return Shared(storage)
+    if write_behind:
+        return WriteBehind(storage, write_behind)
+    if shards:
+        return Sharded(storage, shards, workers, lazy)
+    if snapshot:
+        return Snapshot(storage)
+    return FileMode(storage)
+
+
+def records(f):
+    """Yields (key, raw JSON text or dict) from an open file"""
+    first = f.readline()
+    if first.strip() != '{':
+        # not written one record per line: parse it whole instead
+        f.seek(0)
+        yield from json.load(f).items()
+        return
+    decoder = json.JSONDecoder()
+    for line in f:
+        if not line.startswith('"'):
+            continue
+        key, end = decoder.raw_decode(line)
+        text = line[end:].strip()
+        yield key, text[1:].rstrip(',').strip()
+
+
+class FileMode:
+    """Rewrites the whole JSON file on save and reads it on reload
+
+    tracks tells FileStorage to record the keys passed to new() and
+    delete() for _take_changes().
+    """
+    tracks = False
+
+    def __init__(self, storage):
+        """Creates the mode of storage"""
+        self.storage = storage
+
+    def load(self):
+        """Reads the data files into the storage"""
+        self.storage._load()
+
+    def save(self):
+        """Writes the data files, then the text indexes matching them"""
+        self.write()
+        self.storage._save_text()
+
+    def write(self):
+        """Writes every object to the JSON file"""
+        self.storage._dump(self.storage._path())
+
+    def flush(self):
+        """Blocks until every save is written; they already are"""
+
+    def stop(self):
+        """Stops any background work; there is none"""
+
+    def files(self):
+        """Returns the data files beside the JSON file, journal and
+        snapshot, for the stamp of the text indexes
+        """
+        return []
+
+
+class Journal(FileMode):
+    """Appends the changed objects to <file_path>.log on save
+
+    reload() replays the log over the JSON file, and the JSON file is
+    rewritten (compacted) once the log grows past limit bytes.
+    """
+    tracks = True
+
+    def __init__(self, storage, limit=JOURNAL_LIMIT):
+        """Creates the journal mode of storage"""
+        super().__init__(storage)
+        self.limit = limit
+
+    def load(self):
+        """Reads the JSON file, then replays the journal"""
+        self.storage._load()
+        self.replay()
+
+    def write(self):
+        """Appends one record per changed object, compacting if needed
+
+        Those are the objects passed to new() or delete() since the last
+        save, and the stored objects assigned an attribute since.
+        """
+        storage = self.storage
+        changes = storage._take_changes()
+        for key, obj in storage._objects().items():
+            if key not in changes and getattr(obj, '_changed', True):
+                changes[key] = obj
+        lines = []
+        for key, obj in changes.items():
+            if obj is None:
+                record = json.dumps({"op": "delete", "key": key})
+            else:
+                record = '{"op": "new", "key": %s, "obj": %s}' % (
+                    json.dumps(key), storage._encode(key, obj))
+            lines.append(record + '\n')
+        if not lines:
+            return
+        with open(storage._path('.log'), 'a', encoding='utf-8') as f:
+            start = f.tell()
+            f.writelines(lines)
+            size = f.tell()
+        storage._io("bytes_written", size - start)
+        if size > self.limit:
+            storage.compact()
+
+    def replay(self):
+        """Applies the journal records on top of the loaded JSON file"""
+        storage = self.storage
+        try:
+            with open(storage._path('.log'), 'r', encoding='utf-8') as f:
+                storage._io("bytes_read", os.fstat(f.fileno()).st_size)
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # torn final record from an interrupted append
+                        break
+                    if record["op"] == "delete":
+                        storage._drop(record["key"])
+                    else:
+                        storage._put(record["key"], record["obj"])
+        except FileNotFoundError:
+            pass
+
+
+class Shared(FileMode):
+    """Lets several processes save to one JSON file
+
+    save() holds an fcntl lock on <file_path>.lock, merges what other
+    processes wrote since this one last read the file, and replaces the
+    file atomically through a temporary file.
+    """
+    tracks = True
+
+    def __init__(self, storage):
+        """Creates the shared mode of storage"""
+        if fcntl is None:
+            raise RuntimeError("shared mode needs fcntl file locks")
+        super().__init__(storage)
+        self.stamp = None
+
+    def load(self):
+        """Reads the JSON file and notes which version it was"""
+        self.storage._load()
+        self.stamp = self.file_stamp()
+
+    def save(self):
+        """Merges, then writes the file and text indexes under the lock"""
+        storage = self.storage
+        with self.locked():
+            self.merge(storage._take_changes())
+            tmp_path = storage._path('.{}.tmp'.format(os.getpid()))
+            storage._dump(tmp_path)
+            os.replace(tmp_path, storage._path())
+            self.stamp = self.file_stamp()
+            storage._save_text()
+
+    @contextmanager
+    def locked(self):
+        """Holds an exclusive lock on <file_path>.lock"""
+        with open(self.storage._path('.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def file_stamp(self):
+        """Returns what identifies the current version of the file"""
+        try:
+            st = os.stat(self.storage._path())
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def merge(self, changes):
+        """Folds in what other processes saved since the file was read
+
+        changes holds the keys passed to new() or delete() here since
+        then. Objects changed here and on disk keep the newer updated_at;
+        objects only changed on disk, added or deleted there, follow it.
+        """
+        if self.file_stamp() == self.stamp:
+            return
+        storage = self.storage
+        try:
+            with open(storage._path(), 'r', encoding='utf-8') as f:
+                storage._io("bytes_read", os.fstat(f.fileno()).st_size)
+                disk = json.load(f)
+        except FileNotFoundError:
+            disk = {}
+        for key in storage._keys():
+            if key not in disk and key not in changes:
+                storage._drop(key)
+        objects = storage._objects()
+        for key, val in disk.items():
+            obj = objects.get(key)
+            if key in changes:
+                mine = changes[key]
+                if mine is None:
+                    continue
+                if val.get('updated_at', '') <= mine.updated_at.isoformat():
+                    continue
+            elif obj is not None:
+                if val.get('updated_at') == obj.updated_at.isoformat():
+                    continue
+            storage._put(key, val)
+
+
+class WriteBehind(FileMode):
+    """Writes the JSON file from a background thread
+
+    save() only encodes the objects passed to new() since the last save
+    and wakes the flusher thread, which writes at most once per interval
+    seconds from a copy of the store.
+    """
+    tracks = True
+
+    def __init__(self, storage, interval):
+        """Creates the write-behind mode of storage"""
+        super().__init__(storage)
+        self.interval = interval
+        self.flusher = None
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.write_lock = threading.Lock()
+        self.saved = self.written = 0
+        self.flushed = {}
+
+    def save(self):
+        """Encodes the new objects and wakes the flusher"""
+        storage = self.storage
+        objects = storage._objects()
+        for key, obj in storage._take_changes().items():
+            if obj is not None and objects.get(key) is obj:
+                storage._encode(key, obj)
+        self.saved += 1
+        if self.flusher is None:
+            self.start()
+        self.wake.set()
+
+    def flush(self):
+        """Blocks until the saves so far are written and synced"""
+        self.write_pending()
+
+    def stop(self):
+        """Stops the flusher thread, if it runs"""
+        if self.flusher is not None:
+            self.stopping.set()
+            self.wake.set()
+            self.flusher.join()
+            self.flusher = None
+            self.stopping.clear()
+
+    def start(self):
+        """Starts the background thread that writes saved changes"""
+        self.flusher = threading.Thread(target=self.run,
+                                        name="FileStorage flusher",
+                                        daemon=True)
+        self.flusher.start()
+        atexit.register(self.flush)
+
+    def run(self):
+        """Writes at most once per interval while saves keep coming"""
+        while not self.stopping.is_set():
+            self.wake.wait()
+            self.wake.clear()
+            # let the saves of the next interval join this write
+            self.stopping.wait(self.interval)
+            self.write_pending()
+
+    def write_pending(self):
+        """Writes the file if a save happened since the last write"""
+        with self.write_lock:
+            saved = self.saved
+            if saved == self.written:
+                return
+            self.dump_copy(self.storage._path())
+            self.written = saved
+
+    def dump_copy(self, path):
+        """Writes a copy of the store to path atomically, off the main thread
+
+        Only atomic dict copies are taken from the live store, and the
+        cached JSON of objects unchanged since save() encoded them is
+        reused. Objects encoded here are cached apart, by identity.
+        """
+        storage = self.storage
+        objects = storage._objects().copy()
+        raw = storage._raw_records()
+        previous, flushed = self.flushed, {}
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('{')
+            sep = '\n'
+            for key, obj in objects.items():
+                text = None
+                if not getattr(obj, '_changed', True):
+                    text = storage._encoded(key)
+                    if text is None:
+                        cached = previous.get(key)
+                        if cached is not None and cached[0] is obj:
+                            text = cached[1]
+                        else:
+                            text = json.dumps(obj.to_dict())
+                        flushed[key] = (obj, text)
+                if text is None:
+                    text = json.dumps(obj.to_dict())
+                f.write(sep + json.dumps(key) + ': ' + text)
+                sep = ',\n'
+            for key, text in raw:
+                f.write(sep + json.dumps(key) + ': ' + text)
+                sep = ',\n'
+            f.write('\n}\n')
+            f.flush()
+            os.fsync(f.fileno())
+            storage._io("bytes_written", f.tell())
+        os.replace(tmp_path, path)
+        self.flushed = flushed
+
+
+class Sharded(FileMode):
+    """Keeps the objects in <file_path>.d, one file per class
+
+    With shards > 1 each class is split over that many files hashed by
+    id (<Class>.<i>.json). save() only rewrites the shards holding
+    objects changed since the last save, and load() reads the shards on
+    a pool of workers threads.
+    """
+    tracks = True
+
+    def __init__(self, storage, shards, workers=None, lazy=False):
+        """Creates the sharded mode of storage"""
+        super().__init__(storage)
+        self.shards = shards
+        self.workers = workers
+        self.lazy = lazy
+        self.rewrite = False
+
+    def directory(self):
+        """Returns the directory holding the shard files"""
+        return self.storage._path('.d')
+
+    def files(self):
+        """Returns the paths of the shard files"""
+        directory = self.directory()
+        try:
+            return [os.path.join(directory, name)
+                    for name in sorted(os.listdir(directory))]
+        except FileNotFoundError:
+            return []
+
+    def shard(self, key):
+        """Returns the name of the shard file that holds key"""
+        name, id = key.split('.', 1)
+        if self.shards == 1:
+            return name + '.json'
+        return '{}.{}.json'.format(name,
+                                   zlib.crc32(id.encode()) % self.shards)
+
+    def is_shard(self, file_name):
+        """Tells whether file_name belongs to the current shard layout"""
+        parts = file_name.split('.')
+        if self.shards == 1:
+            return len(parts) == 2
+        return (len(parts) == 3 and parts[1].isdigit() and
+                int(parts[1]) < self.shards)
+
+    def load(self):
+        """Reads every shard file, several at a time
+
+        Files are parsed and their models built on worker threads; only
+        adding them to the store and its indexes happens on this one.
+        Without a shard directory the single file is read instead and
+        split into shards by the next save().
+        """
+        storage = self.storage
+        directory = self.directory()
+        try:
+            names = sorted(name for name in os.listdir(directory)
+                           if name.endswith('.json'))
+        except FileNotFoundError:
+            storage._load()
+            self.rewrite = bool(storage._keys())
+            return
+        # files from another shard count are merged by the next save()
+        self.rewrite = not all(self.is_shard(name) for name in names)
+        paths = [os.path.join(directory, name) for name in names]
+        with ThreadPoolExecutor(self.workers) as pool:
+            for pairs in pool.map(self.read, paths):
+                for key, value in pairs:
+                    storage._put(key, value)
+
+    def read(self, path):
+        """Returns the (key, model or raw record) pairs of one shard"""
+        storage = self.storage
+        with open(path, 'r', encoding='utf-8') as f:
+            storage._io("bytes_read", os.fstat(f.fileno()).st_size)
+            if self.lazy:
+                return list(records(f))
+            return [(key, storage._build(val))
+                    for key, val in json.load(f).items()]
+
+    def write(self):
+        """Rewrites the shards holding objects changed since the last save
+
+        Everything is rewritten, and stray files removed, after a reload
+        from another layout or after __objects was edited from outside.
+        """
+        storage = self.storage
+        rewrite = storage._resync() or self.rewrite
+        changes = storage._take_changes()
+        if rewrite:
+            dirty = None
+            names = {key.split('.', 1)[0] for key in storage._keys()}
+        else:
+            dirty = {self.shard(key) for key in changes}
+            dirty.update(self.shard(key)
+                         for key, obj in storage._objects().items()
+                         if getattr(obj, '_changed', True))
+            names = {shard.split('.', 1)[0] for shard in dirty}
+        groups = {shard: [] for shard in dirty or ()}
+        for name in names:
+            for key, obj in storage._bucket(name).items():
+                shard = self.shard(key)
+                if dirty is None or shard in dirty:
+                    groups.setdefault(shard, []).append(
+                        (key, storage._encode(key, obj)))
+            for key, raw in storage._raw_records(name):
+                shard = self.shard(key)
+                if dirty is None or shard in dirty:
+                    groups.setdefault(shard, []).append((key, raw))
+        directory = self.directory()
+        os.makedirs(directory, exist_ok=True)
+        for shard, pairs in groups.items():
+            path = os.path.join(directory, shard)
+            if not pairs:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                continue
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                f.write('{\n')
+                f.write(',\n'.join(json.dumps(key) + ': ' + text
+                                   for key, text in pairs))
+                f.write('\n}\n')
+                storage._io("bytes_written", f.tell())
+            os.replace(path + '.tmp', path)
+        if rewrite:
+            for name in os.listdir(directory):
+                if name.endswith('.json') and name not in groups:
+                    os.remove(os.path.join(directory, name))
+            self.rewrite = False
+
+
+class Snapshot(FileMode):
+    """Maps <file_path>.snap on reload instead of reading the JSON file
+
+    save() writes the JSON file as usual, then rewrites the snapshot.
+    A snapshot written before the data files last changed is bypassed.
+    """
+
+    def load(self):
+        """Maps the snapshot, or reads the JSON file if it is stale"""
+        if not self.storage._open_snapshot():
+            self.storage._load()
+
+    def write(self):
+        """Writes the JSON file, then the snapshot of it"""
+        storage = self.storage
+        storage._dump(storage._path())
+        storage.write_snapshot()
+        storage._open_snapshot(keep=True)
@@ -1,7 +1,21 @@
 #!/usr/bin/python3
 """Defines the FileStorage class for object persistence"""
+import bisect
+import asyncio
+import gc
 import json
+import os
+import sys
+from contextlib import contextmanager
+from os import getenv
 from models.base_model import BaseModel
+from models.engine.column_store import ColumnStore
+from models.engine.file_modes import JOURNAL_LIMIT, make_mode, records
+from models.engine.geo_index import GeoIndex
+from models.engine.metrics import Metrics, instrument
+from models.engine import snapshot
+from models.engine.sorted_keys import SortedKeys
+from models.engine.text_index import TextIndex
 from models.user import User
 from models.place import Place
 from models.state import State
@@ -9,56 +23,1156 @@ from models.city import City
 from models.amenity import Amenity
 from models.review import Review
 
+classes = {
+    "BaseModel": BaseModel,
+    "User": User,
+    "Place": Place,
+    "State": State,
+    "City": City,
+    "Amenity": Amenity,
+    "Review": Review
+}
+
 class FileStorage:
-    """Manages storage of hbnb models in JSON format"""
+    """Manages storage of hbnb models in JSON format
+
+    Objects are also bucketed by class and, for the attributes a model
+    lists in __indexes__, hashed by value so that count(cls) and
+    filter(cls, **equals) do not scan every object. Once iter() first
+    walks a class, its keys are kept sorted for later pages. The numeric
+    attributes listed in __columns__ are mirrored in a ColumnStore for
+    query(cls, **ranges), and the (latitude, longitude) attributes named
+    by __geo__ are kept in a GeoIndex grid for within(), near() and
+    nearest().
+
+    save() and reload() leave the disk to the storage mode, one of the
+    classes of file_modes.py: the journal, shared, write-behind, sharded
+    or snapshot mode below, or else a rewrite of the whole JSON file.
+    Those modes cannot be combined; asking for two raises ValueError.
+    Lazy mode works with any of them.
+
+    In journal mode (HBNB_FILE_JOURNAL=1) save() appends only the objects
+    passed to new() or delete(), or changed, since the last save to
+    <file_path>.log, reload() replays that log over the snapshot, and the
+    snapshot is rewritten (compacted) once the log grows past
+    journal_limit bytes.
+
+    Inside a batch (begin()/commit() or "with storage.batch():") save()
+    only notes that a write is due; the outermost commit() writes once
+    and rollback() restores the objects as they were at begin(). Only
+    objects passed to new() or delete(), or assigned an attribute, are
+    copied, the first time they are touched in the batch.
+
+    In lazy mode (HBNB_FILE_LAZY=1) reload() streams the file and keeps
+    each record as raw JSON text keyed by <class name>.id; a model is
+    only built when its class (or everything) is asked for, and records
+    never built are written back verbatim by save().
+
+    The encoded JSON of every object is cached; save() only re-encodes
+    objects whose _changed flag BaseModel set since they were encoded.
+
+    In shared mode (HBNB_FILE_SHARED=1), for several processes using one
+    file, save() holds an fcntl lock on <file_path>.lock, merges what
+    other processes wrote since this one last read the file (the newer
+    updated_at wins for objects changed on both sides), and replaces the
+    file atomically through a temporary file.
+
+    In write-behind mode (HBNB_FILE_WRITE_BEHIND=<seconds>) save() only
+    encodes the objects passed to new() since the last save and wakes a
+    background thread, which writes at most once per interval from a
+    copy of the store. flush() and close() block until the file is
+    written and synced; "await storage.asave()" saves and flushes off
+    the event loop.
+
+    In sharded mode (HBNB_FILE_SHARDS=<n>) objects are kept in a
+    <file_path>.d directory with one file per class, or n files per class
+    hashed by id (<Class>.<i>.json) when n > 1. save() only rewrites the
+    shards holding objects passed to new() or delete(), or changed, since
+    the last save, and reload() reads the shards on a thread pool of
+    HBNB_FILE_RELOAD_WORKERS threads.
+
+    In snapshot mode (HBNB_FILE_SNAPSHOT=1), meant for read-mostly
+    tools, reload() only maps <file_path>.snap (see snapshot.py): count()
+    answers from its header and get() decodes one record, while other
+    lookups build the records of the classes they need. save() writes
+    the JSON file as usual, then rewrites the snapshot, copying the
+    records never built as they are. The snapshot header records the
+    inode, mtime and size of the JSON file and journal it was written
+    with; when they no longer match, another process saved since, and
+    reload() reads the JSON file instead. Any mode can write a snapshot
+    with write_snapshot().
+
+    search(cls, query) ranks objects by the words of the attributes a
+    model lists in __text__. The TextIndex of a class is built on first
+    use and kept up to date like the other indexes. It is written next
+    to the data as <file_path>.<Class>.idx, stamped with the inode, size
+    and mtime of the data files, as soon as it is built from objects
+    matching them, or else by the next save(). Later saves only append
+    a line with the entries changed since and the new stamp, until those
+    lines outgrow the index and it is written whole again. A process
+    whose data files match the last stamp reads the index back instead
+    of rebuilding it, building only the objects it returns.
+
+    With HBNB_METRICS=1 the public operations are timed and the bytes
+    read and written are counted; see metrics(). Without it nothing is
+    wrapped.
+    """
     __file_path = 'file.json'
     __objects = {}
 
+    def __init__(self, file_path=None, journal=None, journal_limit=None,
+                 lazy=None, shared=None, write_behind=None, shards=None,
+                 workers=None, snapshot=None, metrics=None):
+        """Sets up the object store and the storage modes"""
+        self.__objects = {}
+        self.__synced = self.__objects
+        self.__lent = False
+        self.__own_refs = self.__refs()
+        BaseModel._storages.add(self)
+        self.__by_class = {}
+        self.__indexed = 0
+        self.__sorted = {}
+        self.__indexes = {}
+        self.__index_values = {}
+        self.__columns = {}
+        self.__geo = {}
+        self.__changes = {}
+        self.__batch_depth = 0
+        self.__batch_saved = False
+        self.__undo = None
+        self.__raw = {}
+        self.__raw_count = 0
+        self.__fragments = {}
+        if file_path:
+            self.__file_path = file_path
+        if journal is None:
+            journal = getenv("HBNB_FILE_JOURNAL") == "1"
+        if journal_limit is None:
+            journal_limit = int(getenv("HBNB_FILE_JOURNAL_LIMIT",
+                                       JOURNAL_LIMIT))
+        if shared is None:
+            shared = getenv("HBNB_FILE_SHARED") == "1"
+        if lazy is None:
+            lazy = getenv("HBNB_FILE_LAZY") == "1"
+        self.__lazy = lazy
+        if write_behind is None:
+            write_behind = float(getenv("HBNB_FILE_WRITE_BEHIND", 0))
+        if shards is None:
+            shards = int(getenv("HBNB_FILE_SHARDS", 0))
+        if workers is None:
+            workers = int(getenv("HBNB_FILE_RELOAD_WORKERS", 0)) or None
+        if snapshot is None:
+            snapshot = getenv("HBNB_FILE_SNAPSHOT") == "1"
+        self.__mode = make_mode(self, journal=journal,
+                                journal_limit=journal_limit, shared=shared,
+                                write_behind=write_behind, shards=shards,
+                                workers=workers, lazy=lazy,
+                                snapshot=snapshot)
+        self.__snap = None
+        self.__snap_gone = {}
+        self.__text = {}
+        self.__text_stale = set()
+        self.__text_stamp = []
+        self.__text_dirty = {}
+        self.__text_files = {}
+        if metrics is None:
+            metrics = getenv("HBNB_METRICS") == "1"
+        self.__metrics = Metrics() if metrics else None
+        if self.__metrics is not None:
+            instrument(self, self.__metrics)
+
     def all(self, cls=None):
         """Returns dictionary of all objects or filtered by class"""
         if cls:
-            if isinstance(cls, str):
-                cls = eval(cls)
-            return {k: v for k, v in self.__objects.items()
-                    if isinstance(v, cls)}
+            name = self.__name(cls)
+            self.__load_class(name)
+            return dict(self._bucket(name))
+        if self.__raw_count:
+            for name in list(self.__raw):
+                self.__load_class(name)
+        if self.__snap is not None:
+            for name in self.__snap.counts:
+                self.__load_class(name)
+        self.__lent = True
         return self.__objects
 
+    def get(self, cls, id):
+        """Returns the object of cls with that id, or None
+
+        In lazy and snapshot mode only that record is built, not its
+        whole class.
+        """
+        key = "{}.{}".format(self.__name(cls), id)
+        obj = self.__objects.get(key)
+        if obj is None:
+            raw = self.__undefer(key)
+            if raw is not None:
+                obj = self.__build_raw(key, raw)
+        return obj
+
+    def iter(self, cls=None, batch_size=1000, limit=None, offset=0,
+             after=None, order=None):
+        """Yields (key, obj) pairs of one class, or of all, ordered by key
+
+        limit and offset page through the pairs and after resumes past
+        the last key of a previous page. order ("attr", or "-attr" for
+        descending) sorts one class by an attribute instead, missing
+        values first; it cannot be combined with after. Classes are loaded
+        one at a time; batch_size is accepted for parity with DBStorage.
+
+        Pairs come straight from the sorted keys of the class, without a
+        copy; if the class changes while the caller holds the generator,
+        it resumes after the last key it yielded.
+        """
+        if order and (not cls or after):
+            raise ValueError("order needs a class and no after key")
+        names = [self.__name(cls)] if cls else sorted(classes)
+        for name in names:
+            if limit is not None and limit <= 0:
+                return
+            if after and name < after.split('.', 1)[0]:
+                continue
+            self.__load_class(name)
+            bucket = self._bucket(name)
+            index = self.__sorted.get(name)
+            if index is None:
+                index = self.__sorted[name] = SortedKeys(bucket)
+            keys = index.keys()
+            if order:
+                keys = list(keys)
+                self.__order(keys, bucket, order)
+            start = bisect.bisect_right(keys, after) if after else 0
+            if offset >= len(keys) - start:
+                offset -= len(keys) - start
+                continue
+            i, offset = start + offset, 0
+            version = index.version
+            while i < len(keys) and (limit is None or limit > 0):
+                key = keys[i]
+                i += 1
+                obj = bucket.get(key)
+                if obj is None:
+                    continue
+                if limit is not None:
+                    limit -= 1
+                yield key, obj
+                if not order and index.version != version:
+                    keys = index.keys()
+                    version = index.version
+                    i = bisect.bisect_right(keys, key)
+
+    def count(self, cls=None):
+        """Returns the number of objects, optionally of one class only"""
+        if cls:
+            name = self.__name(cls)
+            return (len(self._bucket(name)) + len(self.__raw.get(name, ())) +
+                    self.__snap_count(name))
+        return len(self.__objects) + self.__raw_count + self.__snap_count()
+
+    def filter(self, cls, **equals):
+        """Returns {key: obj} of cls whose attributes equal the values"""
+        name = self.__name(cls)
+        self.__load_class(name)
+        candidates = self._bucket(name)
+        for attr, value in equals.items():
+            index = self.__indexes.get((name, attr))
+            if index is None:
+                continue
+            try:
+                matches = index.get(value, {})
+            except TypeError:
+                continue
+            if len(matches) < len(candidates):
+                candidates = matches
+        return {k: v for k, v in candidates.items()
+                if all(getattr(v, attr, None) == value
+                       for attr, value in equals.items())}
+
+    def query(self, cls, **ranges):
+        """Returns {key: obj} of cls whose attributes lie in the ranges
+
+        Each range is an inclusive (low, high) tuple, either bound may be
+        None, e.g. query(Place, price_by_night=(0, 120)).
+        """
+        name = self.__name(cls)
+        self.__load_class(name)
+        bucket = self._bucket(name)
+        store = self.__columns.get(name)
+        if store is not None and all(f in store.columns for f in ranges):
+            candidates = {key: bucket[key] for key in store.query(**ranges)}
+        else:
+            candidates = bucket
+        return {k: v for k, v in candidates.items()
+                if all(self.__in_range(getattr(v, attr, None), *bounds)
+                       for attr, bounds in ranges.items())}
+
+    def within(self, cls, south, west, north, east):
+        """Returns {key: obj} of cls located inside a bounding box"""
+        name = self.__name(cls)
+        index = self.__geo_index(name)
+        bucket = self._bucket(name)
+        return {key: bucket[key]
+                for key in index.within(south, west, north, east)}
+
+    def near(self, cls, lat, lon, radius_km):
+        """Returns {key: obj} of cls within radius_km, closest first"""
+        name = self.__name(cls)
+        index = self.__geo_index(name)
+        bucket = self._bucket(name)
+        return {key: bucket[key]
+                for _, key in index.near(lat, lon, radius_km)}
+
+    def nearest(self, cls, lat, lon, k=1):
+        """Returns {key: obj} of the k objects of cls closest to a point"""
+        name = self.__name(cls)
+        index = self.__geo_index(name)
+        bucket = self._bucket(name)
+        return {key: bucket[key] for _, key in index.nearest(lat, lon, k)}
+
+    def metrics(self, reset=False):
+        """Returns the counters and operation latencies, {} if disabled
+
+        reset starts them over once they are read.
+        """
+        if self.__metrics is None:
+            return {}
+        data = self.__metrics.snapshot()
+        if reset:
+            self.__metrics.reset()
+        return data
+
+    def search(self, cls, query, limit=None):
+        """Returns {key: obj} of cls matching the words of query, best first
+
+        Words ending with * match as prefixes; see TextIndex.search().
+        """
+        name = self.__name(cls)
+        index = self.__text_index(name)
+        results = {}
+        for _, key in index.search(query, limit):
+            obj = self.get(name, key.split('.', 1)[1])
+            if obj is not None:
+                results[key] = obj
+        return results
+
     def new(self, obj):
         """Adds object to storage with key <class name>.id"""
         if obj:
             key = f"{obj.__class__.__name__}.{obj.id}"
-            self.__objects[key] = obj
+            if self.__undo is not None:
+                self.__remember(key)
+            self.__undefer(key)
+            self.__add(key, obj)
+            self.__text_stale.add(obj.__class__.__name__)
+            if self.__mode.tracks:
+                self.__changes[key] = obj
             return "OK"
 
+    def touch(self, obj):
+        """Records a stored object for rollback() before it first changes
+
+        BaseModel calls this on the storages with an open batch before
+        an attribute is assigned.
+        """
+        key = "{}.{}".format(type(obj).__name__, obj.__dict__.get('id'))
+        if self.__undo is not None and self.__objects.get(key) is obj:
+            self.__remember(key)
+
+    def reindex(self, obj):
+        """Moves a stored object in the attribute indexes after a change
+
+        BaseModel calls this on every FileStorage when an attribute
+        listed in __indexes__, __columns__, __geo__ or __text__ is
+        assigned, so filter(), query(), near() and search() follow
+        changes not passed to new() yet.
+        """
+        key = "{}.{}".format(type(obj).__name__, obj.__dict__.get('id'))
+        if self.__objects.get(key) is obj:
+            self.__unindex(key)
+            self.__index(key, obj)
+            store = self.__columns.get(type(obj).__name__)
+            if store is not None:
+                store.set(key, obj)
+            geo = self.__geo.get(type(obj).__name__)
+            if geo is not None:
+                lat, lon = type(obj).__geo__
+                geo.set(key, getattr(obj, lat, None), getattr(obj, lon, None))
+            text = self.__text.get(type(obj).__name__)
+            if text is not None:
+                text.set(key, obj)
+                self.__text_dirty.setdefault(type(obj).__name__,
+                                             set()).add(key)
+            self.__text_stale.add(type(obj).__name__)
+
+    def bulk_new(self, objects, chunk_size=1000):
+        """Adds every object, then saves once; returns how many were added
+
+        chunk_size is accepted for parity with DBStorage: a chunked
+        commit would rewrite the whole file once per chunk. Nothing is
+        saved when there was no object.
+        """
+        total = 0
+        for obj in objects:
+            self.new(obj)
+            total += 1
+        if total:
+            self.save()
+        return total
+
     def save(self):
-        """Serializes objects to JSON file"""
-        serialized = {k: v.to_dict() for k, v in self.__objects.items()}
-        with open(self.__file_path, 'w', encoding='utf-8') as f:
-            json.dump(serialized, f)
+        """Writes the objects to the data files of the storage mode"""
+        if self.__batch_depth:
+            self.__batch_saved = True
+        else:
+            self.__mode.save()
         return "OK"
 
-    def reload(self):
-        """Deserializes JSON file to objects"""
+    def flush(self):
+        """Blocks until write-behind saves are written and synced"""
+        self.__mode.flush()
+        return "OK"
+
+    async def asave(self):
+        """Saves, then awaits the write-behind flush in an executor"""
+        self.save()
+        await asyncio.get_running_loop().run_in_executor(None, self.flush)
+
+    def begin(self):
+        """Starts a batch, recording touched objects for rollback()"""
+        if not self.__batch_depth:
+            self.__undo = ({}, dict(self.__changes))
+            self.__batch_saved = False
+            BaseModel._batches.append(self)
+        self.__batch_depth += 1
+        return "OK"
+
+    def commit(self):
+        """Ends a batch, writing once if save() was called inside it"""
+        if not self.__batch_depth:
+            return "OK"
+        self.__batch_depth -= 1
+        if not self.__batch_depth:
+            self.__undo = None
+            BaseModel._batches.remove(self)
+            if self.__batch_saved:
+                self.__batch_saved = False
+                self.save()
+        return "OK"
+
+    def checkpoint(self):
+        """Writes what the open batch saved so far, keeping it open
+
+        rollback() then only undoes the changes made after this call.
+        """
+        if not self.__batch_depth:
+            return "OK"
+        if self.__batch_saved:
+            depth, self.__batch_depth = self.__batch_depth, 0
+            self.__batch_saved = False
+            try:
+                self.save()
+            finally:
+                self.__batch_depth = depth
+        self.__undo = ({}, dict(self.__changes))
+        return "OK"
+
+    def rollback(self):
+        """Abandons every open batch, restoring the objects it touched"""
+        if not self.__batch_depth:
+            return "OK"
+        touched, changes = self.__undo
+        self.__batch_depth = 0
+        self.__batch_saved = False
+        self.__undo = None
+        BaseModel._batches.remove(self)
+        for key, (obj, data, gone) in touched.items():
+            name = key.split('.', 1)[0]
+            bucket = self.__raw.get(name)
+            if bucket and key in bucket:
+                del bucket[key]
+                self.__raw_count -= 1
+            if key in self.__objects:
+                self.__remove(key)
+            if self.__snap is not None:
+                keys = self.__snap_gone.setdefault(name, set())
+                if gone:
+                    keys.add(key)
+                else:
+                    keys.discard(key)
+            if obj is not None:
+                obj.__dict__.clear()
+                obj.__dict__.update(data)
+                obj._changed = True
+                self.__add(key, obj)
+            elif data is not None:
+                self.__defer(key, data)
+            self.__text_stale.add(name)
+        self.__changes = changes
+        return "OK"
+
+    @contextmanager
+    def batch(self):
+        """Defers writes to the end of the block, rolling back on error"""
+        self.begin()
         try:
-            with open(self.__file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                for key, val in data.items():
-                    cls = val['__class__']
-                    del val['__class__']
-                    self.__objects[key] = eval(cls)(**val)
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        self.commit()
+
+    def compact(self):
+        """Rewrites the snapshot from memory and empties the journal"""
+        self.__changes.clear()
+        tmp_path = self.__file_path + '.tmp'
+        self._dump(tmp_path)
+        os.replace(tmp_path, self.__file_path)
+        try:
+            os.remove(self.__journal_path())
         except FileNotFoundError:
             pass
         return "OK"
 
+    def write_snapshot(self, path=None):
+        """Writes every object to a snapshot file, <file_path>.snap by default
+
+        Records not built yet are copied without being decoded. The
+        snapshot is only used while the data files stay as they are now,
+        so call this after save().
+        """
+        records = [(key, self._encode(key, obj))
+                   for key, obj in self.__objects.items()]
+        for bucket in self.__raw.values():
+            for key, raw in bucket.items():
+                if not isinstance(raw, str):
+                    raw = json.dumps(raw)
+                records.append((key, raw))
+        if self.__snap is not None:
+            for name in self.__snap.counts:
+                gone = self.__snap_gone.get(name, ())
+                records.extend(item for item in self.__snap.items(name)
+                               if item[0] not in gone)
+        path = path or self.__snap_path()
+        snapshot.write(path, records, self.__source())
+        self._io("bytes_written", os.path.getsize(path))
+        return "OK"
+
+    def reload(self):
+        """Deserializes JSON file to objects
+
+        The garbage collector is paused while loading: nothing built here
+        is garbage, and collections would rescan every object so far.
+        """
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self.__mode.load()
+        finally:
+            if gc_enabled:
+                gc.enable()
+        self.__text_stamp = self.__fingerprint()
+        return "OK"
+
     def delete(self, obj=None):
         """Removes object from storage"""
         if obj:
             key = f"{obj.__class__.__name__}.{obj.id}"
-            if key in self.__objects:
-                del self.__objects[key]
+            if self.__undo is not None:
+                self.__remember(key)
+            if self.__undefer(key) is not None or key in self.__objects:
+                self.__remove(key)
+                self.__text_stale.add(obj.__class__.__name__)
+                if self.__mode.tracks:
+                    self.__changes[key] = None
         return "OK"
 
     def close(self):
-        """Reloads objects from file"""
+        """Flushes write-behind saves and stops the flusher, then reloads"""
+        self.__mode.stop()
+        self.flush()
         self.reload()
         return "OK"
+
+    def __add(self, key, obj):
+        """Stores obj under key, in its class bucket and its indexes"""
+        name = key.split('.', 1)[0]
+        if self.__objects.get(key) is not obj:
+            self.__fragments.pop(key, None)
+        self.__objects[key] = obj
+        bucket = self.__by_class.setdefault(name, {})
+        if key not in bucket:
+            self.__indexed += 1
+            keys = self.__sorted.get(name)
+            if keys is not None:
+                keys.add(key)
+        bucket[key] = obj
+        if key in self.__index_values:
+            self.__unindex(key)
+        cls = type(obj)
+        fields = cls.__columns__
+        if fields:
+            if name not in self.__columns:
+                self.__columns[name] = ColumnStore(fields)
+            self.__columns[name].set(key, obj)
+        geo = cls.__geo__
+        if geo:
+            if name not in self.__geo:
+                self.__geo[name] = GeoIndex()
+            self.__geo[name].set(key, getattr(obj, geo[0], None),
+                                 getattr(obj, geo[1], None))
+        self.__index(key, obj)
+        text = self.__text.get(name)
+        if text is not None:
+            text.set(key, obj)
+            self.__text_dirty.setdefault(name, set()).add(key)
+
+    def __remember(self, key):
+        """Records how key stood before its first change in the batch
+
+        That is the object and a copy of its attributes, or else its
+        raw record, and whether the snapshot record was built or deleted.
+        """
+        touched = self.__undo[0]
+        if key in touched:
+            return
+        name = key.split('.', 1)[0]
+        obj = self.__objects.get(key)
+        if obj is not None:
+            data = dict(obj.__dict__)
+        else:
+            data = self.__raw.get(name, {}).get(key)
+        touched[key] = (obj, data, key in self.__snap_gone.get(name, ()))
+
+    def __index(self, key, obj):
+        """Hashes obj into the indexes of the attributes in __indexes__"""
+        attrs = type(obj).__indexes__
+        if not attrs:
+            return
+        name = key.split('.', 1)[0]
+        values = {}
+        for attr in attrs:
+            value = getattr(obj, attr, None)
+            index = self.__indexes.setdefault((name, attr), {})
+            try:
+                index.setdefault(value, {})[key] = obj
+            except TypeError:
+                # unhashable values are left to the filter() scan
+                continue
+            values[attr] = value
+        self.__index_values[key] = values
+
+    def __remove(self, key):
+        """Drops key from the object store and its class bucket"""
+        self.__objects.pop(key, None)
+        bucket = self.__by_class.get(key.split('.', 1)[0], {})
+        if bucket.pop(key, None) is not None:
+            self.__indexed -= 1
+            keys = self.__sorted.get(key.split('.', 1)[0])
+            if keys is not None:
+                keys.remove(key)
+        self.__fragments.pop(key, None)
+        self.__unindex(key)
+        store = self.__columns.get(key.split('.', 1)[0])
+        if store is not None:
+            store.remove(key)
+        index = self.__geo.get(key.split('.', 1)[0])
+        if index is not None:
+            index.remove(key)
+        text = self.__text.get(key.split('.', 1)[0])
+        if text is not None:
+            text.remove(key)
+            self.__text_dirty.setdefault(key.split('.', 1)[0],
+                                         set()).add(key)
+
+    def __unindex(self, key):
+        """Drops key from the attribute indexes it was hashed into"""
+        values = self.__index_values.pop(key, None)
+        if not values:
+            return
+        name = key.split('.', 1)[0]
+        for attr, value in values.items():
+            index = self.__indexes[(name, attr)]
+            matches = index[value]
+            del matches[key]
+            if not matches:
+                del index[value]
+
+    def __geo_index(self, name):
+        """Returns the up-to-date GeoIndex of a class name"""
+        self.__load_class(name)
+        self._bucket(name)
+        return self.__geo.get(name, GeoIndex())
+
+    @staticmethod
+    def __in_range(value, low, high):
+        """Tells whether value lies in the inclusive range [low, high]"""
+        try:
+            return ((low is None or value >= low) and
+                    (high is None or value <= high))
+        except TypeError:
+            return False
+
+    @staticmethod
+    def __order(keys, bucket, order):
+        """Sorts keys in place by the attribute named by order"""
+        attr = order.lstrip('-')
+        values = {key: getattr(bucket[key], attr, None) for key in keys}
+        reverse = order.startswith('-')
+        try:
+            keys.sort(key=lambda key: (values[key] is not None, values[key]),
+                      reverse=reverse)
+        except TypeError:
+            # mixed types: fall back to comparing the text of each value
+            keys.sort(key=lambda key: (values[key] is not None,
+                                       str(values[key])), reverse=reverse)
+
+    def __name(self, cls):
+        """Returns the class name of a class or class name"""
+        if isinstance(cls, str):
+            return cls
+        return cls.__name__
+
+    def _bucket(self, name):
+        """Returns the {key: obj} bucket of one class name"""
+        if self.__edited():
+            self.__rebuild()
+        return self.__by_class.get(name, {})
+
+    def __edited(self):
+        """Tells whether __objects was replaced or edited from outside
+
+        all() hands out __objects itself, so lookups after it check every
+        key against the buckets, even when the number of objects did not
+        change. They keep checking for as long as a reference to it is
+        held outside the storage, through which it could still be edited.
+        """
+        if self.__objects is not self.__synced:
+            return True
+        if not self.__lent:
+            return False
+        refs = self.__refs()
+        if refs is not None and refs <= self.__own_refs:
+            self.__lent = False
+        objects = self.__objects
+        if self.__indexed != len(objects):
+            return True
+        by_class = self.__by_class
+        for key, obj in objects.items():
+            bucket = by_class.get(key.split('.', 1)[0])
+            if bucket is None or bucket.get(key) is not obj:
+                return True
+        return False
+
+    def __refs(self):
+        """Returns the reference count of __objects, or None if unknown"""
+        getrefcount = getattr(sys, 'getrefcount', None)
+        if getrefcount is None:
+            return None
+        return getrefcount(self.__objects)
+
+    def __rebuild(self):
+        """Recomputes the class buckets and indexes from __objects"""
+        self.__synced = self.__objects
+        self.__by_class = {}
+        self.__indexed = 0
+        self.__sorted = {}
+        self.__indexes = {}
+        self.__index_values = {}
+        self.__columns = {}
+        self.__geo = {}
+        self.__text_stale.update(self.__text)
+        self.__text = {}
+        self.__text_dirty = {}
+        self.__text_files = {}
+        for key, obj in list(self.__objects.items()):
+            self.__add(key, obj)
+
+    def _load(self):
+        """Reads the JSON file into memory"""
+        try:
+            with open(self.__file_path, 'r', encoding='utf-8') as f:
+                self._io("bytes_read", os.fstat(f.fileno()).st_size)
+                if self.__lazy:
+                    self.__stream(f)
+                else:
+                    data = json.load(f)
+                    for key, val in data.items():
+                        self.__add(key, self.__build(val))
+        except FileNotFoundError:
+            pass
+
+    def __stream(self, f):
+        """Reads raw records from an open file without building models"""
+        for key, raw in records(f):
+            self.__defer(key, raw)
+
+    def __defer(self, key, raw):
+        """Keeps the raw record of key, replacing any built object"""
+        if key in self.__objects:
+            self.__remove(key)
+        bucket = self.__raw.setdefault(key.split('.', 1)[0], {})
+        if key not in bucket:
+            self.__raw_count += 1
+        bucket[key] = raw
+
+    def __undefer(self, key):
+        """Forgets and returns the raw record of key, if any"""
+        name = key.split('.', 1)[0]
+        bucket = self.__raw.get(name)
+        if not bucket or key not in bucket:
+            if self.__snap is None:
+                return None
+            gone = self.__snap_gone.setdefault(name, set())
+            if key in gone:
+                return None
+            raw = self.__snap.get(key)
+            if raw is not None:
+                gone.add(key)
+            return raw
+        self.__raw_count -= 1
+        return bucket.pop(key)
+
+    def __load_class(self, name):
+        """Builds every raw record of one class"""
+        bucket = self.__raw.pop(name, None)
+        if bucket:
+            self.__raw_count -= len(bucket)
+            for key, raw in bucket.items():
+                self.__build_raw(key, raw)
+        if self.__snap is not None:
+            gone = self.__snap_gone.setdefault(name, set())
+            if len(gone) < self.__snap.count(name):
+                for key, raw in self.__snap.items(name):
+                    if key not in gone:
+                        gone.add(key)
+                        self.__build_raw(key, raw)
+
+    def __build_raw(self, key, raw):
+        """Builds and adds the object of a raw record, then returns it"""
+        if isinstance(raw, str):
+            obj = self.__build(json.loads(raw))
+            self.__add(key, obj)
+            obj._changed = False
+            self.__fragments[key] = raw
+        else:
+            obj = self.__build(raw)
+            self.__add(key, obj)
+        return obj
+
+    def __build(self, val):
+        """Instantiates a model from its to_dict() form"""
+        return classes[val['__class__']].from_dict(val)
+
+    def _dump(self, path):
+        """Writes every object to path as one JSON document, one per line"""
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('{')
+            sep = '\n'
+            for key, obj in self.__objects.items():
+                f.write(sep + json.dumps(key) + ': ' + self._encode(key, obj))
+                sep = ',\n'
+            for bucket in self.__raw.values():
+                for key, raw in bucket.items():
+                    if not isinstance(raw, str):
+                        raw = json.dumps(raw)
+                    f.write(sep + json.dumps(key) + ': ' + raw)
+                    sep = ',\n'
+            if self.__snap is not None:
+                for name in self.__snap.counts:
+                    gone = self.__snap_gone.get(name, ())
+                    for key, raw in self.__snap.items(name):
+                        if key not in gone:
+                            f.write(sep + json.dumps(key) + ': ' + raw)
+                            sep = ',\n'
+            f.write('\n}\n')
+            self._io("bytes_written", f.tell())
+
+    def _encode(self, key, obj):
+        """Returns the JSON of obj, re-encoding it only if it changed"""
+        text = self.__fragments.get(key)
+        if text is None or getattr(obj, '_changed', True):
+            text = json.dumps(obj.to_dict())
+            self.__fragments[key] = text
+            obj._changed = False
+        return text
+
+    def _io(self, counter, size):
+        """Adds size bytes to a metrics counter when metrics are on"""
+        if self.__metrics is not None:
+            self.__metrics.add(counter, size)
+
+    def __text_index(self, name):
+        """Returns the TextIndex of a class, read or built on first use
+
+        An index built from objects that match the data files is written
+        at once, for the next process to read.
+        """
+        self._bucket(name)
+        index = self.__text.get(name)
+        if index is not None:
+            return index
+        if name not in self.__text_stale:
+            index = self.__read_text(name)
+        if index is None:
+            self.__load_class(name)
+            index = TextIndex(getattr(classes.get(name), '__text__', ()))
+            for key, obj in self._bucket(name).items():
+                index.set(key, obj)
+            self.__text_files.pop(name, None)
+            if (index.fields and name not in self.__text_stale and
+                    self.__text_stamp == self.__fingerprint()):
+                self.__write_text(name, index)
+        self.__text[name] = index
+        self.__text_dirty.pop(name, None)
+        return index
+
+    def __text_path(self, name):
+        """Returns the path of the saved TextIndex of a class"""
+        return '{}.{}.idx'.format(self.__file_path, name)
+
+    def __read_text(self, name):
+        """Returns the saved TextIndex of a class if it matches the data
+
+        The whole index on the first line is brought up to date by the
+        changes on the lines after it; the stamp of the last one must be
+        that of the data files.
+        """
+        if not self.__text_stamp:
+            return None
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with open(self.__text_path(name), 'r', encoding='utf-8') as f:
+                size = os.fstat(f.fileno()).st_size
+                self._io("bytes_read", size)
+                first = f.readline()
+                data = json.loads(first)
+                index = TextIndex.from_dict(data["index"])
+                stamp = data["fingerprint"]
+                for line in f:
+                    try:
+                        changes = json.loads(line)
+                    except ValueError:
+                        # torn final line from an interrupted append
+                        break
+                    for key in changes["remove"]:
+                        index.remove(key)
+                    for key, (length, counts) in changes["set"].items():
+                        index.put(key, length, counts)
+                    stamp = changes["fingerprint"]
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+        finally:
+            if gc_enabled:
+                gc.enable()
+        if stamp != self.__text_stamp:
+            return None
+        # the file is ASCII: JSON escapes every other character
+        self.__text_files[name] = [len(first), size]
+        return index
+
+    def __write_text(self, name, index):
+        """Writes the whole TextIndex of a class with the data stamp"""
+        if not self.__text_stamp:
+            return
+        path = self.__text_path(name)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(json.dumps({"fingerprint": self.__text_stamp,
+                                "index": index.to_dict()}) + '\n')
+            size = f.tell()
+        self._io("bytes_written", size)
+        os.replace(path + '.tmp', path)
+        self.__text_files[name] = [size, size]
+        self.__text_dirty.pop(name, None)
+
+    def __append_text(self, name, index):
+        """Appends the entries of the keys changed since the last write
+
+        Returns False, writing nothing, when the file is not as this
+        storage left it or the lines appended so far outgrow the index.
+        """
+        base, size = self.__text_files.get(name, (0, 0))
+        path = self.__text_path(name)
+        try:
+            if not base or os.path.getsize(path) != size or size > 2 * base:
+                return False
+        except FileNotFoundError:
+            return False
+        changes = {"fingerprint": self.__text_stamp, "set": {},
+                   "remove": []}
+        for key in self.__text_dirty.pop(name, ()):
+            entry = index.entry(key)
+            if entry is None:
+                changes["remove"].append(key)
+            else:
+                changes["set"][key] = entry
+        line = json.dumps(changes) + '\n'
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(line)
+            self.__text_files[name][1] = f.tell()
+        self._io("bytes_written", len(line))
+        return True
+
+    def _save_text(self):
+        """Brings the saved text indexes up to the data files just written"""
+        self.__text_stale.clear()
+        stamp = self.__fingerprint()
+        moved, self.__text_stamp = stamp != self.__text_stamp, stamp
+        for name, index in self.__text.items():
+            if not index.fields:
+                continue
+            if (not moved and not self.__text_dirty.get(name) and
+                    name in self.__text_files):
+                continue
+            if not self.__append_text(name, index):
+                self.__write_text(name, index)
+
+    def __fingerprint(self):
+        """Returns the inode, mtime and size of every data file"""
+        paths = [self.__file_path, self.__journal_path(), self.__snap_path()]
+        paths.extend(self.__mode.files())
+        stamp = []
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            stamp.append([os.path.basename(path), st.st_ino,
+                          st.st_mtime_ns, st.st_size])
+        return stamp
+
+    def __snap_path(self):
+        """Returns the path of the snapshot file"""
+        return self.__file_path + '.snap'
+
+    def __source(self):
+        """Returns the inode, mtime and size of the JSON file and journal"""
+        stamp = []
+        for path in (self.__file_path, self.__journal_path()):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                stamp.append(None)
+                continue
+            stamp.append([st.st_ino, st.st_mtime_ns, st.st_size])
+        return stamp
+
+    def _open_snapshot(self, keep=False):
+        """Maps the snapshot file in place of the records it holds
+
+        On reload the file wins over objects in memory that it also
+        holds, as the JSON file would; after save() wrote it, keep
+        leaves them in memory and marks their records as built. Returns
+        False, leaving no snapshot mapped, when there is none or the data
+        files changed since it was written.
+        """
+        try:
+            snap = snapshot.Snapshot(self.__snap_path())
+        except (FileNotFoundError, ValueError):
+            snap = None
+        if snap is not None and not keep and snap.source != self.__source():
+            snap.close()
+            snap = None
+        if self.__snap is not None:
+            self.__snap.close()
+        self.__snap = snap
+        self.__snap_gone = {}
+        if snap is None:
+            return False
+        self.__raw = {}
+        self.__raw_count = 0
+        for key in list(self.__objects):
+            if keep:
+                name = key.split('.', 1)[0]
+                self.__snap_gone.setdefault(name, set()).add(key)
+            elif self.__snap.get(key) is not None:
+                self.__remove(key)
+        return True
+
+    def __snap_count(self, name=None):
+        """Returns how many snapshot records are neither built nor deleted"""
+        if self.__snap is None:
+            return 0
+        if name is not None:
+            return (self.__snap.count(name) -
+                    len(self.__snap_gone.get(name, ())))
+        return len(self.__snap) - sum(len(gone) for gone in
+                                      self.__snap_gone.values())
+
+    def __journal_path(self):
+        """Returns the path of the append-only journal"""
+        return self.__file_path + '.log'
+
+    # The methods below are for the modes of file_modes.py only.
+
+    def _path(self, suffix=''):
+        """Returns the path of the JSON file, or of a file beside it"""
+        return self.__file_path + suffix
+
+    def _objects(self):
+        """Returns the {key: obj} store of built objects, not a copy"""
+        return self.__objects
+
+    def _keys(self):
+        """Returns the keys of every built object and raw record"""
+        keys = list(self.__objects)
+        for bucket in self.__raw.values():
+            keys.extend(bucket)
+        return keys
+
+    def _take_changes(self):
+        """Returns and forgets the {key: obj, or None once deleted} of
+        the keys passed to new() or delete() since the last call
+        """
+        changes, self.__changes = self.__changes, {}
+        return changes
+
+    def _raw_records(self, name=None):
+        """Returns the (key, JSON text) of the records not built yet, of
+        one class name or of all
+        """
+        if name is None:
+            buckets = list(self.__raw.values())
+        else:
+            buckets = [self.__raw.get(name, {})]
+        return [(key, raw if isinstance(raw, str) else json.dumps(raw))
+                for bucket in buckets for key, raw in list(bucket.items())]
+
+    def _encoded(self, key):
+        """Returns the cached JSON of key, or None"""
+        return self.__fragments.get(key)
+
+    def _build(self, val):
+        """Instantiates a model from its to_dict() form"""
+        return self.__build(val)
+
+    def _put(self, key, value):
+        """Stores a record read from the data files
+
+        value is a model, its to_dict() form or its JSON text. In lazy
+        mode the record of an object not built yet is kept raw.
+        """
+        if isinstance(value, BaseModel):
+            self.__undefer(key)
+            self.__add(key, value)
+        elif self.__lazy and key not in self.__objects:
+            self.__defer(key, value)
+        else:
+            self.__undefer(key)
+            if isinstance(value, str):
+                value = json.loads(value)
+            self.__add(key, self.__build(value))
+
+    def _drop(self, key):
+        """Forgets the object or raw record of key"""
+        self.__undefer(key)
+        self.__remove(key)
+
+    def _resync(self):
+        """Rebuilds the buckets and indexes if __objects was edited from
+        outside; tells whether it was
+        """
+        if self.__edited():
+            self.__rebuild()
+            return True
+        return False
@@ -0,0 +1,167 @@
+#!/usr/bin/python3
+"""Defines the GeoIndex class used by storage for spatial queries"""
+import heapq
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def distance(lat1, lon1, lat2, lon2):
+    """Returns the great-circle distance in km between two points"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlam = math.radians(lon2 - lon1)
+    a = (math.sin(dphi / 2) ** 2 +
+         math.cos(phi1) * math.cos(phi2) * math.sin(dlam / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounds(lat, lon, radius_km):
+    """Returns (south, west, north, east) enclosing a radius around a point
+
+    west may be below -180 and east above 180 when the circle crosses
+    the antimeridian; the box spans every longitude around a pole.
+    """
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    south, north = lat - dlat, lat + dlat
+    if south <= -90 or north >= 90:
+        return max(south, -90.0), -180.0, min(north, 90.0), 180.0
+    ratio = math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(
+        math.radians(lat))
+    if ratio >= 1:
+        return south, -180.0, north, 180.0
+    dlon = math.degrees(math.asin(ratio))
+    return south, lon - dlon, north, lon + dlon
+
+
+def split(west, east):
+    """Splits a longitude range that crosses the antimeridian in two"""
+    if east - west >= 360:
+        return [(-180.0, 180.0)]
+    if west < -180:
+        return [(west + 360, 180.0), (-180.0, east)]
+    if east > 180:
+        return [(west, 180.0), (-180.0, east - 360)]
+    return [(west, east)]
+
+
+class GeoIndex:
+    """Buckets points into a grid of cell_size degree square cells
+
+    within() and near() only visit the cells overlapping the requested
+    area; nearest() widens a ring of cells around the point until it
+    holds k points, then confirms them with an exact near() query.
+    """
+
+    def __init__(self, cell_size=0.25):
+        """Creates an empty grid"""
+        self.cell_size = cell_size
+        self.cells = {}
+        self.points = {}
+
+    def __len__(self):
+        """Returns the number of indexed points"""
+        return len(self.points)
+
+    def set(self, key, lat, lon):
+        """Inserts or moves key; non-numeric coordinates drop it"""
+        self.remove(key)
+        try:
+            lat, lon = float(lat), float(lon)
+        except (TypeError, ValueError):
+            return
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            return
+        self.points[key] = (lat, lon)
+        self.cells.setdefault(self.__cell(lat, lon), {})[key] = (lat, lon)
+
+    def remove(self, key):
+        """Drops key from the index, if present"""
+        point = self.points.pop(key, None)
+        if point is None:
+            return
+        cell = self.__cell(*point)
+        del self.cells[cell][key]
+        if not self.cells[cell]:
+            del self.cells[cell]
+
+    def within(self, south, west, north, east):
+        """Returns the keys inside a bounding box, in no particular order
+
+        A box with west greater than east crosses the antimeridian.
+        """
+        if west > east:
+            east += 360
+        keys = []
+        for low, high in split(west, east):
+            for key, (lat, lon) in self.__scan(south, low, north, high):
+                if south <= lat <= north and low <= lon <= high:
+                    keys.append(key)
+        return keys
+
+    def near(self, lat, lon, radius_km):
+        """Returns (distance_km, key) pairs within radius_km, closest first"""
+        south, west, north, east = bounds(lat, lon, radius_km)
+        found = []
+        for low, high in split(west, east):
+            for key, point in self.__scan(south, low, north, high):
+                km = distance(lat, lon, *point)
+                if km <= radius_km:
+                    found.append((km, key))
+        return sorted(found)
+
+    def nearest(self, lat, lon, k=1):
+        """Returns the k closest (distance_km, key) pairs, closest first"""
+        if k <= 0 or not self.points:
+            return []
+        if k >= len(self.points):
+            return sorted((distance(lat, lon, *point), key)
+                          for key, point in self.points.items())
+        row, col = self.__cell(lat, lon)
+        found = []
+        ring = 0
+        while len(found) < k:
+            if (2 * ring + 1) ** 2 > 4 * len(self.cells):
+                # the ring outgrew the occupied cells: rank everything
+                return heapq.nsmallest(
+                    k, ((distance(lat, lon, *point), key)
+                        for key, point in self.points.items()))
+            for cell in self.__ring(row, col, ring):
+                for point in self.cells.get(cell, {}).values():
+                    found.append(distance(lat, lon, *point))
+            ring += 1
+        radius = heapq.nsmallest(k, found)[-1]
+        return self.near(lat, lon, radius)[:k]
+
+    def __cell(self, lat, lon):
+        """Returns the grid cell of a point"""
+        return (math.floor(lat / self.cell_size),
+                math.floor(lon / self.cell_size))
+
+    def __ring(self, row, col, ring):
+        """Yields the cells at Chebyshev distance ring from (row, col)"""
+        if ring == 0:
+            yield (row, col)
+            return
+        for i in range(row - ring, row + ring + 1):
+            if i in (row - ring, row + ring):
+                for j in range(col - ring, col + ring + 1):
+                    yield (i, j)
+            else:
+                yield (i, col - ring)
+                yield (i, col + ring)
+
+    def __scan(self, south, west, north, east):
+        """Yields (key, point) of every point in cells overlapping a box"""
+        row_low, col_low = self.__cell(south, west)
+        row_high, col_high = self.__cell(north, east)
+        cells = (row_high - row_low + 1) * (col_high - col_low + 1)
+        if cells > len(self.cells):
+            for cell, points in self.cells.items():
+                if (row_low <= cell[0] <= row_high and
+                        col_low <= cell[1] <= col_high):
+                    yield from points.items()
+            return
+        for row in range(row_low, row_high + 1):
+            for col in range(col_low, col_high + 1):
+                yield from self.cells.get((row, col), {}).items()
@@ -0,0 +1,71 @@
+#!/usr/bin/python3
+"""Defines the LRUCache class used by storage for point lookups"""
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Keeps the maxsize most recently used values by key
+
+    Every method holds a lock, so one cache can be shared by threads.
+    get() counts hits and misses; put() evicts the least recently used
+    value once the cache is full. discard() and clear() bump version,
+    and put() ignores a value read under an older version, so a row
+    loaded while another thread changed it is not cached.
+    """
+
+    def __init__(self, maxsize=1024):
+        """Creates an empty cache holding at most maxsize values"""
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.version = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        """Returns the number of cached values"""
+        return len(self.data)
+
+    def get(self, key):
+        """Returns the value of key, or None, marking it recently used"""
+        with self.lock:
+            try:
+                value = self.data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self.data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, version=None):
+        """Caches value under key, evicting the oldest value if full;
+        skipped when version is given and keys were dropped since
+        """
+        with self.lock:
+            if version is not None and version != self.version:
+                return
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def discard(self, *keys):
+        """Drops keys from the cache, if present"""
+        with self.lock:
+            self.version += 1
+            for key in keys:
+                self.data.pop(key, None)
+
+    def clear(self):
+        """Drops every cached value, keeping the counters"""
+        with self.lock:
+            self.version += 1
+            self.data.clear()
+
+    def info(self):
+        """Returns the hit and miss counters and the cache size"""
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "size": len(self.data), "maxsize": self.maxsize}
@@ -0,0 +1,153 @@
+#!/usr/bin/python3
+"""Defines the Metrics class used by storage engines to time operations
+
+Engines only wrap their methods with instrument() when HBNB_METRICS=1,
+so a disabled engine runs its methods untouched.
+"""
+import bisect
+import functools
+import threading
+import time
+
+# upper bounds in seconds of the latency buckets: 1 us doubling to ~34 s
+BOUNDS = tuple(1e-6 * 2 ** i for i in range(26))
+OPERATIONS = ("new", "save", "reload", "all", "iter", "delete", "get",
+              "count", "filter", "query", "search", "bulk_new", "flush",
+              "close")
+
+
+class Histogram:
+    """Counts latencies in buckets with power of two bounds"""
+
+    def __init__(self):
+        """Creates an empty histogram"""
+        self.buckets = [0] * (len(BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        """Records one latency"""
+        self.buckets[bisect.bisect_left(BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        """Returns the bucket bound below which a fraction q of calls fall"""
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                bound = BOUNDS[i] if i < len(BOUNDS) else self.max
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        """Returns the count, total, mean, max and p50/p95/p99 in seconds"""
+        return {"count": self.count, "total": self.total,
+                "mean": self.total / self.count if self.count else 0.0,
+                "max": self.max, "p50": self.percentile(0.5),
+                "p95": self.percentile(0.95), "p99": self.percentile(0.99)}
+
+
+class Metrics:
+    """Keeps counters and per-operation latency histograms of one engine
+
+    Every update holds a lock, as engines are used from several threads.
+    """
+
+    def __init__(self):
+        """Creates empty counters and histograms"""
+        self.__lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def add(self, name, amount=1):
+        """Adds amount to the counter name"""
+        with self.__lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, seconds):
+        """Records one call of the operation name that took seconds"""
+        with self.__lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def timed(self, name, method, sized=False):
+        """Returns method wrapped to record its latency under name
+
+        With sized, the length of every result is added to the counter
+        <name>.objects.
+        """
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            finally:
+                self.observe(name, time.perf_counter() - start)
+            if sized:
+                self.add(name + ".objects", len(result))
+            return result
+        return wrapper
+
+    def timed_iter(self, name, method):
+        """Returns a generator method wrapped to record its latency
+
+        Only the time spent producing items counts, not the caller's
+        time between them; the items yielded are added to the counter
+        <name>.objects once it is exhausted or closed.
+        """
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            spent = 0.0
+            count = 0
+            items = method(*args, **kwargs)
+            try:
+                while True:
+                    start = time.perf_counter()
+                    try:
+                        item = next(items)
+                    except StopIteration:
+                        return
+                    finally:
+                        spent += time.perf_counter() - start
+                    count += 1
+                    yield item
+            finally:
+                items.close()
+                self.observe(name, spent)
+                self.add(name + ".objects", count)
+        return wrapper
+
+    def snapshot(self):
+        """Returns {"counters": {...}, "operations": {name: histogram}}"""
+        with self.__lock:
+            return {"counters": dict(self.counters),
+                    "operations": {name: histogram.to_dict() for name,
+                                   histogram in self.histograms.items()}}
+
+    def reset(self):
+        """Drops every counter and histogram"""
+        with self.__lock:
+            self.counters = {}
+            self.histograms = {}
+
+
+def instrument(storage, metrics, operations=OPERATIONS):
+    """Replaces the operations of a storage instance by timed wrappers"""
+    for name in operations:
+        method = getattr(storage, name, None)
+        if method is None:
+            continue
+        if name == "iter":
+            setattr(storage, name, metrics.timed_iter(name, method))
+        else:
+            setattr(storage, name, metrics.timed(
+                name, method, sized=name in ("all", "filter", "query",
+                                             "search")))
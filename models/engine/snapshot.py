@@ -0,0 +1,138 @@
+#!/usr/bin/python3
+"""Defines the read-only, memory-mapped snapshot format used by storage
+
+A snapshot file holds, after a fixed prelude, the JSON of every record,
+a JSON header with the number of records of each class and a caller's
+note of the source it was written from, and an index of fixed-width
+(key, offset, length) entries sorted by key. Opening one
+maps the file and reads the prelude and the header only; a lookup is a
+binary search of the index and decodes a single record.
+"""
+import json
+import mmap
+import os
+import struct
+
+MAGIC = b'HBNBSNP1'
+# magic, record count, key width, header offset, header length, index offset
+PRELUDE = struct.Struct('<8sQIQIQ')
+
+
+def entry_format(width):
+    """Returns the struct of one index entry for keys of width bytes"""
+    return struct.Struct('<{}sQI'.format(width))
+
+
+def write(path, records, source=None):
+    """Writes (key, JSON text) records to path atomically; returns the count
+
+    Records may come in any order; the index is sorted when written.
+    source is any JSON value, read back as Snapshot.source.
+    """
+    entries = []
+    counts = {}
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(bytes(PRELUDE.size))
+        offset = PRELUDE.size
+        for key, text in records:
+            data = text.encode('utf-8')
+            key = key.encode('utf-8')
+            f.write(data)
+            entries.append((key, offset, len(data)))
+            offset += len(data)
+            name = key.split(b'.', 1)[0].decode('utf-8')
+            counts[name] = counts.get(name, 0) + 1
+        header = json.dumps({"counts": counts,
+                             "source": source}).encode('utf-8')
+        f.write(header)
+        index_offset = offset + len(header)
+        entries.sort()
+        width = max((len(key) for key, _, _ in entries), default=0)
+        entry = entry_format(width)
+        f.write(b''.join(entry.pack(*item) for item in entries))
+        f.seek(0)
+        f.write(PRELUDE.pack(MAGIC, len(entries), width, offset,
+                             len(header), index_offset))
+    os.replace(tmp_path, path)
+    return len(entries)
+
+
+class Snapshot:
+    """A snapshot file opened through mmap for lookups by key"""
+
+    def __init__(self, path):
+        """Maps the file and reads its prelude and header"""
+        with open(path, 'rb') as f:
+            self.__map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self.__count, width, header_offset, header_length,
+         self.__index) = PRELUDE.unpack_from(self.__map)
+        if magic != MAGIC:
+            self.__map.close()
+            raise ValueError("{} is not a snapshot".format(path))
+        header = self.__map[header_offset:header_offset + header_length]
+        header = json.loads(header)
+        self.counts = header["counts"]
+        self.source = header.get("source")
+        self.__entry = entry_format(width)
+
+    def __len__(self):
+        """Returns the number of records"""
+        return self.__count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Unmaps the file"""
+        self.__map.close()
+
+    def count(self, name=None):
+        """Returns the number of records, optionally of one class name"""
+        if name is None:
+            return self.__count
+        return self.counts.get(name, 0)
+
+    def get(self, key):
+        """Returns the JSON text of the record of key, or None"""
+        key = key.encode('utf-8')
+        i = self.__bisect(key)
+        if i == self.__count:
+            return None
+        found, offset, length = self.__read(i)
+        if found != key:
+            return None
+        return self.__map[offset:offset + length].decode('utf-8')
+
+    def items(self, name=None):
+        """Yields (key, JSON text) in key order, of one class name or all"""
+        if name is None:
+            start, stop = 0, self.__count
+        else:
+            start = self.__bisect(name.encode('utf-8') + b'.')
+            # '/' sorts right after '.', so this ends the "<name>." range
+            stop = self.__bisect(name.encode('utf-8') + b'/')
+        for i in range(start, stop):
+            key, offset, length = self.__read(i)
+            yield (key.decode('utf-8'),
+                   self.__map[offset:offset + length].decode('utf-8'))
+
+    def __read(self, i):
+        """Returns the (key, offset, length) of the i-th index entry"""
+        key, offset, length = self.__entry.unpack_from(
+            self.__map, self.__index + i * self.__entry.size)
+        return key.rstrip(b'\0'), offset, length
+
+    def __bisect(self, key):
+        """Returns the position of the first index key not below key"""
+        low, high = 0, self.__count
+        while low < high:
+            mid = (low + high) // 2
+            if self.__read(mid)[0] < key:
+                low = mid + 1
+            else:
+                high = mid
+        return low
@@ -0,0 +1,57 @@
+#!/usr/bin/python3
+"""Defines the SortedKeys class used by storage for ordered iteration"""
+import bisect
+
+# up to this many added keys are inserted one by one rather than sorted
+INSERTS = 64
+
+
+class SortedKeys:
+    """Keeps the keys of one class in sorted order
+
+    Keys added since the last read are appended and merged in on the
+    next read: a few by binary insertion, more by a single sort, so a
+    run of new() calls costs one merge rather than one insertion each.
+    version changes whenever the keys do, so a reader that pauses
+    between keys knows to find its place again.
+    """
+
+    def __init__(self, keys=()):
+        """Sorts the initial keys"""
+        self.__keys = sorted(keys)
+        self.__added = []
+        self.version = 0
+
+    def __len__(self):
+        """Returns the number of keys"""
+        return len(self.__keys) + len(self.__added)
+
+    def add(self, key):
+        """Adds a key that is not held yet"""
+        self.__added.append(key)
+        self.version += 1
+
+    def remove(self, key):
+        """Drops a key, if held"""
+        keys = self.__keys
+        i = bisect.bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            del keys[i]
+        elif key in self.__added:
+            self.__added.remove(key)
+        else:
+            return
+        self.version += 1
+
+    def keys(self):
+        """Returns the sorted list of keys itself, which must not be changed"""
+        if not self.__added:
+            return self.__keys
+        if len(self.__added) > INSERTS:
+            self.__keys.extend(self.__added)
+            self.__keys.sort()
+        else:
+            for key in self.__added:
+                bisect.insort(self.__keys, key)
+        self.__added = []
+        return self.__keys
@@ -0,0 +1,442 @@
+#!/usr/bin/python3
+"""Defines the SQLiteStorage class, an embedded sqlite3 storage engine"""
+import json
+import math
+import sqlite3
+from contextlib import contextmanager
+from os import getenv
+from models.engine.file_storage import classes
+from models.engine.geo_index import EARTH_RADIUS_KM, bounds, distance
+from models.engine.metrics import Metrics, instrument
+from models.engine.text_index import QUERY_WORD, TextIndex
+
+
+class SQLiteStorage:
+    """Stores each model class in its own table of a SQLite database
+
+    A row holds the to_dict() JSON of an object in its data column, plus
+    one column per attribute the class lists in __indexes__ (with an SQL
+    index) or __columns__, so filter() and query() run in SQL. new() and
+    delete() queue changes, reads flush them, and save() writes only
+    those rows before committing. The database runs in WAL mode so that
+    readers in other processes do not block the writer.
+
+    With HBNB_METRICS=1 the public operations are timed and the SQL
+    statements run are counted; see metrics().
+    """
+    __path = 'hbnb.db'
+
+    def __init__(self, path=None):
+        """Sets the database path; the file is opened by reload()"""
+        self.__conn = None
+        self.__objects = {}
+        self.__pending = {}
+        self.__batch_depth = 0
+        if path:
+            self.__path = path
+        elif getenv("HBNB_SQLITE_PATH"):
+            self.__path = getenv("HBNB_SQLITE_PATH")
+        self.__metrics = None
+        if getenv("HBNB_METRICS") == "1":
+            self.__metrics = Metrics()
+            instrument(self, self.__metrics)
+
+    def all(self, cls=None):
+        """Returns a dictionary of every object, or of one class"""
+        names = [self.__name(cls)] if cls else list(classes)
+        dic = {}
+        for name in names:
+            dic.update(self.__select(name))
+        return dic
+
+    def get(self, cls, id):
+        """Returns the object of cls with that id, or None"""
+        name = self.__name(cls)
+        key = "{}.{}".format(name, id)
+        obj = self.__objects.get(key)
+        if obj is None:
+            obj = self.__select(name, ['id = ?'], [id]).get(key)
+        return obj
+
+    def iter(self, cls=None, batch_size=1000, limit=None, offset=0,
+             after=None, order=None):
+        """Yields (key, obj) pairs of one class, or of all, ordered by key
+
+        Rows are fetched batch_size at a time and objects not already in
+        the identity map are not kept. limit and offset page through the
+        pairs and after resumes past the last key of a previous page.
+        order ("attr" or "-attr" for descending) sorts one class by an
+        attribute instead; it cannot be combined with after.
+        """
+        if order and (not cls or after):
+            raise ValueError("order needs a class and no after key")
+        names = [self.__name(cls)] if cls else sorted(classes)
+        for name in names:
+            if limit is not None and limit <= 0:
+                return
+            where, params = '', []
+            if after:
+                after_name, after_id = after.split('.', 1)
+                if name < after_name:
+                    continue
+                if name == after_name:
+                    where, params = ' WHERE id > ?', [after_id]
+            if offset:
+                sql = 'SELECT COUNT(*) FROM "{}"{}'.format(name, where)
+                total = self.__execute(sql, params).fetchone()[0]
+                if total <= offset:
+                    offset -= total
+                    continue
+            order_by = 'id'
+            if order:
+                attr = order.lstrip('-')
+                if attr in self.__fields(classes[name]) + (
+                        'id', 'created_at', 'updated_at'):
+                    order_by = '"{}"'.format(attr)
+                else:
+                    order_by = 'json_extract(data, ?)'
+                    params.append('$.' + attr)
+                if order.startswith('-'):
+                    order_by += ' DESC'
+                order_by += ', id'
+            sql = ('SELECT id, data FROM "{}"{} ORDER BY {} LIMIT ? OFFSET ?'
+                   .format(name, where, order_by))
+            params += [-1 if limit is None else limit, offset]
+            offset = 0
+            cursor = self.__execute(sql, params)
+            rows = cursor.fetchmany(batch_size)
+            while rows:
+                for oid, data in rows:
+                    key = "{}.{}".format(name, oid)
+                    obj = self.__objects.get(key)
+                    if obj is None:
+                        obj = classes[name].from_dict(json.loads(data))
+                    if limit is not None:
+                        limit -= 1
+                    yield key, obj
+                rows = cursor.fetchmany(batch_size)
+
+    def count(self, cls=None):
+        """Returns the number of rows of one class, or of every class"""
+        names = [self.__name(cls)] if cls else list(classes)
+        total = 0
+        for name in names:
+            sql = 'SELECT COUNT(*) FROM "{}"'.format(name)
+            total += self.__execute(sql).fetchone()[0]
+        return total
+
+    def filter(self, cls, **equals):
+        """Returns {key: obj} of cls whose attributes equal the values"""
+        name = self.__name(cls)
+        fields = self.__fields(classes[name]) + ('id',)
+        where, params = [], []
+        for attr, value in equals.items():
+            if attr in fields:
+                where.append('"{}" = ?'.format(attr))
+                params.append(self.__value(value))
+        dic = self.__select(name, where, params)
+        return {k: v for k, v in dic.items()
+                if all(getattr(v, attr, None) == value
+                       for attr, value in equals.items())}
+
+    def query(self, cls, **ranges):
+        """Returns {key: obj} of cls whose attributes lie in the ranges
+
+        Each range is an inclusive (low, high) tuple, either bound may be
+        None; attributes without a column are checked in Python.
+        """
+        name = self.__name(cls)
+        fields = self.__fields(classes[name])
+        where, params, others = [], [], {}
+        for attr, (low, high) in ranges.items():
+            if attr not in fields:
+                others[attr] = (low, high)
+                continue
+            if low is not None:
+                where.append('"{}" >= ?'.format(attr))
+                params.append(low)
+            if high is not None:
+                where.append('"{}" <= ?'.format(attr))
+                params.append(high)
+        dic = self.__select(name, where, params)
+        return {k: v for k, v in dic.items()
+                if all(self.__in_range(getattr(v, attr, None), *bounds)
+                       for attr, bounds in others.items())}
+
+    def within(self, cls, south, west, north, east):
+        """Returns {key: obj} of cls inside a bounding box
+
+        A box with west greater than east crosses the antimeridian; a
+        class without __geo__ has nothing inside it.
+        """
+        name = self.__name(cls)
+        if not classes[name].__geo__:
+            return {}
+        lat, lon = classes[name].__geo__
+        where = ['"{}" BETWEEN ? AND ?'.format(lat)]
+        if west <= east:
+            where.append('"{}" BETWEEN ? AND ?'.format(lon))
+        else:
+            where.append('("{0}" >= ? OR "{0}" <= ?)'.format(lon))
+        return self.__select(name, where, [south, north, west, east])
+
+    def near(self, cls, lat, lon, radius_km):
+        """Returns {key: obj} of cls within radius_km, closest first"""
+        name = self.__name(cls)
+        if not classes[name].__geo__:
+            return {}
+        south, west, north, east = bounds(lat, lon, radius_km)
+        if east - west < 360:
+            if west < -180:
+                west += 360
+            if east > 180:
+                east -= 360
+        lat_attr, lon_attr = classes[name].__geo__
+        found = []
+        for key, obj in self.within(name, south, west, north, east).items():
+            km = distance(lat, lon, getattr(obj, lat_attr),
+                          getattr(obj, lon_attr))
+            if km <= radius_km:
+                found.append((km, key, obj))
+        found.sort(key=lambda item: item[:2])
+        return {key: obj for _, key, obj in found}
+
+    def nearest(self, cls, lat, lon, k=1):
+        """Returns {key: obj} of the k objects of cls closest to a point"""
+        radius_km = 1.0
+        while True:
+            dic = self.near(cls, lat, lon, radius_km)
+            if len(dic) >= k or radius_km > math.pi * EARTH_RADIUS_KM:
+                return dict(list(dic.items())[:k])
+            radius_km *= 4
+
+    def metrics(self, reset=False):
+        """Returns the counters and operation latencies, {} if disabled
+
+        reset starts them over once they are read.
+        """
+        if self.__metrics is None:
+            return {}
+        data = self.__metrics.snapshot()
+        if reset:
+            self.__metrics.reset()
+        return data
+
+    def search(self, cls, query, limit=None):
+        """Returns {key: obj} of cls matching the words of query, best first
+
+        The rows holding any word in a __text__ attribute are read with
+        LIKE on their JSON and ranked by a TextIndex over them.
+        """
+        name = self.__name(cls)
+        fields = classes[name].__text__
+        words = [word.rstrip('*') for word in
+                 QUERY_WORD.findall(query.lower())]
+        if not fields or not words:
+            return {}
+        where, params = [], []
+        for field in fields:
+            for word in words:
+                where.append('json_extract(data, ?) LIKE ?')
+                params.extend(('$.' + field, '%' + word + '%'))
+        dic = self.__select(name, ['(' + ' OR '.join(where) + ')'], params)
+        index = TextIndex(fields)
+        for key, obj in dic.items():
+            index.set(key, obj)
+        return {key: dic[key] for _, key in
+                index.search(query, limit, total=self.count(name))}
+
+    def new(self, obj):
+        """Queues obj to be written by the next save()"""
+        if obj:
+            key = "{}.{}".format(type(obj).__name__, obj.id)
+            self.__objects[key] = obj
+            self.__pending[key] = obj
+
+    def bulk_new(self, objects, chunk_size=1000):
+        """Writes objects chunk_size rows at a time; returns how many
+
+        Each chunk is committed unless a batch is open. The objects are
+        not kept in the identity map, so large imports stay small.
+        """
+        total = 0
+        for obj in objects:
+            key = "{}.{}".format(type(obj).__name__, obj.id)
+            self.__objects.pop(key, None)
+            self.__pending[key] = obj
+            total += 1
+            if len(self.__pending) >= chunk_size:
+                self.save()
+        self.save()
+        return total
+
+    def save(self):
+        """Writes the queued rows and commits, unless a batch is open"""
+        self.__flush()
+        if not self.__batch_depth and self.__conn is not None:
+            self.__conn.commit()
+
+    def delete(self, obj=None):
+        """Queues the row of obj for deletion"""
+        if obj:
+            key = "{}.{}".format(type(obj).__name__, obj.id)
+            self.__objects.pop(key, None)
+            self.__pending[key] = None
+
+    def begin(self):
+        """Starts a batch: save() writes rows without committing"""
+        self.__batch_depth += 1
+
+    def commit(self):
+        """Ends a batch, committing once when the outermost one ends"""
+        if self.__batch_depth:
+            self.__batch_depth -= 1
+            if not self.__batch_depth:
+                self.save()
+
+    def checkpoint(self):
+        """Commits what the open batch wrote so far, keeping it open"""
+        if self.__batch_depth:
+            self.__flush()
+            if self.__conn is not None:
+                self.__conn.commit()
+
+    def rollback(self):
+        """Abandons every open batch and the changes made inside it"""
+        if self.__batch_depth:
+            self.__batch_depth = 0
+            self.__pending = {}
+            self.__objects = {}
+            if self.__conn is not None:
+                self.__conn.rollback()
+
+    @contextmanager
+    def batch(self):
+        """Defers the commit to the end of the block, rolling back on error"""
+        self.begin()
+        try:
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        self.commit()
+
+    def reload(self):
+        """Opens the database and creates or extends the class tables"""
+        conn = self.__connect()
+        for name, cls in classes.items():
+            fields = self.__fields(cls)
+            conn.execute('CREATE TABLE IF NOT EXISTS "{}" (id TEXT PRIMARY '
+                         'KEY, created_at TEXT, updated_at TEXT, data TEXT '
+                         'NOT NULL)'.format(name))
+            sql = 'PRAGMA table_info("{}")'.format(name)
+            existing = {row[1] for row in conn.execute(sql)}
+            for field in fields:
+                if field in existing:
+                    continue
+                conn.execute('ALTER TABLE "{0}" ADD COLUMN "{1}"'
+                             .format(name, field))
+                conn.execute('UPDATE "{0}" SET "{1}" = json_extract(data, ?)'
+                             .format(name, field), ('$.' + field,))
+            for field in cls.__indexes__:
+                conn.execute('CREATE INDEX IF NOT EXISTS "{0}_{1}" ON "{0}" '
+                             '("{1}")'.format(name, field))
+        conn.commit()
+
+    def close(self):
+        """Closes the database, dropping uncommitted changes"""
+        if self.__conn is not None:
+            self.__conn.close()
+            self.__conn = None
+        self.__objects = {}
+        self.__pending = {}
+        self.__batch_depth = 0
+
+    def __connect(self):
+        """Returns the open connection, opening it in WAL mode if needed"""
+        if self.__conn is None:
+            self.__conn = sqlite3.connect(self.__path)
+            self.__conn.execute('PRAGMA journal_mode=WAL')
+            self.__conn.execute('PRAGMA synchronous=NORMAL')
+            if self.__metrics is not None:
+                self.__conn.set_trace_callback(
+                    lambda sql: self.__metrics.add("statements"))
+        return self.__conn
+
+    def __execute(self, sql, params=()):
+        """Flushes queued changes, then runs a read statement"""
+        self.__flush()
+        return self.__connect().execute(sql, params)
+
+    def __select(self, name, where=(), params=()):
+        """Returns {key: obj} for the rows of a class matching where"""
+        sql = 'SELECT id, data FROM "{}"'.format(name)
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        dic = {}
+        for oid, data in self.__execute(sql, params):
+            key = "{}.{}".format(name, oid)
+            obj = self.__objects.get(key)
+            if obj is None:
+                obj = classes[name].from_dict(json.loads(data))
+                self.__objects[key] = obj
+            dic[key] = obj
+        return dic
+
+    def __flush(self):
+        """Writes queued inserts, updates and deletes without committing"""
+        if not self.__pending:
+            return
+        pending, self.__pending = self.__pending, {}
+        upserts, deletes = {}, {}
+        for key, obj in pending.items():
+            name, oid = key.split('.', 1)
+            if obj is None:
+                deletes.setdefault(name, []).append((oid,))
+                continue
+            row = [obj.id, obj.created_at.isoformat(),
+                   obj.updated_at.isoformat(), json.dumps(obj.to_dict())]
+            for field in self.__fields(type(obj)):
+                row.append(self.__value(getattr(obj, field, None)))
+            upserts.setdefault(name, []).append(row)
+            obj._changed = False
+        conn = self.__connect()
+        for name, rows in deletes.items():
+            conn.executemany('DELETE FROM "{}" WHERE id = ?'.format(name),
+                             rows)
+        for name, rows in upserts.items():
+            columns = ['id', 'created_at', 'updated_at', 'data']
+            columns += self.__fields(classes[name])
+            conn.executemany('INSERT OR REPLACE INTO "{}" ({}) VALUES ({})'
+                             .format(name,
+                                     ', '.join('"{}"'.format(c)
+                                               for c in columns),
+                                     ', '.join('?' * len(columns))), rows)
+
+    @staticmethod
+    def __fields(cls):
+        """Returns the attributes of cls that get their own column"""
+        return tuple(dict.fromkeys(cls.__indexes__ + cls.__columns__))
+
+    @staticmethod
+    def __in_range(value, low, high):
+        """Tells whether value lies in the inclusive range [low, high]"""
+        try:
+            return ((low is None or value >= low) and
+                    (high is None or value <= high))
+        except TypeError:
+            return False
+
+    @staticmethod
+    def __name(cls):
+        """Returns the class name of a class or class name"""
+        if isinstance(cls, str):
+            return cls
+        return cls.__name__
+
+    @staticmethod
+    def __value(value):
+        """Returns value in a type sqlite3 can bind"""
+        if value is None or isinstance(value, (str, int, float)):
+            return value
+        return json.dumps(value, default=str)
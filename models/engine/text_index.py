@@ -0,0 +1,159 @@
+#!/usr/bin/python3
+"""Defines the TextIndex class used by storage for full-text search"""
+import bisect
+import heapq
+import math
+import re
+
+WORD = re.compile(r"\w+")
+QUERY_WORD = re.compile(r"\w+\*?")
+# Okapi BM25 term frequency saturation and length normalization
+K1 = 1.2
+B = 0.75
+
+
+def tokenize(text):
+    """Returns the lowercase words of a text"""
+    return WORD.findall(text.lower())
+
+
+class TextIndex:
+    """Keeps an inverted index of the words in text attributes of one class
+
+    postings maps every word to {key: occurrences}, and lengths the key
+    of every record to its number of words. The sorted word list used
+    for prefix queries is rebuilt only after words were added or gone,
+    and the words of each key, needed to remove it, only when a loaded
+    index is first changed.
+    """
+
+    def __init__(self, fields):
+        """Creates an empty index over the named text attributes"""
+        self.fields = tuple(fields)
+        self.postings = {}
+        self.lengths = {}
+        self.total = 0
+        self.__terms = {}
+        self.__sorted = None
+
+    def __len__(self):
+        """Returns the number of records"""
+        return len(self.lengths)
+
+    def set(self, key, obj):
+        """Inserts or refreshes the words of key from obj's attributes"""
+        words = []
+        for field in self.fields:
+            value = getattr(obj, field, None)
+            if isinstance(value, str):
+                words.extend(tokenize(value))
+        counts = {}
+        for word in words:
+            counts[word] = counts.get(word, 0) + 1
+        self.put(key, len(words), counts)
+
+    def put(self, key, length, counts):
+        """Inserts or refreshes key from its length and {word: occurrences}"""
+        self.remove(key)
+        for word, count in counts.items():
+            postings = self.postings.get(word)
+            if postings is None:
+                postings = self.postings[word] = {}
+                self.__sorted = None
+            postings[key] = count
+        self.lengths[key] = length
+        self.total += length
+        self.__terms[key] = tuple(counts)
+
+    def entry(self, key):
+        """Returns (length, {word: occurrences}) of key, or None"""
+        if self.__terms is None:
+            self.__terms = self.__key_terms()
+        terms = self.__terms.get(key)
+        if terms is None:
+            return None
+        return self.lengths[key], {word: self.postings[word][key]
+                                   for word in terms}
+
+    def remove(self, key):
+        """Drops the words of key, if any"""
+        if self.__terms is None:
+            self.__terms = self.__key_terms()
+        terms = self.__terms.pop(key, None)
+        if terms is None:
+            return
+        self.total -= self.lengths.pop(key)
+        for word in terms:
+            postings = self.postings[word]
+            del postings[key]
+            if not postings:
+                del self.postings[word]
+                self.__sorted = None
+
+    def search(self, query, limit=None, total=None):
+        """Returns [(score, key)] of the records matching query, best first
+
+        Every word of the query is a term, and a word ending with *
+        stands for every indexed word it prefixes. Records match any
+        term and score the sum of its BM25 weights. total overrides the
+        number of records used for the inverse document frequency, for
+        an index built over the candidates of a larger table.
+        """
+        count = total or len(self.lengths)
+        if not self.lengths:
+            return []
+        average = self.total / len(self.lengths) or 1
+        scores = {}
+        for word in QUERY_WORD.findall(query.lower()):
+            if word.endswith('*'):
+                terms = self.__expand(word[:-1])
+            else:
+                terms = [word] if word in self.postings else []
+            for term in terms:
+                postings = self.postings[term]
+                df = len(postings)
+                idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+                for key, tf in postings.items():
+                    norm = K1 * (1 - B + B * self.lengths[key] / average)
+                    scores[key] = (scores.get(key, 0.0) +
+                                   idf * tf * (K1 + 1) / (tf + norm))
+        ranked = ((-score, key) for key, score in scores.items())
+        if limit is None:
+            ranked = sorted(ranked)
+        else:
+            ranked = heapq.nsmallest(limit, ranked)
+        return [(-score, key) for score, key in ranked]
+
+    def to_dict(self):
+        """Returns the index as plain data for json.dumps"""
+        return {"fields": list(self.fields), "postings": self.postings,
+                "lengths": self.lengths}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuilds an index from to_dict() output"""
+        index = cls(data["fields"])
+        index.postings = data["postings"]
+        index.lengths = data["lengths"]
+        index.total = sum(index.lengths.values())
+        index.__terms = None
+        return index
+
+    def __key_terms(self):
+        """Returns {key: words} from the postings"""
+        terms = {key: [] for key in self.lengths}
+        for word, postings in self.postings.items():
+            for key in postings:
+                terms[key].append(word)
+        return terms
+
+    def __expand(self, prefix):
+        """Returns the indexed words starting with prefix"""
+        if self.__sorted is None:
+            self.__sorted = sorted(self.postings)
+        start = bisect.bisect_left(self.__sorted, prefix)
+        stop = start
+        while (stop < len(self.__sorted) and
+               self.__sorted[stop].startswith(prefix)):
+            stop += 1
+        return self.__sorted[start:stop]
@@ -1,18 +1,75 @@
 #!/usr/bin/python3
 """Place class that inherits from BaseModel"""
-from models.base_model import BaseModel
+from os import getenv
+from sqlalchemy import Column, Float, ForeignKey, Integer, String, Table
+from sqlalchemy.orm import relationship
+import models
+from models.base_model import BaseModel, Base
+from models.amenity import Amenity
+from models.review import Review
 
+if getenv("HBNB_TYPE_STORAGE") == "db":
+    place_amenity = Table(
+        "place_amenity", Base.metadata,
+        Column("place_id", String(60), ForeignKey("places.id"),
+               primary_key=True, nullable=False),
+        Column("amenity_id", String(60), ForeignKey("amenities.id"),
+               primary_key=True, nullable=False))
 
-class Place(BaseModel):
+
+class Place(BaseModel, Base):
     """Place class with multiple public attributes"""
-    city_id = ""
-    user_id = ""
-    name = ""
-    description = ""
-    number_rooms = 0
-    number_bathrooms = 0
-    max_guest = 0
-    price_by_night = 0
-    latitude = 0.0
-    longitude = 0.0
-    amenity_ids = []
+    __indexes__ = ("city_id", "user_id")
+    __columns__ = ("number_rooms", "number_bathrooms", "max_guest",
+                   "price_by_night", "latitude", "longitude")
+    __geo__ = ("latitude", "longitude")
+    __text__ = ("name", "description")
+    if getenv("HBNB_TYPE_STORAGE") == "db":
+        __tablename__ = "places"
+        city_id = Column(String(60), ForeignKey("cities.id"),
+                         nullable=False, index=True)
+        user_id = Column(String(60), ForeignKey("users.id"),
+                         nullable=False, index=True)
+        name = Column(String(128), nullable=False)
+        description = Column(String(1024))
+        number_rooms = Column(Integer, nullable=False, default=0)
+        number_bathrooms = Column(Integer, nullable=False, default=0)
+        max_guest = Column(Integer, nullable=False, default=0)
+        price_by_night = Column(Integer, nullable=False, default=0)
+        latitude = Column(Float)
+        longitude = Column(Float)
+        reviews = relationship("Review", cascade="all, delete")
+        amenities = relationship("Amenity", secondary=place_amenity,
+                                 viewonly=False)
+    else:
+        city_id = ""
+        user_id = ""
+        name = ""
+        description = ""
+        number_rooms = 0
+        number_bathrooms = 0
+        max_guest = 0
+        price_by_night = 0
+        latitude = 0.0
+        longitude = 0.0
+        amenity_ids = []
+
+        @property
+        def reviews(self):
+            """Returns the Review objects whose place_id is this place"""
+            return list(models.storage.filter(Review, place_id=self.id)
+                        .values())
+
+        @property
+        def amenities(self):
+            """Returns the Amenity objects listed in amenity_ids"""
+            amenities = (models.storage.get(Amenity, amenity_id)
+                         for amenity_id in self.amenity_ids)
+            return [amenity for amenity in amenities if amenity is not None]
+
+        @amenities.setter
+        def amenities(self, amenity):
+            """Adds the id of an Amenity to amenity_ids"""
+            if (isinstance(amenity, Amenity) and
+                    amenity.id not in self.amenity_ids):
+                self.amenity_ids = self.amenity_ids + [amenity.id]
@@ -1,10 +1,22 @@
 #!/usr/bin/python3
 """Review class that inherits from BaseModel"""
-from models.base_model import BaseModel
+from os import getenv
+from sqlalchemy import Column, ForeignKey, String
+from models.base_model import BaseModel, Base
 
 
-class Review(BaseModel):
+class Review(BaseModel, Base):
     """Review class with public attributes place_id, user_id, and text"""
-    place_id = ""
-    user_id = ""
-    text = ""
+    __indexes__ = ("place_id", "user_id")
+    __text__ = ("text",)
+    if getenv("HBNB_TYPE_STORAGE") == "db":
+        __tablename__ = "reviews"
+        place_id = Column(String(60), ForeignKey("places.id"),
+                          nullable=False, index=True)
+        user_id = Column(String(60), ForeignKey("users.id"),
+                         nullable=False, index=True)
+        text = Column(String(1024), nullable=False)
+    else:
+        place_id = ""
+        user_id = ""
+        text = ""
@@ -1,8 +1,24 @@
 #!/usr/bin/python3
 """State class that inherits from BaseModel"""
-from models.base_model import BaseModel
+from os import getenv
+from sqlalchemy import Column, String
+from sqlalchemy.orm import relationship
+import models
+from models.base_model import BaseModel, Base
+from models.city import City
 
 
-class State(BaseModel):
+class State(BaseModel, Base):
     """State class with public attribute name"""
-    name = ""
+    if getenv("HBNB_TYPE_STORAGE") == "db":
+        __tablename__ = "states"
+        name = Column(String(128), nullable=False)
+        cities = relationship("City", cascade="all, delete")
+    else:
+        name = ""
+
+        @property
+        def cities(self):
+            """Returns the City objects whose state_id is this state"""
+            return list(models.storage.filter(City, state_id=self.id)
+                        .values())
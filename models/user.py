@@ -1,11 +1,30 @@
 #!/usr/bin/python3
 """This module defines a class User"""
-from models.base_model import BaseModel
+from os import getenv
+from sqlalchemy import Column, String
+from sqlalchemy.orm import relationship
+import models
+from models.base_model import BaseModel, Base
+from models.place import Place
 
 
-class User(BaseModel):
+class User(BaseModel, Base):
     """This class defines a user by various attributes"""
-    email = ""
-    password = ""
-    first_name = ""
-    last_name = ""
+    if getenv("HBNB_TYPE_STORAGE") == "db":
+        __tablename__ = "users"
+        email = Column(String(128), nullable=False)
+        password = Column(String(128), nullable=False)
+        first_name = Column(String(128))
+        last_name = Column(String(128))
+        places = relationship("Place", cascade="all, delete")
+    else:
+        email = ""
+        password = ""
+        first_name = ""
+        last_name = ""
+
+        @property
+        def places(self):
+            """Returns the Place objects whose user_id is this user"""
+            return list(models.storage.filter(Place, user_id=self.id)
+                        .values())
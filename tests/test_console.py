@@ -3,8 +3,10 @@
 import unittest
 from unittest.mock import patch
 from io import StringIO
+import glob
 import os
-from console import HBNBCommand
+import tempfile
+from console import HBNBCommand, main
 from models import storage
 from models.base_model import BaseModel
 from models.user import User
@@ -38,10 +40,11 @@ class TestConsoleComprehensive(unittest.TestCase):
 
     def tearDown(self):
         """Clean up after tests"""
-        try:
-            os.remove("file.json")
-        except FileNotFoundError:
-            pass
+        for path in ["file.json"] + glob.glob("file.json.*.idx"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
 
     def create_instance(self, class_name):
         """Helper to create instance and return id"""
@@ -58,6 +61,62 @@ class TestConsoleComprehensive(unittest.TestCase):
                 output = f.getvalue().strip()
                 self.assertEqual(output, "[]")
 
+    def test_all_prints_a_list(self):
+        """Test all prints every instance as a list in key order"""
+        ids = [self.create_instance("State") for _ in range(3)]
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd("all State")
+            expected = [str(storage.all("State")[f"State.{obj_id}"])
+                        for obj_id in sorted(ids)]
+            self.assertEqual(f.getvalue(), str(expected) + "\n")
+
+    def test_all_paginated_lines(self):
+        """Test all with limit, offset, after, order and lines"""
+        ids = sorted(self.create_instance("State") for _ in range(4))
+        for name, obj_id in zip("dcba", ids):
+            self.console.onecmd(f'update State {obj_id} name "{name}"')
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd("all State limit=2 offset=1 lines")
+            self.assertEqual([line.split()[1] for line in
+                              f.getvalue().splitlines()],
+                             [f"({obj_id})" for obj_id in ids[1:3]])
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd(f"State.all(after=State.{ids[2]}, lines)")
+            self.assertEqual(f.getvalue().count("[State]"), 1)
+            self.assertIn(ids[3], f.getvalue())
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd("all State order=-name limit=1")
+            output = f.getvalue()
+            self.assertTrue(output.startswith("[") and ids[0] in output)
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd("all State order=name limit=1 lines")
+            self.assertIn(ids[3], f.getvalue())
+
+    def test_all_pages_follow_changes(self):
+        """Test pages after a create or destroy stay in key order"""
+        ids = sorted(self.create_instance("State") for _ in range(3))
+        with patch('sys.stdout', new=StringIO()):
+            self.console.onecmd("all State limit=1")
+            self.console.onecmd(f"destroy State {ids[1]}")
+        ids.remove(ids[1])
+        ids = sorted(ids + [self.create_instance("State")])
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd(f"all State after=State.{ids[0]} lines")
+            self.assertEqual([line.split()[1] for line in
+                              f.getvalue().splitlines()],
+                             [f"({obj_id})" for obj_id in ids[1:]])
+
+    def test_all_option_errors(self):
+        """Test all option errors"""
+        for cmd, error in [("all State limit=x", "** invalid option **"),
+                           ("all State colour=red", "** invalid option **"),
+                           ("all order=name", "** class name missing **"),
+                           ("all State order=name after=State.1",
+                            "** invalid option **")]:
+            with patch('sys.stdout', new=StringIO()) as f:
+                self.console.onecmd(cmd)
+                self.assertEqual(error, f.getvalue().strip())
+
     # ----- .count() Tests -----
     def test_count_methods_present(self):
         """Test all .count() methods are present"""
@@ -125,6 +184,50 @@ class TestConsoleComprehensive(unittest.TestCase):
                 self.assertIn("'name': 'test'", output)
                 self.assertIn("'value': 42", output)
 
+    def test_update_saves_once(self):
+        """Test multi-pair and dictionary updates save a single time"""
+        obj_id = self.create_instance("Place")
+        obj = storage.get("Place", obj_id)
+        commands = [f'update Place {obj_id} name "My house" max_guest 4',
+                    f'Place.update("{obj_id}", "name", "Loft", '
+                    f'"latitude", 48.85)',
+                    f'update Place {obj_id} {{"name": "Barn", '
+                    f'"amenity_ids": ["a", "b"]}}']
+        for cmd in commands:
+            with patch.object(storage, 'save') as save:
+                self.console.onecmd(cmd)
+            save.assert_called_once_with()
+        self.assertEqual(obj.name, "Barn")
+        self.assertEqual(obj.max_guest, 4)
+        self.assertEqual(obj.latitude, 48.85)
+        self.assertEqual(obj.amenity_ids, ["a", "b"])
+
+    def test_update_values_are_not_evaluated(self):
+        """Test update only parses literals, leaving code as text"""
+        obj_id = self.create_instance("User")
+        self.console.onecmd(f'update User {obj_id} first_name '
+                            f'"__import__(\'os\').getcwd()"')
+        self.assertEqual(storage.get("User", obj_id).first_name,
+                         "__import__('os').getcwd()")
+
+    def test_update_errors(self):
+        """Test update pair and dictionary errors"""
+        obj_id = self.create_instance("User")
+        for cmd, error in [(f"update User {obj_id} a 1 b",
+                            "** value missing **"),
+                           (f"update User {obj_id} {{1: }}",
+                            "** invalid dictionary **"),
+                           (f"update User {obj_id} {{1, 2}}",
+                            "** invalid dictionary **"),
+                           (f"update User {obj_id} {{'a': 1, 1: 2}}",
+                            "** invalid dictionary **"),
+                           (f"update User {obj_id} {{'a b': 1}}",
+                            "** invalid dictionary **")]:
+            with patch('sys.stdout', new=StringIO()) as f:
+                self.console.onecmd(cmd)
+                self.assertEqual(error, f.getvalue().strip())
+        self.assertFalse(hasattr(storage.get("User", obj_id), "a"))
+
     # ----- Error Handling Tests -----
     def test_invalid_class_errors(self):
         """Test invalid class error handling"""
@@ -153,6 +256,273 @@ class TestConsoleComprehensive(unittest.TestCase):
                     self.console.onecmd(f"{class_name}.{method}")
                     self.assertEqual("** no instance found **", f.getvalue().strip())
 
+    # ----- near Tests -----
+    def test_near(self):
+        """Test near and <class>.near() list places closest first"""
+        paris = Place(latitude=48.8566, longitude=2.3522)
+        london = Place(latitude=51.5072, longitude=-0.1276)
+        storage.new(paris)
+        storage.new(london)
+        for cmd in ["near Place 48.85 2.35 500",
+                    "Place.near(48.85, 2.35, 500)"]:
+            with patch('sys.stdout', new=StringIO()) as f:
+                self.console.onecmd(cmd)
+                output = f.getvalue()
+            self.assertLess(output.index(paris.id), output.index(london.id))
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd("near Place 48.85 2.35 10")
+            self.assertNotIn(london.id, f.getvalue())
+
+    def test_near_errors(self):
+        """Test near argument errors"""
+        for cmd, error in [("near", "** class name missing **"),
+                           ("near Nope 1 2 3", "** class doesn't exist **"),
+                           ("near User 1 2 3", "** class has no location **"),
+                           ("near Place 1 2", "** coordinates missing **"),
+                           ("near Place a b c", "** invalid coordinates **")]:
+            with patch('sys.stdout', new=StringIO()) as f:
+                self.console.onecmd(cmd)
+                self.assertEqual(error, f.getvalue().strip())
+
+    # ----- search Tests -----
+    def test_search(self):
+        """Test search and <class>.search() rank matching places"""
+        loft = Place(name="Sunny loft", description="Loft with a loft bed")
+        barn = Place(name="Old barn", description="Quiet and sunny")
+        storage.new(loft)
+        storage.new(barn)
+        storage.new(Place(name="Cabin"))
+        for cmd in ["search Place loft sunny", 'Place.search("loft sunny")']:
+            with patch('sys.stdout', new=StringIO()) as f:
+                self.console.onecmd(cmd)
+                output = f.getvalue()
+            self.assertLess(output.index(loft.id), output.index(barn.id))
+            self.assertNotIn("Cabin", output)
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd("search Place bar*")
+            self.assertIn(barn.id, f.getvalue())
+            self.assertNotIn(loft.id, f.getvalue())
+
+    def test_search_errors(self):
+        """Test search argument errors"""
+        for cmd, error in [("search", "** class name missing **"),
+                           ("search Nope loft", "** class doesn't exist **"),
+                           ("search Place", "** query missing **")]:
+            with patch('sys.stdout', new=StringIO()) as f:
+                self.console.onecmd(cmd)
+                self.assertEqual(error, f.getvalue().strip())
+
+    # ----- stats Tests -----
+    def test_stats(self):
+        """Test stats prints latencies in ms and counters"""
+        data = {"operations": {"save": {"count": 2, "total": 0.5,
+                                        "mean": 0.25, "p50": 0.25,
+                                        "p95": 0.3, "p99": 0.3,
+                                        "max": 0.3}},
+                "counters": {"bytes_written": 1024}}
+        with patch.object(storage, 'metrics', return_value=data) as metrics:
+            with patch('sys.stdout', new=StringIO()) as f:
+                self.console.onecmd("stats reset")
+            metrics.assert_called_once_with(reset=True)
+        lines = f.getvalue().splitlines()
+        self.assertEqual(lines[1].split(), ["save", "2", "0.500", "250.000",
+                                            "250.000", "300.000", "300.000",
+                                            "300.000"])
+        self.assertEqual(lines[2], "bytes_written 1024")
+
+    def test_stats_errors(self):
+        """Test stats without metrics and with a bad option"""
+        for cmd, error in [("stats", "** metrics disabled **"),
+                           ("stats all", "** invalid option **")]:
+            with patch('sys.stdout', new=StringIO()) as f:
+                self.console.onecmd(cmd)
+                self.assertEqual(error, f.getvalue().strip())
+
+    # ----- import Tests -----
+    def test_import_jsonl_and_csv(self):
+        """Test import loads every line or row and reports the rate"""
+        with tempfile.TemporaryDirectory() as tmp:
+            jsonl = os.path.join(tmp, "states.jsonl")
+            with open(jsonl, "w") as f:
+                f.write('{"name": "CA"}\n\n{"name": "NV"}\n')
+            csv_path = os.path.join(tmp, "places.csv")
+            with open(csv_path, "w") as f:
+                f.write("name,max_guest,latitude\nLoft,4,48.85\nBarn,,\n")
+            with patch('sys.stdout', new=StringIO()) as f:
+                self.console.onecmd(f"import State {jsonl}")
+                self.console.onecmd(f"import Place {csv_path}")
+                lines = f.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith("2 rows in "))
+        self.assertTrue(lines[1].endswith(" rows/s)"))
+        self.assertEqual(sorted(obj.name for obj in
+                                storage.all("State").values()), ["CA", "NV"])
+        places = {obj.name: obj for obj in storage.all("Place").values()}
+        self.assertEqual(places["Loft"].max_guest, 4)
+        self.assertEqual(places["Loft"].latitude, 48.85)
+        self.assertTrue(os.path.exists("file.json"))
+
+    def test_import_csv_keeps_strings(self):
+        """Test import only converts cells of numeric attributes"""
+        with tempfile.TemporaryDirectory() as tmp:
+            csv_path = os.path.join(tmp, "users.csv")
+            with open(csv_path, "w") as f:
+                f.write("first_name,password,email,age\n0123,007,nan,30\n")
+            with patch('sys.stdout', new=StringIO()):
+                self.console.onecmd(f"import User {csv_path}")
+        user, = storage.all("User").values()
+        self.assertEqual((user.first_name, user.password, user.email),
+                         ("0123", "007", "nan"))
+        self.assertEqual(user.age, "30")
+
+    def test_import_invalid_row_drops_its_chunk(self):
+        """Test a bad line adds nothing of its chunk and reports its number"""
+        with tempfile.TemporaryDirectory() as tmp:
+            jsonl = os.path.join(tmp, "states.jsonl")
+            for body, line in [('{"name": "CA"}\n[1, 2]\n', 2),
+                               ('{"name": "CA"}\n\n{"name": \n', 3)]:
+                with open(jsonl, "w") as f:
+                    f.write(body)
+                with patch('sys.stdout', new=StringIO()) as f:
+                    self.console.onecmd(f"import State {jsonl}")
+                    self.assertEqual(f.getvalue().strip(),
+                                     f"** invalid row on line {line} **")
+                self.assertEqual(storage.count("State"), 0)
+        self.assertFalse(os.path.exists("file.json"))
+
+    def test_import_keeps_earlier_chunks(self):
+        """Test chunks before a bad row are kept and an open batch too"""
+        with tempfile.TemporaryDirectory() as tmp:
+            jsonl = os.path.join(tmp, "states.jsonl")
+            with open(jsonl, "w") as f:
+                f.write('{"name": "CA"}\n{"name": "NV"}\n'
+                        '{"name": "OR"}\n{"id": 1, "x": }\n')
+            self.console.onecmd("begin")
+            obj_id = self.create_instance("User")
+            with patch.object(HBNBCommand, 'chunk_size', 2), \
+                    patch('sys.stdout', new=StringIO()) as f:
+                self.console.onecmd(f"import State {jsonl}")
+                lines = f.getvalue().splitlines()
+            self.assertTrue(self.console.in_batch)
+            self.console.onecmd("commit")
+        self.assertEqual(lines[0], "** invalid row on line 4 **")
+        self.assertTrue(lines[1].startswith("2 rows in "))
+        self.assertEqual(sorted(obj.name for obj in
+                                storage.all("State").values()), ["CA", "NV"])
+        self.assertIn(f"User.{obj_id}", storage.all())
+
+    def test_import_unreadable_files(self):
+        """Test text that is not UTF-8 or not CSV is reported"""
+        with tempfile.TemporaryDirectory() as tmp:
+            jsonl = os.path.join(tmp, "states.jsonl")
+            with open(jsonl, "wb") as f:
+                f.write(b'{"name": "\xff"}\n')
+            csv_path = os.path.join(tmp, "states.csv")
+            with open(csv_path, "w") as f:
+                f.write("name\nCA\n" + "x" * 200000 + "\n")
+            with patch('sys.stdout', new=StringIO()) as f:
+                self.console.onecmd(f"import State {jsonl}")
+                self.console.onecmd(f"import State {csv_path}")
+                self.assertEqual(f.getvalue().splitlines(),
+                                 ["** file is not UTF-8 text **",
+                                  "** invalid row on line 3 **"])
+        self.assertEqual(storage.count("State"), 0)
+
+    def test_import_errors(self):
+        """Test import argument errors"""
+        for cmd, error in [("import", "** class name missing **"),
+                           ("import Nope a.csv", "** class doesn't exist **"),
+                           ("import User", "** file name missing **"),
+                           ("import User a.txt",
+                            "** unsupported file type **"),
+                           ("import User nope.csv",
+                            "** file doesn't exist **")]:
+            with patch('sys.stdout', new=StringIO()) as f:
+                self.console.onecmd(cmd)
+                self.assertEqual(error, f.getvalue().strip())
+
+    # ----- batch Tests -----
+    def test_batch_commit(self):
+        """Test begin/commit write the file once at commit"""
+        self.console.onecmd("begin")
+        obj_id = self.create_instance("User")
+        self.assertFalse(os.path.exists("file.json"))
+        with patch('sys.stdout', new=StringIO()) as f:
+            self.console.onecmd("commit")
+            self.assertEqual(f.getvalue().strip(), "")
+        self.assertTrue(os.path.exists("file.json"))
+        self.assertIn(f"User.{obj_id}", storage.all())
+
+    def test_batch_rollback(self):
+        """Test rollback discards objects created since begin"""
+        self.console.onecmd("begin")
+        obj_id = self.create_instance("User")
+        self.console.onecmd("rollback")
+        self.assertNotIn(f"User.{obj_id}", storage.all())
+        self.assertFalse(os.path.exists("file.json"))
+
+    def test_batch_errors(self):
+        """Test commit/rollback without begin"""
+        for command in ["commit", "rollback"]:
+            with patch('sys.stdout', new=StringIO()) as f:
+                self.console.onecmd(command)
+                self.assertEqual("** no batch started **",
+                                 f.getvalue().strip())
+
+    # ----- --batch Tests -----
+    def test_run_batch_saves_every_n(self):
+        """Test run_batch saves every N commands and commits at the end"""
+        lines = ["create User\n", "\n"] * 5
+        with patch.object(storage, 'commit', wraps=storage.commit) as commit, \
+                patch.object(storage, 'checkpoint',
+                             wraps=storage.checkpoint) as checkpoint:
+            with patch('sys.stdout', new=StringIO()) as out, \
+                    patch('sys.stderr', new=StringIO()) as err:
+                self.assertEqual(self.console.run_batch(lines, every=2), 5)
+        self.assertEqual(checkpoint.call_count, 2)
+        self.assertEqual(commit.call_count, 1)
+        self.assertEqual(len(out.getvalue().split()), 5)
+        self.assertIn("5 commands in ", err.getvalue())
+        self.assertFalse(self.console.in_batch)
+        self.assertEqual(storage.count("User"), 5)
+        self.assertTrue(os.path.exists("file.json"))
+
+    def test_run_batch_reports_errors(self):
+        """Test a command that raises is reported and the rest committed"""
+        lines = ["create User", "show User x", "create User"]
+        with patch.object(storage, 'get', side_effect=RuntimeError("boom")):
+            with patch('sys.stdout', new=StringIO()), \
+                    patch('sys.stderr', new=StringIO()) as err:
+                self.assertEqual(self.console.run_batch(lines), 3)
+        self.assertIn("** error on line 2: RuntimeError: boom **",
+                      err.getvalue())
+        self.assertFalse(self.console.in_batch)
+        self.assertEqual(storage.count("User"), 2)
+        self.assertTrue(os.path.exists("file.json"))
+
+    def test_run_batch_commits_when_interrupted(self):
+        """Test commands run before an interrupt are still committed"""
+        lines = ["create User", "show User x", "create User"]
+        with patch.object(storage, 'get', side_effect=KeyboardInterrupt):
+            with patch('sys.stdout', new=StringIO()), \
+                    patch('sys.stderr', new=StringIO()):
+                with self.assertRaises(KeyboardInterrupt):
+                    self.console.run_batch(lines)
+        self.assertFalse(self.console.in_batch)
+        self.assertEqual(storage.count("User"), 1)
+        self.assertTrue(os.path.exists("file.json"))
+
+    def test_main_batch_file(self):
+        """Test console.py --batch FILE stops at quit"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "commands.txt")
+            with open(path, "w") as f:
+                f.write("create State\nquit\ncreate State\n")
+            with patch('sys.stdout', new=StringIO()), \
+                    patch('sys.stderr', new=StringIO()) as err:
+                main(["--batch", path])
+        self.assertIn("2 commands in ", err.getvalue())
+        self.assertEqual(storage.count("State"), 1)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -77,3 +77,27 @@ class TestBaseModel(unittest.TestCase):
         new = BaseModel(**n)
         self.assertAlmostEqual(new.created_at.timestamp(),
                                new.updated_at.timestamp(), delta=1)
+
+    def test_from_dict(self):
+        """ from_dict() rebuilds an equal, unchanged instance """
+        i = self.value()
+        i.name = "Holberton"
+        new = self.value.from_dict(i.to_dict())
+        self.assertFalse(new is i)
+        self.assertEqual(new.to_dict(), i.to_dict())
+        self.assertEqual(type(new.created_at), datetime.datetime)
+        self.assertFalse(new._changed)
+
+    def test_from_dict_missing_keys(self):
+        """ from_dict() falls back to __init__ for partial dicts """
+        new = self.value.from_dict({'name': 'Holberton'})
+        self.assertEqual(new.name, 'Holberton')
+        self.assertEqual(type(new.id), str)
+
+    def test_kwargs_no_microseconds(self):
+        """ Dates without a fractional part are accepted """
+        i = self.value()
+        copy = i.to_dict()
+        copy['created_at'] = '2017-09-28T21:03:54'
+        new = BaseModel(**copy)
+        self.assertEqual(new.created_at.microsecond, 0)
@@ -0,0 +1,64 @@
+#!/usr/bin/python3
+""" Module for testing the column store"""
+import unittest
+from unittest.mock import patch
+
+from models.engine import column_store
+from models.engine.column_store import ColumnStore
+from models.place import Place
+
+
+class TestColumnStore(unittest.TestCase):
+    """ Class to test ColumnStore """
+
+    def setUp(self):
+        """ Three places in a store over two fields """
+        self.store = ColumnStore(("price_by_night", "max_guest"))
+        self.places = {}
+        for key, price, guests in [("a", 50, 2), ("b", 100, 4),
+                                   ("c", 150, 6)]:
+            self.places[key] = Place(price_by_night=price, max_guest=guests)
+            self.store.set(key, self.places[key])
+
+    def test_range_query(self):
+        """ Bounds are inclusive and may be left open """
+        self.assertEqual(self.store.query(price_by_night=(50, 100)),
+                         ["a", "b"])
+        self.assertEqual(self.store.query(price_by_night=(None, 120),
+                                          max_guest=(4, None)), ["b"])
+
+    def test_python_fallback(self):
+        """ The same answers without NumPy """
+        with patch.object(column_store, 'numpy', None):
+            self.assertEqual(self.store.query(price_by_night=(None, 120),
+                                              max_guest=(4, None)), ["b"])
+
+    def test_set_refreshes_row(self):
+        """ set() on a known key updates its values in place """
+        self.places["a"].price_by_night = 500
+        self.store.set("a", self.places["a"])
+        self.assertEqual(len(self.store), 3)
+        self.assertEqual(self.store.query(price_by_night=(400, None)), ["a"])
+
+    def test_remove_keeps_rows_aligned(self):
+        """ Removing a row moves the last one into its place """
+        self.store.remove("a")
+        self.store.remove("missing")
+        self.assertEqual(len(self.store), 2)
+        self.assertEqual(sorted(self.store.query(max_guest=(None, None))),
+                         ["b", "c"])
+        self.assertEqual(self.store.query(price_by_night=(150, 150)), ["c"])
+
+    def test_non_numeric_never_matches(self):
+        """ Values that are not numbers are stored as NaN """
+        self.store.set("d", Place(price_by_night="cheap"))
+        self.assertNotIn("d", self.store.query(price_by_night=(0, None)))
+
+    def test_unknown_field(self):
+        """ Only stored fields can be queried """
+        with self.assertRaises(KeyError):
+            self.store.query(latitude=(0, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
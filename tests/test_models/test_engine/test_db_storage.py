@@ -8,6 +8,10 @@ from models.state import State
 from models.place import Place
 from models.city import City
 import os
+import tempfile
+import threading
+from unittest.mock import patch
+from sqlalchemy import event
 
 
 # skip these test if the storage is not db
@@ -99,5 +103,210 @@ class TestDBStorage(unittest.TestCase):
         self.assertEqual(review.text, "no comment")
 
 
+@unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') != 'db', "skip if not fs")
+class TestDBStorageSQLite(unittest.TestCase):
+    """DBStorage against a file-backed SQLite database"""
+
+    def setUp(self):
+        """ Fresh storage in a temporary directory """
+        from models.engine.db_storage import DBStorage
+        self.tmp = tempfile.TemporaryDirectory()
+        url = "sqlite:///" + os.path.join(self.tmp.name, "hbnb.db")
+        with patch.dict(os.environ, {"HBNB_DB_URL": url,
+                                     "HBNB_DB_POOL_SIZE": "4"}):
+            self.storage = DBStorage()
+        self.storage.reload()
+
+    def tearDown(self):
+        """ Close the storage and remove the database """
+        self.storage.close()
+        self.tmp.cleanup()
+
+    def test_threads_write_concurrently(self):
+        """ Each thread gets its own session and batch """
+        sessions = []
+        errors = []
+
+        def work():
+            try:
+                sessions.append(self.storage._DBStorage__session())
+                with self.storage.batch():
+                    for i in range(20):
+                        self.storage.new(State(name="S{}".format(i)))
+                        self.storage.save()
+            except Exception as error:
+                errors.append(error)
+            finally:
+                self.storage.close()
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(set(map(id, sessions))), 4)
+        self.assertEqual(self.storage.count(State), 80)
+
+    def test_get(self):
+        """ get() returns the session's object and forgets deleted ones """
+        state = State(name="CA")
+        self.storage.new(state)
+        self.storage.save()
+        self.assertIs(self.storage.get(State, state.id), state)
+        self.assertIs(self.storage.get('State', state.id), state)
+        self.storage.delete(state)
+        self.storage.save()
+        self.assertIsNone(self.storage.get(State, state.id))
+
+    def test_get_is_cached(self):
+        """ get() answers a row loaded by any thread from the cache """
+        state = State(name="CA")
+        self.storage.new(state)
+        self.storage.save()
+        self.storage.close()
+        found = []
+
+        def work():
+            found.append(self.storage.get(State, state.id))
+            self.storage.close()
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+        info = self.storage.cache_info()
+        self.assertEqual((info["hits"], info["misses"]), (0, 1))
+        statements = []
+        engine = self.storage._DBStorage__engine
+        listener = (lambda *args: statements.append(args[2]))
+        event.listen(engine, "before_cursor_execute", listener)
+        self.addCleanup(event.remove, engine, "before_cursor_execute",
+                        listener)
+        cached = self.storage.get(State, state.id)
+        self.assertEqual(statements, [])
+        self.assertIsNot(cached, found[0])
+        self.assertEqual((cached.id, cached.name), (state.id, "CA"))
+        self.assertEqual(self.storage.cache_info()["hits"], 1)
+        self.assertIs(self.storage.get(State, state.id), cached)
+
+    def test_other_threads_invalidate_the_cache(self):
+        """ A commit from another thread drops the rows it changed """
+        state = State(name="CA")
+        self.storage.new(state)
+        self.storage.save()
+        self.storage.close()
+        self.storage.get(State, state.id)
+        self.storage.close()
+
+        def rename():
+            self.storage.get(State, state.id).name = "NV"
+            self.storage.save()
+            self.storage.close()
+        thread = threading.Thread(target=rename)
+        thread.start()
+        thread.join()
+        self.assertEqual(self.storage.get(State, state.id).name, "NV")
+        self.storage.close()
+        self.assertEqual(self.storage.get(State, state.id).name, "NV")
+        self.assertEqual(self.storage.cache_info()["size"], 1)
+
+    def test_get_sees_other_threads(self):
+        """ A row deleted by another thread is not returned afterwards """
+        state = State(name="CA")
+        self.storage.new(state)
+        self.storage.save()
+        self.storage.close()
+        self.assertEqual(self.storage.get(State, state.id).id, state.id)
+        self.storage.close()
+
+        def work():
+            self.storage.delete(self.storage.get(State, state.id))
+            self.storage.save()
+            self.storage.close()
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+        self.assertIsNone(self.storage.get(State, state.id))
+
+    def test_pool_size_from_environment(self):
+        """ HBNB_DB_POOL_SIZE sizes the connection pool """
+        engine = self.storage._DBStorage__engine
+        self.assertEqual(engine.pool.size(), 4)
+
+    def test_metrics(self):
+        """ HBNB_METRICS times operations and counts statements """
+        from models.engine.db_storage import DBStorage
+        self.assertEqual(self.storage.metrics(), {})
+        url = "sqlite:///" + os.path.join(self.tmp.name, "hbnb.db")
+        with patch.dict(os.environ, {"HBNB_DB_URL": url,
+                                     "HBNB_METRICS": "1"}):
+            storage = DBStorage()
+        self.addCleanup(storage.close)
+        storage.reload()
+        storage.new(State(name="CA"))
+        storage.save()
+        self.assertEqual(len(storage.all(State)), 1)
+        data = storage.metrics()
+        self.assertEqual(data["operations"]["save"]["count"], 1)
+        self.assertEqual(data["counters"]["all.objects"], 1)
+        self.assertGreater(data["counters"]["statements"], 0)
+
+    def test_search(self):
+        """ search() ranks the rows whose text matches """
+        state = State(name="CA")
+        city = City(name="SF", state_id=state.id)
+        user = User(email="a@b.c", password="pwd")
+        loft = Place(name="Sunny loft", description="A loft bed",
+                     city_id=city.id, user_id=user.id)
+        barn = Place(name="Old barn", description="Quiet and sunny",
+                     city_id=city.id, user_id=user.id)
+        for obj in (state, city, user, loft, barn):
+            self.storage.new(obj)
+        self.storage.save()
+        self.assertEqual(list(self.storage.search(Place, "loft sunny")),
+                         ['Place.' + loft.id, 'Place.' + barn.id])
+        self.assertEqual(list(self.storage.search('Place', "bar*")),
+                         ['Place.' + barn.id])
+        self.assertEqual(self.storage.search(User, "loft"), {})
+
+    def test_class_without_table(self):
+        """ BaseModel has no table, so no rows """
+        self.storage.new(State(name="CA"))
+        self.storage.save()
+        self.assertEqual(self.storage.count('BaseModel'), 0)
+        self.assertIsNone(self.storage.get('BaseModel', "x"))
+        self.assertEqual(self.storage.all('BaseModel'), {})
+        self.assertEqual(self.storage.filter('BaseModel', id="x"), {})
+        self.assertEqual(self.storage.count(), 1)
+
+    def test_near_without_geo(self):
+        """ A class without __geo__ has nothing near a point """
+        self.storage.new(State(name="CA"))
+        self.storage.save()
+        self.assertEqual(self.storage.near(State, 1, 2, 3), {})
+        self.assertEqual(self.storage.within('State', 0, 0, 1, 1), {})
+        self.assertEqual(self.storage.nearest(State, 1, 2), {})
+
+    def test_relationships(self):
+        """ cities, places, reviews and amenities are relationships """
+        state = State(name="CA")
+        city = City(name="SF", state_id=state.id)
+        user = User(email="a@b.c", password="pwd")
+        place = Place(name="Loft", city_id=city.id, user_id=user.id)
+        review = Review(text="Nice", place_id=place.id, user_id=user.id)
+        amenity = Amenity(name="Wifi")
+        place.amenities.append(amenity)
+        for obj in (state, city, user, place, review, amenity):
+            self.storage.new(obj)
+        self.storage.save()
+        self.assertEqual(state.cities, [city])
+        self.assertEqual(user.places, [place])
+        self.assertEqual(place.reviews, [review])
+        self.assertEqual(place.amenities, [amenity])
+        self.assertNotIn('cities', state.to_dict())
+        self.storage.delete(state)
+        self.storage.save()
+        self.assertIsNone(self.storage.get(City, city.id))
+
+
 if __name__ == '__main__':
     unittest.main()
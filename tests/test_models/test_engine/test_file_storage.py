@@ -2,9 +2,25 @@
 """ Module for testing file storage"""
 import unittest
 
+import asyncio
+import json
 import models
+from models.amenity import Amenity
 from models.base_model import BaseModel
+from models.engine.file_storage import FileStorage
+from models.city import City
+from models.place import Place
+from models.review import Review
+from models.state import State
+from models.user import User
 import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from unittest.mock import patch
 
 
 @unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') == 'db', "skip if not db")
@@ -112,3 +128,1161 @@ class TestFileStorage(unittest.TestCase):
         from models.engine.file_storage import FileStorage
         print(type(self.storage))
         self.assertEqual(type(self.storage), FileStorage)
+
+    def test_conflicting_modes_raise(self):
+        """ Modes that write the files their own way cannot be combined """
+        from models.engine.file_storage import FileStorage
+        for modes in ({"journal": True, "shared": True},
+                      {"journal": True, "write_behind": 1},
+                      {"shared": True, "shards": 2},
+                      {"write_behind": 1, "shards": 1},
+                      {"shards": 1, "snapshot": True}):
+            with self.assertRaises(ValueError):
+                FileStorage('unused.json', **modes)
+        with patch.dict(os.environ, {"HBNB_FILE_SHARDS": "4",
+                                     "HBNB_FILE_JOURNAL": "1"}):
+            with self.assertRaises(ValueError):
+                FileStorage('unused.json')
+        FileStorage('unused.json', journal=True, lazy=True)
+
+
+@unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') == 'db', "skip if not db")
+class TestFileStorageJournal(unittest.TestCase):
+    """ Tests for the append-only journal mode """
+
+    def setUp(self):
+        """ Journaled storage on a temporary path """
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'file.json')
+        self.storage = FileStorage(self.path, journal=True)
+
+    def tearDown(self):
+        """ Remove the temporary files """
+        shutil.rmtree(self.tmp)
+
+    def test_save_appends_changes_only(self):
+        """ save() appends to the log and leaves the snapshot alone """
+        self.storage.new(User())
+        self.storage.save()
+        self.assertFalse(os.path.exists(self.path))
+        self.storage.new(User())
+        self.storage.save()
+        with open(self.path + '.log') as f:
+            self.assertEqual(len(f.readlines()), 2)
+
+    def test_reload_replays_log(self):
+        """ Snapshot plus log rebuild the same objects """
+        user = User()
+        gone = User()
+        self.storage.new(user)
+        self.storage.new(gone)
+        self.storage.compact()
+        user.first_name = "Betty"
+        self.storage.new(user)
+        self.storage.delete(gone)
+        self.storage.save()
+        other = FileStorage(self.path, journal=True)
+        other.reload()
+        self.assertEqual(list(other.all()), ['User.' + user.id])
+        self.assertEqual(other.all()['User.' + user.id].first_name, "Betty")
+
+    def test_assignments_are_journaled(self):
+        """ Objects changed without new() are appended too """
+        user = User()
+        self.storage.new(user)
+        self.storage.save()
+        user.first_name = "Betty"
+        self.storage.save()
+        self.storage.save()
+        with open(self.path + '.log') as f:
+            self.assertEqual(len(f.readlines()), 2)
+        other = FileStorage(self.path, journal=True)
+        other.reload()
+        self.assertEqual(other.all()['User.' + user.id].first_name, "Betty")
+
+    def test_torn_record_ignored(self):
+        """ A partial final line from a crash is skipped """
+        user = User()
+        self.storage.new(user)
+        self.storage.save()
+        with open(self.path + '.log', 'a') as f:
+            f.write('{"op": "new", "key": "User.x", "ob')
+        other = FileStorage(self.path, journal=True)
+        other.reload()
+        self.assertEqual(list(other.all()), ['User.' + user.id])
+
+    def test_compaction_past_limit(self):
+        """ The log is folded into the snapshot past journal_limit """
+        storage = FileStorage(self.path, journal=True, journal_limit=1)
+        storage.new(User())
+        storage.save()
+        self.assertTrue(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(self.path + '.log'))
+
+
+@unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') == 'db', "skip if not db")
+class TestFileStorageShared(unittest.TestCase):
+    """ Tests for the locked, merging shared mode """
+
+    def setUp(self):
+        """ Two shared storages on one temporary file """
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'file.json')
+        self.first = FileStorage(self.path, shared=True)
+        self.second = FileStorage(self.path, shared=True)
+        self.first.reload()
+        self.second.reload()
+
+    def tearDown(self):
+        """ Remove the temporary files """
+        shutil.rmtree(self.tmp)
+
+    def read(self):
+        """ Returns the objects saved in the file """
+        other = FileStorage(self.path)
+        other.reload()
+        return other.all()
+
+    def test_concurrent_new_keeps_both(self):
+        """ Saves from two storages do not overwrite each other """
+        user, city = User(), City()
+        self.first.new(user)
+        self.second.new(city)
+        self.first.save()
+        self.second.save()
+        self.assertEqual(sorted(self.read()),
+                         sorted(['User.' + user.id, 'City.' + city.id]))
+        self.assertIn('City.' + city.id, self.second.all())
+        self.first.save()
+        self.assertIn('City.' + city.id, self.first.all())
+        self.assertEqual(os.listdir(self.tmp), ['file.json',
+                                                'file.json.lock'])
+
+    def test_newer_update_wins(self):
+        """ The copy with the later updated_at is kept """
+        user = User(first_name="Betty")
+        self.first.new(user)
+        self.first.save()
+        self.second.save()
+        theirs = self.second.all()['User.' + user.id]
+        self.assertIsNot(theirs, user)
+        theirs.first_name = "Holberton"
+        theirs.updated_at = user.updated_at + timedelta(seconds=1)
+        self.second.new(theirs)
+        self.second.save()
+        user.first_name = "stale"
+        self.first.new(user)
+        self.first.save()
+        self.assertEqual(self.read()['User.' + user.id].first_name,
+                         "Holberton")
+        self.assertEqual(
+            self.first.all()['User.' + user.id].first_name, "Holberton")
+
+    def test_delete_is_merged(self):
+        """ Objects deleted elsewhere are dropped on the next save """
+        user = User()
+        self.first.new(user)
+        self.first.save()
+        self.second.save()
+        self.second.delete(self.second.all()['User.' + user.id])
+        self.second.save()
+        self.first.new(City())
+        self.first.save()
+        self.assertNotIn('User.' + user.id, self.first.all())
+        self.assertNotIn('User.' + user.id, self.read())
+
+    def test_processes(self):
+        """ Console workers in several processes lose no writes """
+        script = ("import sys; from console import HBNBCommand; "
+                  "HBNBCommand().run_batch(['create User'] * 20, every=1)")
+        env = dict(os.environ, HBNB_FILE_SHARED="1",
+                   PYTHONPATH=os.getcwd())
+        env.pop('HBNB_TYPE_STORAGE', None)
+        procs = [subprocess.Popen([sys.executable, '-c', script],
+                                  cwd=self.tmp, env=env,
+                                  stdout=subprocess.DEVNULL,
+                                  stderr=subprocess.DEVNULL)
+                 for _ in range(4)]
+        for proc in procs:
+            self.assertEqual(proc.wait(), 0)
+        self.assertEqual(len(self.read()), 80)
+
+
+@unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') == 'db', "skip if not db")
+class TestFileStorageWriteBehind(unittest.TestCase):
+    """ Tests for the background write-behind mode """
+
+    def setUp(self):
+        """ Write-behind storage on a temporary path """
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'file.json')
+
+    def tearDown(self):
+        """ Stop the flusher and remove the temporary files """
+        shutil.rmtree(self.tmp)
+
+    def open(self, interval):
+        """ Returns a write-behind storage closed at cleanup """
+        storage = FileStorage(self.path, write_behind=interval)
+        self.addCleanup(storage.close)
+        return storage
+
+    def read(self):
+        """ Returns the objects saved in the file """
+        other = FileStorage(self.path)
+        other.reload()
+        return other.all()
+
+    def test_save_does_not_block(self):
+        """ save() returns before writing; flush() writes """
+        storage = self.open(60)
+        user = User(first_name="Betty")
+        storage.new(user)
+        storage.save()
+        self.assertFalse(os.path.exists(self.path))
+        storage.flush()
+        self.assertEqual(self.read()['User.' + user.id].first_name, "Betty")
+        self.assertEqual(os.listdir(self.tmp), ['file.json'])
+
+    def test_saves_are_coalesced(self):
+        """ Saves within one interval lead to a single write """
+        storage = self.open(0.2)
+        writes = []
+        mode = storage._FileStorage__mode
+        dump = mode.dump_copy
+        with patch.object(mode, 'dump_copy',
+                          side_effect=lambda path: writes.append(dump(path))):
+            for _ in range(10):
+                storage.new(User())
+                storage.save()
+            time.sleep(0.6)
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(len(self.read()), 10)
+
+    def test_written_state_is_current(self):
+        """ The write holds objects as they are, deletions included """
+        storage = self.open(60)
+        user = User(first_name="Betty")
+        storage.new(user)
+        storage.save()
+        user.first_name = "unsaved"
+        storage.flush()
+        self.assertEqual(self.read()['User.' + user.id].first_name,
+                         "unsaved")
+        storage.new(user)
+        storage.delete(user)
+        storage.save()
+        storage.flush()
+        self.assertEqual(self.read(), {})
+
+    def test_close_and_asave(self):
+        """ close() and asave() wait for the write """
+        storage = self.open(60)
+        storage.new(User())
+        asyncio.run(storage.asave())
+        self.assertEqual(len(self.read()), 1)
+        storage.new(City())
+        storage.save()
+        storage.close()
+        self.assertEqual(len(self.read()), 2)
+
+
+@unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') == 'db', "skip if not db")
+class TestFileStorageSharded(unittest.TestCase):
+    """ Tests for the one file per class sharded layout """
+
+    def setUp(self):
+        """ Sharded storage on a temporary path """
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'file.json')
+        self.shards = os.path.join(self.tmp, 'file.json.d')
+
+    def tearDown(self):
+        """ Remove the temporary files """
+        shutil.rmtree(self.tmp)
+
+    def open(self, shards=1, lazy=False):
+        """ Returns a reloaded sharded storage """
+        storage = FileStorage(self.path, shards=shards, lazy=lazy)
+        storage.reload()
+        return storage
+
+    def stamps(self):
+        """ Returns {file name: mtime} of the shard files """
+        return {name: os.stat(os.path.join(self.shards, name)).st_mtime_ns
+                for name in os.listdir(self.shards)}
+
+    def test_one_file_per_class(self):
+        """ Objects are saved to and reloaded from per-class files """
+        storage = self.open()
+        user, city = User(first_name="Betty"), City(name="SF")
+        storage.new(user)
+        storage.new(city)
+        storage.save()
+        self.assertEqual(sorted(os.listdir(self.shards)),
+                         ['City.json', 'User.json'])
+        self.assertFalse(os.path.exists(self.path))
+        for lazy in (False, True):
+            loaded = self.open(lazy=lazy).all()
+            self.assertEqual(loaded['User.' + user.id].first_name, "Betty")
+            self.assertEqual(loaded['City.' + city.id].name, "SF")
+
+    def test_save_rewrites_dirty_shards(self):
+        """ Only the shards of changed objects are written """
+        storage = self.open()
+        user, city = User(), City()
+        storage.new(user)
+        storage.new(city)
+        storage.save()
+        before = self.stamps()
+        time.sleep(0.01)
+        user.first_name = "Betty"
+        storage.save()
+        after = self.stamps()
+        self.assertEqual(after['City.json'], before['City.json'])
+        self.assertNotEqual(after['User.json'], before['User.json'])
+        storage.delete(city)
+        storage.save()
+        self.assertEqual(sorted(os.listdir(self.shards)), ['User.json'])
+
+    def test_hash_shards(self):
+        """ Large classes are split by id over several files """
+        storage = self.open(shards=4)
+        users = [User() for _ in range(40)]
+        for user in users:
+            storage.new(user)
+        storage.save()
+        self.assertGreater(len(os.listdir(self.shards)), 1)
+        before = self.stamps()
+        time.sleep(0.01)
+        users[0].first_name = "Betty"
+        storage.save()
+        after = self.stamps()
+        self.assertEqual(sum(after[n] != before[n] for n in before), 1)
+        loaded = self.open(shards=4).all(User)
+        self.assertEqual(len(loaded), 40)
+        self.assertEqual(loaded['User.' + users[0].id].first_name, "Betty")
+
+    def test_layout_changes(self):
+        """ A single file or another shard count is split on save """
+        single = FileStorage(self.path)
+        user = User()
+        single.new(user)
+        single.save()
+        storage = self.open()
+        storage.save()
+        self.assertEqual(os.listdir(self.shards), ['User.json'])
+        storage = self.open(shards=2)
+        storage.save()
+        self.assertNotIn('User.json', os.listdir(self.shards))
+        self.assertIn('User.' + user.id, self.open(shards=2).all())
+
+
+@unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') == 'db', "skip if not db")
+class TestFileStorageSnapshot(unittest.TestCase):
+    """ Tests for the memory-mapped snapshot mode """
+
+    def setUp(self):
+        """ A snapshot of a few objects written from a plain storage """
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'file.json')
+        writer = FileStorage(self.path)
+        self.users = [User(first_name=str(i)) for i in range(3)]
+        self.city = City(name="SF")
+        for obj in self.users + [self.city]:
+            writer.new(obj)
+        writer.write_snapshot()
+
+    def tearDown(self):
+        """ Remove the temporary files """
+        shutil.rmtree(self.tmp)
+
+    def open(self):
+        """ Returns a reloaded snapshot mode storage """
+        storage = FileStorage(self.path, snapshot=True)
+        storage.reload()
+        return storage
+
+    def test_count_and_get_build_nothing(self):
+        """ count() and get() do not build whole classes """
+        storage = self.open()
+        self.assertEqual(storage.count(), 4)
+        self.assertEqual(storage.count(User), 3)
+        user = storage.get(User, self.users[1].id)
+        self.assertEqual(user.first_name, "1")
+        self.assertIs(storage.get(User, self.users[1].id), user)
+        self.assertIsNone(storage.get(User, self.city.id))
+        self.assertEqual(storage.count(User), 3)
+        with patch.object(storage, '_FileStorage__build',
+                          side_effect=AssertionError):
+            self.assertEqual(storage.count(City), 1)
+
+    def test_all_and_filter(self):
+        """ all() and filter() see every snapshot record """
+        storage = self.open()
+        self.assertEqual(len(storage.all(User)), 3)
+        self.assertEqual(len(storage.filter(City, name="SF")), 1)
+        self.assertEqual(len(storage.all()), 4)
+        self.assertEqual(storage.count(), 4)
+
+    def test_save_rewrites_snapshot(self):
+        """ save() keeps unbuilt records, changes and deletions """
+        storage = self.open()
+        storage.delete(storage.get(User, self.users[0].id))
+        storage.new(Place(name="Loft"))
+        self.users[2].first_name = "Betty"
+        storage.new(self.users[2])
+        storage.save()
+        self.assertEqual(storage.count(), 4)
+        self.assertEqual(storage.count(User), 2)
+        loaded = self.open()
+        self.assertEqual(loaded.count(User), 2)
+        self.assertEqual(loaded.count(Place), 1)
+        self.assertIsNone(loaded.get(User, self.users[0].id))
+        self.assertEqual(loaded.get(User, self.users[2].id).first_name,
+                         "Betty")
+        self.assertEqual(loaded.get(City, self.city.id).name, "SF")
+
+    def test_save_writes_json_file(self):
+        """ Plain storages see what a snapshot mode storage saved """
+        storage = self.open()
+        storage.get(User, self.users[0].id).first_name = "Betty"
+        storage.save()
+        plain = FileStorage(self.path)
+        plain.reload()
+        self.assertEqual(plain.count(), 4)
+        self.assertEqual(plain.get(User, self.users[0].id).first_name,
+                         "Betty")
+
+    def test_stale_snapshot_is_bypassed(self):
+        """ reload() reads the JSON file once another process saved it """
+        self.open().save()
+        plain = FileStorage(self.path)
+        plain.reload()
+        plain.new(User())
+        plain.save()
+        storage = self.open()
+        self.assertEqual(storage.count(User), 4)
+        self.assertIsNone(storage._FileStorage__snap)
+        storage.save()
+        self.assertIsNotNone(self.open()._FileStorage__snap)
+
+    def test_rollback(self):
+        """ Records built inside a rolled back batch stay readable """
+        storage = self.open()
+        with self.assertRaises(ValueError):
+            with storage.batch():
+                storage.delete(storage.get(User, self.users[0].id))
+                raise ValueError
+        self.assertEqual(storage.count(User), 3)
+
+
+@unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') == 'db', "skip if not db")
+class TestFileStorageClassIndex(unittest.TestCase):
+    """ Tests for the per-class buckets behind all(cls) and count() """
+
+    def setUp(self):
+        """ Fresh storage that is never written to disk """
+        self.storage = FileStorage(os.path.join(tempfile.gettempdir(),
+                                                'unused.json'))
+
+    def test_all_and_count_by_class(self):
+        """ all(cls) and count(cls) only see that class """
+        user = User()
+        self.storage.new(user)
+        self.storage.new(BaseModel())
+        self.assertEqual(self.storage.all(User), {'User.' + user.id: user})
+        self.assertEqual(self.storage.all('User'), {'User.' + user.id: user})
+        self.assertEqual(self.storage.count('User'), 1)
+        self.assertEqual(self.storage.count(), 2)
+
+    def test_delete_updates_bucket(self):
+        """ delete() removes the object from its bucket """
+        user = User()
+        self.storage.new(user)
+        self.storage.delete(user)
+        self.assertEqual(self.storage.count(User), 0)
+        self.assertEqual(self.storage.all(User), {})
+
+    def test_outside_edits_resync(self):
+        """ Clearing the dict returned by all() is picked up """
+        self.storage.new(User())
+        self.storage.all().clear()
+        self.assertEqual(self.storage.count(User), 0)
+        self.storage.new(User())
+        self.assertEqual(self.storage.count(User), 1)
+
+    def test_same_size_outside_edits_resync(self):
+        """ Edits that keep the number of objects are picked up too """
+        user, state = User(), State()
+        self.storage.new(user)
+        objects = self.storage.all()
+        del objects['User.' + user.id]
+        objects['State.' + state.id] = state
+        self.assertEqual(self.storage.all(User), {})
+        self.assertEqual(self.storage.count(State), 1)
+        self.storage._FileStorage__objects = {'User.' + user.id: user}
+        self.assertEqual(self.storage.all(State), {})
+        self.assertEqual(self.storage.all(User), {'User.' + user.id: user})
+
+    def test_held_dict_edits_resync(self):
+        """ Every edit through a dict from all() still held is picked up """
+        user, other = User(), User()
+        self.storage.new(user)
+        objects = self.storage.all()
+        del objects['User.' + user.id]
+        self.assertEqual(self.storage.count(User), 0)
+        objects['User.' + user.id] = user
+        self.assertEqual(self.storage.count(User), 1)
+        del objects['User.' + user.id]
+        objects['User.' + other.id] = other
+        self.assertEqual(self.storage.all(User), {'User.' + other.id: other})
+        del objects
+        self.assertEqual(self.storage.count(User), 1)
+        self.assertFalse(self.storage._FileStorage__lent)
+
+
+@unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') == 'db', "skip if not db")
+class TestFileStorageRelationships(unittest.TestCase):
+    """ Tests for State.cities, Place.reviews, Place.amenities, User.places """
+
+    def setUp(self):
+        """ Fresh storage standing in for models.storage """
+        self.storage = FileStorage(os.path.join(tempfile.gettempdir(),
+                                                'unused.json'))
+        patcher = patch.object(models, 'storage', self.storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_state_cities(self):
+        """ cities follows new(), delete() and state_id assignments """
+        state, other = State(), State()
+        city = City(state_id=state.id)
+        self.assertEqual(state.cities, [])
+        self.storage.new(city)
+        self.assertEqual(state.cities, [city])
+        city.state_id = other.id
+        self.assertEqual(state.cities, [])
+        self.assertEqual(other.cities, [city])
+        self.storage.delete(city)
+        self.assertEqual(other.cities, [])
+
+    def test_every_storage_follows_assignments(self):
+        """ Storages other than models.storage move objects too """
+        other = FileStorage(os.path.join(tempfile.gettempdir(),
+                                         'other.json'))
+        city = City(state_id="X")
+        other.new(city)
+        city.state_id = "Y"
+        self.assertEqual(other.filter(City, state_id="Y"),
+                         {'City.' + city.id: city})
+        self.assertEqual(other.filter(City, state_id="X"), {})
+
+    def test_place_reviews_and_user_places(self):
+        """ reviews and places come from the place_id and user_id indexes """
+        user = User()
+        place = Place(user_id=user.id)
+        review = Review(place_id=place.id, user_id=user.id)
+        self.storage.new(place)
+        self.storage.new(review)
+        self.storage.new(Review(place_id="other"))
+        self.assertEqual(user.places, [place])
+        self.assertEqual(place.reviews, [review])
+
+    def test_place_amenities(self):
+        """ Assigning an Amenity adds its id once """
+        place = Place()
+        wifi = Amenity(name="Wifi")
+        self.storage.new(wifi)
+        place.amenities = wifi
+        place.amenities = wifi
+        place.amenities = "not an amenity"
+        self.assertEqual(place.amenity_ids, [wifi.id])
+        self.assertEqual(place.amenities, [wifi])
+        self.assertEqual(Place.amenity_ids, [])
+
+
+@unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') == 'db', "skip if not db")
+class TestFileStorageMetrics(unittest.TestCase):
+    """ Tests for the HBNB_METRICS operation metrics """
+
+    def setUp(self):
+        """ Storage on a temporary path """
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'file.json')
+
+    def tearDown(self):
+        """ Remove the temporary files """
+        shutil.rmtree(self.tmp)
+
+    def test_disabled(self):
+        """ Without metrics nothing is wrapped """
+        storage = FileStorage(self.path, metrics=False)
+        self.assertEqual(storage.metrics(), {})
+        self.assertNotIn('save', vars(storage))
+
+    def test_operations_and_bytes(self):
+        """ Operations are timed and file bytes counted """
+        with patch.dict(os.environ, {"HBNB_METRICS": "1"}):
+            storage = FileStorage(self.path)
+        storage.reload()
+        storage.new(User())
+        storage.new(User())
+        storage.save()
+        self.assertEqual(len(storage.all(User)), 2)
+        self.assertEqual(len(list(storage.iter())), 2)
+        data = storage.metrics(reset=True)
+        operations = data["operations"]
+        self.assertEqual(operations["new"]["count"], 2)
+        self.assertEqual(operations["save"]["count"], 1)
+        self.assertGreater(operations["save"]["total"], 0)
+        self.assertEqual(data["counters"]["bytes_written"],
+                         os.path.getsize(self.path))
+        self.assertEqual(data["counters"]["all.objects"], 2)
+        self.assertEqual(data["counters"]["iter.objects"], 2)
+        storage.reload()
+        self.assertEqual(storage.metrics()["counters"],
+                         {"bytes_read": os.path.getsize(self.path)})
+
+
+@unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') == 'db', "skip if not db")
+class TestFileStorageSearch(unittest.TestCase):
+    """ Tests for the full-text search() index """
+
+    def setUp(self):
+        """ Storage on a temporary path standing in for models.storage """
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'file.json')
+        self.storage = FileStorage(self.path)
+        patcher = patch.object(models, 'storage', self.storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.loft = Place(name="Sunny loft", description="A loft bed")
+        self.barn = Place(name="Old barn", description="Quiet and sunny")
+        self.storage.new(self.loft)
+        self.storage.new(self.barn)
+
+    def tearDown(self):
+        """ Remove the temporary files """
+        shutil.rmtree(self.tmp)
+
+    def test_search_follows_changes(self):
+        """ Results follow new(), delete() and text assignments """
+        self.assertEqual(list(self.storage.search(Place, "loft")),
+                         ['Place.' + self.loft.id])
+        self.barn.description = "Barn loft"
+        self.assertEqual(len(self.storage.search('Place', "loft")), 2)
+        self.storage.delete(self.loft)
+        self.assertEqual(list(self.storage.search(Place, "sun*")), [])
+        review = Review(text="Sunny")
+        self.storage.new(review)
+        self.assertEqual(self.storage.search(Review, "sunny"),
+                         {'Review.' + review.id: review})
+        self.assertEqual(self.storage.search(User, "sunny"), {})
+
+    def test_index_is_written_when_built(self):
+        """ An index built from saved data is written for later readers """
+        self.storage.save()
+        builder = FileStorage(self.path, lazy=True)
+        builder.reload()
+        builder.search(Place, "loft")
+        self.assertTrue(os.path.exists(self.path + '.Place.idx'))
+        reader = FileStorage(self.path, lazy=True)
+        reader.reload()
+        with patch.object(reader, '_FileStorage__load_class',
+                          side_effect=AssertionError):
+            found = reader.search(Place, "loft")
+        self.assertEqual(list(found), ['Place.' + self.loft.id])
+
+    def test_unsaved_index_is_written_by_save(self):
+        """ An index of unsaved objects waits for save() """
+        self.storage.search(Place, "loft")
+        self.assertFalse(os.path.exists(self.path + '.Place.idx'))
+        self.storage.save()
+        self.assertTrue(os.path.exists(self.path + '.Place.idx'))
+
+    def test_save_appends_changes(self):
+        """ Saves append the changed entries instead of rewriting """
+        self.storage.save()
+        self.storage.search(Place, "loft")
+        path = self.path + '.Place.idx'
+        inode, size = os.stat(path).st_ino, os.path.getsize(path)
+        self.barn.name = "Loft barn"
+        self.storage.save()
+        self.storage.new(User())
+        self.storage.save()
+        self.assertEqual(os.stat(path).st_ino, inode)
+        with open(path) as f:
+            self.assertEqual(len(f.readlines()), 3)
+        reader = FileStorage(self.path, lazy=True)
+        reader.reload()
+        with patch.object(reader, '_FileStorage__load_class',
+                          side_effect=AssertionError):
+            found = reader.search(Place, "loft")
+        self.assertEqual(sorted(found), sorted(['Place.' + self.loft.id,
+                                                'Place.' + self.barn.id]))
+        self.assertLess(os.path.getsize(path) - size, size)
+
+    def test_appended_changes_are_folded_in(self):
+        """ The index is written whole once the changes outgrow it """
+        self.storage.save()
+        self.storage.search(Place, "loft")
+        path = self.path + '.Place.idx'
+        for i in range(20):
+            self.barn.description = "Quiet barn number {}".format(i)
+            self.storage.save()
+        with open(path) as f:
+            self.assertLess(len(f.readlines()), 20)
+        reader = FileStorage(self.path)
+        reader.reload()
+        self.assertEqual(list(reader.search(Place, "19")),
+                         ['Place.' + self.barn.id])
+
+    def test_saved_index_is_reused(self):
+        """ A reload of unchanged data reads the index back """
+        self.storage.search(Place, "loft")
+        self.storage.save()
+        self.assertTrue(os.path.exists(self.path + '.Place.idx'))
+        other = FileStorage(self.path, lazy=True)
+        other.reload()
+        with patch.object(other, '_FileStorage__load_class',
+                          side_effect=AssertionError):
+            found = other.search(Place, "quiet", limit=1)
+        self.assertEqual(list(found), ['Place.' + self.barn.id])
+        self.assertEqual(other.count(Place), 2)
+
+    def test_saved_index_of_older_data_is_ignored(self):
+        """ The index is rebuilt once the data files changed """
+        self.storage.search(Place, "loft")
+        self.storage.save()
+        writer = FileStorage(self.path)
+        writer.reload()
+        cabin = Place(name="Loft cabin")
+        writer.new(cabin)
+        writer.save()
+        other = FileStorage(self.path)
+        other.reload()
+        self.assertIn('Place.' + cabin.id, other.search(Place, "loft"))
+
+
+@unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') == 'db', "skip if not db")
+class TestFileStorageFilter(unittest.TestCase):
+    """ Tests for the __indexes__ hash indexes behind filter() """
+
+    def setUp(self):
+        """ Fresh storage that is never written to disk """
+        self.storage = FileStorage(os.path.join(tempfile.gettempdir(),
+                                                'unused.json'))
+
+    def test_filter_by_indexed_attribute(self):
+        """ filter() returns only the matching objects """
+        city = City(state_id="s1")
+        self.storage.new(city)
+        self.storage.new(City(state_id="s2"))
+        self.assertEqual(self.storage.filter(City, state_id="s1"),
+                         {'City.' + city.id: city})
+        self.assertEqual(self.storage.filter('City', state_id="none"), {})
+
+    def test_filter_follows_new_and_delete(self):
+        """ Index entries move on new() and vanish on delete() """
+        city = City(state_id="s1")
+        self.storage.new(city)
+        city.state_id = "s2"
+        self.storage.new(city)
+        self.assertEqual(self.storage.filter(City, state_id="s1"), {})
+        self.assertIn('City.' + city.id,
+                      self.storage.filter(City, state_id="s2"))
+        self.storage.delete(city)
+        self.assertEqual(self.storage.filter(City, state_id="s2"), {})
+
+    def test_filter_unindexed_attribute(self):
+        """ Attributes without an index fall back to the class bucket """
+        place = Place(city_id="c1", name="Loft")
+        self.storage.new(place)
+        self.storage.new(Place(city_id="c1", name="Barn"))
+        self.assertEqual(list(self.storage.filter(Place, city_id="c1",
+                                                  name="Loft")),
+                         ['Place.' + place.id])
+
+
+@unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') == 'db', "skip if not db")
+class TestFileStorageBatch(unittest.TestCase):
+    """ Tests for begin()/commit()/rollback() and batch() """
+
+    def setUp(self):
+        """ Storage on a temporary path """
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'file.json')
+        self.storage = FileStorage(self.path)
+
+    def tearDown(self):
+        """ Remove the temporary files """
+        shutil.rmtree(self.tmp)
+
+    def test_single_write_on_exit(self):
+        """ save() inside the block is deferred to its end """
+        with self.storage.batch():
+            for _ in range(3):
+                self.storage.new(User())
+                self.storage.save()
+            self.assertFalse(os.path.exists(self.path))
+        other = FileStorage(self.path)
+        other.reload()
+        self.assertEqual(other.count(User), 3)
+
+    def test_rollback_on_error(self):
+        """ An exception restores objects, attributes and indexes """
+        city = City(state_id="s1")
+        self.storage.new(city)
+        with self.assertRaises(KeyError):
+            with self.storage.batch():
+                city.state_id = "s2"
+                self.storage.new(city)
+                self.storage.new(City())
+                self.storage.delete(city)
+                self.storage.save()
+                raise KeyError
+        self.assertEqual(self.storage.all(), {'City.' + city.id: city})
+        self.assertEqual(city.state_id, "s1")
+        self.assertIn('City.' + city.id,
+                      self.storage.filter(City, state_id="s1"))
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_rollback_copies_touched_objects_only(self):
+        """ begin() copies nothing; a change records the object once """
+        users = [User(first_name="Betty") for _ in range(3)]
+        for user in users:
+            self.storage.new(user)
+        self.storage.begin()
+        self.assertEqual(self.storage._FileStorage__undo[0], {})
+        users[0].first_name = "Holberton"
+        users[0].nickname = "School"
+        self.assertEqual(list(self.storage._FileStorage__undo[0]),
+                         ['User.' + users[0].id])
+        self.storage.rollback()
+        self.assertEqual(users[0].first_name, "Betty")
+        self.assertFalse(hasattr(users[0], "nickname"))
+        self.assertEqual(self.storage.count(User), 3)
+        users[1].first_name = "Holberton"
+        self.assertEqual(users[1].first_name, "Holberton")
+
+    def test_rollback_restores_raw_records(self):
+        """ Records deleted or replaced before being built come back """
+        users = [User() for _ in range(2)]
+        for user in users:
+            self.storage.new(user)
+        self.storage.save()
+        lazy = FileStorage(self.path, lazy=True)
+        lazy.reload()
+        with self.assertRaises(KeyError):
+            with lazy.batch():
+                lazy.delete(users[0])
+                lazy.new(users[1])
+                lazy.new(User())
+                raise KeyError
+        self.assertEqual(lazy.count(User), 2)
+        self.assertIsNotNone(lazy.get(User, users[0].id))
+        self.assertIsNot(lazy.get(User, users[1].id), users[1])
+
+    def test_checkpoint_writes_and_keeps_batch(self):
+        """ checkpoint() writes; rollback() only undoes later changes """
+        kept, dropped = User(), User()
+        self.storage.begin()
+        self.storage.new(kept)
+        self.storage.save()
+        self.storage.checkpoint()
+        other = FileStorage(self.path)
+        other.reload()
+        self.assertEqual(other.count(User), 1)
+        self.assertEqual(self.storage._FileStorage__undo[0], {})
+        self.storage.new(dropped)
+        self.storage.save()
+        self.storage.rollback()
+        self.assertEqual(list(self.storage.all()), ['User.' + kept.id])
+
+    def test_nested_batches_flush_once(self):
+        """ Only the outermost commit writes """
+        self.storage.begin()
+        self.storage.begin()
+        self.storage.new(User())
+        self.storage.save()
+        self.storage.commit()
+        self.assertFalse(os.path.exists(self.path))
+        self.storage.commit()
+        self.assertTrue(os.path.exists(self.path))
+
+
+@unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') == 'db', "skip if not db")
+class TestFileStorageLazy(unittest.TestCase):
+    """ Tests for the lazy, streaming reload mode """
+
+    def setUp(self):
+        """ Write a file with a few objects, then open it lazily """
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'file.json')
+        writer = FileStorage(self.path)
+        self.user = User(first_name="Betty")
+        writer.new(self.user)
+        writer.new(City(state_id="s1"))
+        writer.new(City(state_id="s2"))
+        writer.save()
+        self.storage = FileStorage(self.path, lazy=True)
+        self.storage.reload()
+
+    def tearDown(self):
+        """ Remove the temporary files """
+        shutil.rmtree(self.tmp)
+
+    def test_count_without_building(self):
+        """ count() works from the raw records """
+        self.assertEqual(self.storage.count(), 3)
+        self.assertEqual(self.storage.count(City), 2)
+        self.assertEqual(len(self.storage._FileStorage__objects), 0)
+
+    def test_build_one_class(self):
+        """ all(cls) builds only that class """
+        users = self.storage.all(User)
+        self.assertEqual(users['User.' + self.user.id].first_name, "Betty")
+        self.assertEqual(len(self.storage._FileStorage__objects), 1)
+        self.assertEqual(len(self.storage.filter(City, state_id="s1")), 1)
+        self.assertEqual(len(self.storage.all()), 3)
+
+    def test_get_builds_one_record(self):
+        """ get() builds only the record asked for """
+        user = self.storage.get(User, self.user.id)
+        self.assertEqual(user.first_name, "Betty")
+        self.assertIs(self.storage.get('User', self.user.id), user)
+        self.assertEqual(len(self.storage._FileStorage__objects), 1)
+        self.assertIsNone(self.storage.get(User, "nope"))
+        self.assertEqual(self.storage.count(), 3)
+
+    def test_save_keeps_unbuilt_records(self):
+        """ Records never built are written back unchanged """
+        user = self.storage.all(User)['User.' + self.user.id]
+        user.first_name = "Holberton"
+        self.storage.save()
+        other = FileStorage(self.path)
+        other.reload()
+        self.assertEqual(other.count(City), 2)
+        self.assertEqual(other.all(User)['User.' + self.user.id].first_name,
+                         "Holberton")
+
+    def test_delete_unbuilt(self):
+        """ delete() drops a record that was never built """
+        self.storage.delete(self.user)
+        self.assertEqual(self.storage.count(User), 0)
+        self.assertEqual(self.storage.all(User), {})
+
+    def test_single_line_file(self):
+        """ Files not written one record per line still load """
+        with open(self.path, 'w') as f:
+            json.dump({'User.' + self.user.id: self.user.to_dict()}, f)
+        storage = FileStorage(self.path, lazy=True)
+        storage.reload()
+        self.assertEqual(storage.count(User), 1)
+        self.assertIn('User.' + self.user.id, storage.all())
+
+
+@unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') == 'db', "skip if not db")
+class TestFileStorageFragments(unittest.TestCase):
+    """ Tests for dirty tracking and cached encodings in save() """
+
+    def setUp(self):
+        """ Storage on a temporary path """
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'file.json')
+        self.storage = FileStorage(self.path)
+
+    def tearDown(self):
+        """ Remove the temporary files """
+        shutil.rmtree(self.tmp)
+
+    def test_assignment_flags_changed(self):
+        """ Attribute assignment sets _changed, save() clears it """
+        user = User()
+        self.storage.new(user)
+        self.assertTrue(user._changed)
+        self.storage.save()
+        self.assertFalse(user._changed)
+        user.first_name = "Betty"
+        self.assertTrue(user._changed)
+        self.assertNotIn('_changed', user.to_dict())
+
+    def test_clean_objects_not_reencoded(self):
+        """ Only changed objects go through to_dict() again """
+        clean, dirty = User(), User()
+        self.storage.new(clean)
+        self.storage.new(dirty)
+        self.storage.save()
+        dirty.first_name = "Betty"
+        with patch.object(User, 'to_dict', autospec=True,
+                          side_effect=User.to_dict) as to_dict:
+            self.storage.save()
+        self.assertEqual([c.args[0] for c in to_dict.call_args_list],
+                         [dirty])
+        other = FileStorage(self.path)
+        other.reload()
+        self.assertEqual(other.all()['User.' + dirty.id].first_name, "Betty")
+
+
+@unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') == 'db', "skip if not db")
+class TestFileStorageQuery(unittest.TestCase):
+    """ Tests for the __columns__ range queries """
+
+    def setUp(self):
+        """ Fresh storage that is never written to disk """
+        self.storage = FileStorage(os.path.join(tempfile.gettempdir(),
+                                                'unused.json'))
+
+    def test_query_ranges(self):
+        """ query() keeps objects inside every range """
+        cheap = Place(price_by_night=80, max_guest=4)
+        self.storage.new(cheap)
+        self.storage.new(Place(price_by_night=80, max_guest=2))
+        self.storage.new(Place(price_by_night=300, max_guest=6))
+        self.assertEqual(self.storage.query(Place, price_by_night=(0, 120),
+                                            max_guest=(4, None)),
+                         {'Place.' + cheap.id: cheap})
+
+    def test_query_follows_new_and_delete(self):
+        """ Columns are refreshed by new() and emptied by delete() """
+        place = Place(price_by_night=80)
+        self.storage.new(place)
+        place.price_by_night = 200
+        self.storage.new(place)
+        self.assertEqual(self.storage.query(Place, price_by_night=(0, 120)),
+                         {})
+        self.storage.delete(place)
+        self.assertEqual(self.storage.query(Place, price_by_night=(0, None)),
+                         {})
+
+    def test_query_follows_assignments(self):
+        """ Assigning a column attribute refreshes its row at once """
+        place = Place(price_by_night=80)
+        self.storage.new(place)
+        with patch.object(models, 'storage', self.storage):
+            place.price_by_night = 200
+        self.assertEqual(self.storage.query(Place, price_by_night=(0, 120)),
+                         {})
+        self.assertEqual(self.storage.query(Place, price_by_night=(150, None)),
+                         {'Place.' + place.id: place})
+
+    def test_query_without_columns(self):
+        """ Classes without __columns__ are scanned """
+        user = User(age=30)
+        self.storage.new(user)
+        self.assertEqual(list(self.storage.query(User, age=(18, None))),
+                         ['User.' + user.id])
+
+
+@unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') == 'db', "skip if not db")
+class TestFileStorageIter(unittest.TestCase):
+    """ Tests for the paginated iter() """
+
+    def setUp(self):
+        """ Fresh storage holding users and places """
+        self.storage = FileStorage(os.path.join(tempfile.gettempdir(),
+                                                'unused.json'))
+        for _ in range(4):
+            self.storage.new(User())
+            self.storage.new(Place())
+        self.keys = sorted(self.storage.all())
+
+    def test_iter_in_key_order(self):
+        """ iter() yields every pair ordered by key """
+        self.assertEqual([key for key, _ in self.storage.iter()], self.keys)
+        self.assertEqual([key for key, _ in self.storage.iter(User)],
+                         self.keys[4:])
+
+    def test_iter_limit_offset(self):
+        """ limit and offset page across classes """
+        self.assertEqual([key for key, _ in self.storage.iter(limit=3,
+                                                              offset=3)],
+                         self.keys[3:6])
+        self.assertEqual(list(self.storage.iter(offset=8)), [])
+
+    def test_iter_order(self):
+        """ order sorts one class by an attribute, missing values first """
+        users = list(self.storage.all(User).values())
+        for age, user in zip([30, 20, 40], users):
+            user.age = age
+        ordered = [obj for _, obj in self.storage.iter(User, order='age')]
+        self.assertEqual(ordered, [users[3], users[1], users[0], users[2]])
+        ordered = [obj for _, obj in self.storage.iter(User, order='-age',
+                                                       limit=2)]
+        self.assertEqual(ordered, [users[2], users[0]])
+        with self.assertRaises(ValueError):
+            list(self.storage.iter(order='age'))
+
+    def test_bulk_new(self):
+        """ bulk_new() adds every object and saves once """
+        users = [User() for _ in range(3)]
+        with patch.object(self.storage, 'save') as save:
+            self.assertEqual(self.storage.bulk_new(iter(users)), 3)
+        save.assert_called_once_with()
+        self.assertEqual(self.storage.count(User), 7)
+
+    def test_get(self):
+        """ get() looks an object up by class and id """
+        key = self.keys[0]
+        name, oid = key.split('.')
+        self.assertIs(self.storage.get(name, oid), self.storage.all()[key])
+        self.assertIsNone(self.storage.get(User, oid))
+
+    def test_iter_after(self):
+        """ after resumes past the last key of a page """
+        page = [key for key, _ in self.storage.iter(limit=5)]
+        rest = [key for key, _ in self.storage.iter(after=page[-1])]
+        self.assertEqual(page + rest, self.keys)
+
+    def test_iter_follows_changes(self):
+        """ Later pages see new() and delete(); a paused walk resumes """
+        pairs = self.storage.iter(User)
+        first, _ = next(pairs)
+        self.storage.delete(self.storage.all()[self.keys[5]])
+        user = User(id=self.keys[4][5:] + "0")
+        self.storage.new(user)
+        self.assertEqual([key for key, _ in pairs],
+                         ['User.' + user.id] + self.keys[6:])
+        self.assertEqual(first, self.keys[4])
+        page = [key for key, _ in self.storage.iter(User, after=first)]
+        self.assertEqual(page, ['User.' + user.id] + self.keys[6:])
+
+
+@unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') == 'db', "skip if not db")
+class TestFileStorageGeo(unittest.TestCase):
+    """ Tests for the __geo__ spatial index """
+
+    def setUp(self):
+        """ Two places in Paris, one in London """
+        self.storage = FileStorage(os.path.join(tempfile.gettempdir(),
+                                                'unused.json'))
+        self.paris = Place(latitude=48.8566, longitude=2.3522)
+        self.louvre = Place(latitude=48.8606, longitude=2.3376)
+        self.london = Place(latitude=51.5072, longitude=-0.1276)
+        for place in (self.paris, self.louvre, self.london):
+            self.storage.new(place)
+
+    def test_near_and_nearest(self):
+        """ near() and nearest() return objects closest first """
+        self.assertEqual(list(self.storage.near(Place, 48.857, 2.352, 5)),
+                         ['Place.' + self.paris.id, 'Place.' + self.louvre.id])
+        self.assertEqual(list(self.storage.nearest('Place', 51, 0)),
+                         ['Place.' + self.london.id])
+        self.assertEqual(self.storage.near(User, 0, 0, 10), {})
+
+    def test_within_follows_updates(self):
+        """ new() moves a place in the index, delete() drops it """
+        self.paris.latitude = 10.0
+        self.storage.new(self.paris)
+        self.storage.delete(self.london)
+        self.assertEqual(list(self.storage.within(Place, 48, -1, 52, 3)),
+                         ['Place.' + self.louvre.id])
+
+    def test_near_follows_assignments(self):
+        """ Assigning latitude or longitude moves the place at once """
+        with patch.object(models, 'storage', self.storage):
+            self.london.latitude = 48.8570
+            self.london.longitude = 2.3500
+        self.assertEqual(len(self.storage.near(Place, 48.857, 2.352, 5)), 3)
+        self.assertEqual(self.storage.near(Place, 51.5, -0.12, 50), {})
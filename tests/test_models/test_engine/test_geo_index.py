@@ -0,0 +1,75 @@
+#!/usr/bin/python3
+""" Module for testing the geospatial grid index"""
+import unittest
+
+from models.engine.geo_index import GeoIndex, bounds, distance
+
+
+class TestGeoIndex(unittest.TestCase):
+    """ Class to test GeoIndex """
+
+    def setUp(self):
+        """ A few cities """
+        self.index = GeoIndex()
+        self.index.set("paris", 48.8566, 2.3522)
+        self.index.set("versailles", 48.8049, 2.1204)
+        self.index.set("london", 51.5072, -0.1276)
+        self.index.set("suva", -18.1248, 178.4501)
+        self.index.set("apia", -13.8507, -171.7514)
+
+    def test_distance(self):
+        """ Paris to London is about 344 km """
+        self.assertAlmostEqual(distance(48.8566, 2.3522, 51.5072, -0.1276),
+                               344, delta=2)
+
+    def test_within(self):
+        """ Bounding boxes, including across the antimeridian """
+        self.assertEqual(sorted(self.index.within(48, 2, 49, 3)),
+                         ["paris", "versailles"])
+        self.assertEqual(sorted(self.index.within(-20, 170, -10, -170)),
+                         ["apia", "suva"])
+
+    def test_near(self):
+        """ Radius queries are sorted by distance """
+        keys = [key for _, key in self.index.near(48.85, 2.35, 50)]
+        self.assertEqual(keys, ["paris", "versailles"])
+        self.assertEqual(self.index.near(48.85, 2.35, 0.1), [])
+
+    def test_near_antimeridian(self):
+        """ A circle around Suva reaches Apia across 180 degrees """
+        keys = [key for _, key in self.index.near(-18.1248, 178.4501, 1500)]
+        self.assertEqual(keys, ["suva", "apia"])
+
+    def test_nearest(self):
+        """ k nearest neighbours, closest first """
+        keys = [key for _, key in self.index.nearest(49, 2.3, k=3)]
+        self.assertEqual(keys, ["paris", "versailles", "london"])
+        self.assertEqual(len(self.index.nearest(0, 0, k=10)), 5)
+        self.assertEqual(self.index.nearest(0, 0, k=0), [])
+
+    def test_nearest_matches_brute_force(self):
+        """ The ring search agrees with ranking every point """
+        index = GeoIndex(cell_size=1)
+        for i in range(200):
+            index.set(i, (i * 37) % 160 - 80, (i * 53) % 340 - 170)
+        for lat, lon in [(0, 0), (45, 100), (-70, -175)]:
+            expected = sorted((distance(lat, lon, *point), key)
+                              for key, point in index.points.items())[:5]
+            self.assertEqual(index.nearest(lat, lon, k=5), expected)
+
+    def test_set_moves_and_drops(self):
+        """ set() moves a point, non-numeric values drop it """
+        self.index.set("paris", 51.5, -0.12)
+        self.assertEqual(self.index.within(48, 2, 49, 3), ["versailles"])
+        self.index.set("paris", None, None)
+        self.index.remove("versailles")
+        self.assertEqual(self.index.within(48, 2, 52, 3), [])
+        self.assertEqual(len(self.index), 3)
+
+    def test_bounds_pole(self):
+        """ Circles reaching a pole span every longitude """
+        self.assertEqual(bounds(89.9, 0, 50)[1:4:2], (-180.0, 180.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
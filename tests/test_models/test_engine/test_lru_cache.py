@@ -0,0 +1,51 @@
+#!/usr/bin/python3
+""" Module for testing the LRU cache"""
+import unittest
+
+from models.engine.lru_cache import LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+    """ Class to test LRUCache """
+
+    def setUp(self):
+        """ A cache of two values """
+        self.cache = LRUCache(2)
+        self.cache.put("a", 1)
+        self.cache.put("b", 2)
+
+    def test_hits_and_misses(self):
+        """ get() counts hits and misses """
+        self.assertEqual(self.cache.get("a"), 1)
+        self.assertIsNone(self.cache.get("z"))
+        self.assertEqual(self.cache.info(), {"hits": 1, "misses": 1,
+                                             "size": 2, "maxsize": 2})
+
+    def test_evicts_least_recently_used(self):
+        """ A full cache drops the value used longest ago """
+        self.cache.get("a")
+        self.cache.put("c", 3)
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("a"), 1)
+        self.assertEqual(len(self.cache), 2)
+
+    def test_discard_and_clear(self):
+        """ discard() drops one key and clear() every key """
+        self.cache.discard("a")
+        self.cache.discard("z")
+        self.assertIsNone(self.cache.get("a"))
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+
+    def test_put_skips_values_read_before_a_discard(self):
+        """ put() ignores a value read under an older version """
+        version = self.cache.version
+        self.cache.discard("a")
+        self.cache.put("a", 10, version)
+        self.assertIsNone(self.cache.get("a"))
+        self.cache.put("a", 11, self.cache.version)
+        self.assertEqual(self.cache.get("a"), 11)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+#!/usr/bin/python3
+""" Module for testing the storage metrics"""
+import unittest
+
+from models.engine.metrics import Histogram, Metrics, instrument
+
+
+class Store:
+    """ A stand-in storage with one plain and one generator method """
+
+    def all(self):
+        """ Returns two objects """
+        return {"a": 1, "b": 2}
+
+    def iter(self):
+        """ Yields three pairs """
+        yield from [("a", 1), ("b", 2), ("c", 3)]
+
+    def save(self):
+        """ Fails """
+        raise ValueError
+
+
+class TestMetrics(unittest.TestCase):
+    """ Class to test Histogram, Metrics and instrument """
+
+    def setUp(self):
+        """ An instrumented stand-in storage """
+        self.metrics = Metrics()
+        self.store = Store()
+        instrument(self.store, self.metrics)
+
+    def test_histogram(self):
+        """ Percentiles are bucket bounds capped by the maximum """
+        histogram = Histogram()
+        for seconds in [0.001] * 98 + [0.5, 2.0]:
+            histogram.observe(seconds)
+        data = histogram.to_dict()
+        self.assertEqual(data["count"], 100)
+        self.assertEqual(data["max"], 2.0)
+        self.assertAlmostEqual(data["mean"], 0.02598)
+        self.assertLess(data["p50"], 0.0011)
+        self.assertGreaterEqual(data["p50"], 0.001)
+        self.assertEqual(data["p99"], 0.524288)
+
+    def test_calls_and_sizes(self):
+        """ Calls are timed and all() results counted """
+        self.assertEqual(self.store.all(), {"a": 1, "b": 2})
+        self.store.all()
+        data = self.metrics.snapshot()
+        self.assertEqual(data["operations"]["all"]["count"], 2)
+        self.assertEqual(data["counters"], {"all.objects": 4})
+
+    def test_errors_are_timed(self):
+        """ A call that raises is still recorded """
+        with self.assertRaises(ValueError):
+            self.store.save()
+        self.assertEqual(self.metrics.snapshot()["operations"]["save"]
+                         ["count"], 1)
+
+    def test_iter(self):
+        """ A generator counts once, when closed, with its items """
+        pairs = self.store.iter()
+        next(pairs)
+        self.assertEqual(self.metrics.snapshot()["operations"], {})
+        pairs.close()
+        self.assertEqual(list(self.store.iter()), [("a", 1), ("b", 2),
+                                                   ("c", 3)])
+        data = self.metrics.snapshot()
+        self.assertEqual(data["operations"]["iter"]["count"], 2)
+        self.assertEqual(data["counters"], {"iter.objects": 4})
+
+    def test_reset(self):
+        """ reset() drops counters and histograms """
+        self.store.all()
+        self.metrics.reset()
+        self.assertEqual(self.metrics.snapshot(),
+                         {"counters": {}, "operations": {}})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/python3
+""" Module for testing the memory-mapped snapshot format"""
+import unittest
+
+import os
+import shutil
+import tempfile
+from models.engine import snapshot
+from models.engine.snapshot import Snapshot
+
+
+class TestSnapshot(unittest.TestCase):
+    """ Class to test snapshot.write and Snapshot """
+
+    def setUp(self):
+        """ A snapshot of three records written out of order """
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'file.json.snap')
+        self.records = [("User.b", '{"id": "b"}'),
+                        ("City.x", '{"id": "x", "name": "é"}'),
+                        ("User.a", '{"id": "a"}')]
+        self.assertEqual(snapshot.write(self.path, self.records), 3)
+        self.snap = Snapshot(self.path)
+
+    def tearDown(self):
+        """ Unmap and remove the file """
+        self.snap.close()
+        shutil.rmtree(self.tmp)
+
+    def test_counts(self):
+        """ The header counts records per class """
+        self.assertEqual(len(self.snap), 3)
+        self.assertEqual(self.snap.count("User"), 2)
+        self.assertEqual(self.snap.count("Place"), 0)
+        self.assertEqual(self.snap.counts, {"User": 2, "City": 1})
+
+    def test_get(self):
+        """ get() finds one record by key """
+        self.assertEqual(self.snap.get("City.x"), self.records[1][1])
+        self.assertEqual(self.snap.get("User.a"), '{"id": "a"}')
+        self.assertIsNone(self.snap.get("User.c"))
+        self.assertIsNone(self.snap.get("Zebra.a"))
+
+    def test_items_by_class(self):
+        """ items() yields one class in key order """
+        self.assertEqual([key for key, _ in self.snap.items("User")],
+                         ["User.a", "User.b"])
+        self.assertEqual([key for key, _ in self.snap.items()],
+                         ["City.x", "User.a", "User.b"])
+        self.assertEqual(list(self.snap.items("Use")), [])
+
+    def test_empty_and_invalid(self):
+        """ An empty snapshot opens; other files are rejected """
+        empty = os.path.join(self.tmp, 'empty.snap')
+        snapshot.write(empty, [])
+        with Snapshot(empty) as snap:
+            self.assertEqual(len(snap), 0)
+            self.assertIsNone(snap.get("User.a"))
+        other = os.path.join(self.tmp, 'file.json')
+        with open(other, 'w') as f:
+            f.write('{"User.a": {}}' + ' ' * 40)
+        with self.assertRaises(ValueError):
+            Snapshot(other)
+
+    def test_source(self):
+        """ The source given to write() is read back from the header """
+        self.assertIsNone(self.snap.source)
+        path = os.path.join(self.tmp, 'noted.snap')
+        snapshot.write(path, self.records, [[1, 2, 3], None])
+        with Snapshot(path) as snap:
+            self.assertEqual(snap.source, [[1, 2, 3], None])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+#!/usr/bin/python3
+""" Module for testing the sorted key list"""
+import unittest
+
+from models.engine.sorted_keys import SortedKeys
+
+
+class TestSortedKeys(unittest.TestCase):
+    """ Class to test SortedKeys """
+
+    def setUp(self):
+        """ Keys given out of order """
+        self.keys = SortedKeys(["b", "d", "a"])
+
+    def test_sorted_on_read(self):
+        """ Added keys are merged in order by keys() """
+        self.keys.add("c")
+        self.keys.add("0")
+        self.assertEqual(len(self.keys), 5)
+        self.assertEqual(self.keys.keys(), ["0", "a", "b", "c", "d"])
+
+    def test_remove(self):
+        """ remove() drops sorted and pending keys, ignores others """
+        self.keys.add("c")
+        self.keys.remove("c")
+        self.keys.remove("a")
+        self.keys.remove("z")
+        self.assertEqual(self.keys.keys(), ["b", "d"])
+
+    def test_version(self):
+        """ version changes with the keys only """
+        version = self.keys.version
+        self.keys.remove("z")
+        self.keys.keys()
+        self.assertEqual(self.keys.version, version)
+        self.keys.add("c")
+        self.assertNotEqual(self.keys.version, version)
+
+
+if __name__ == "__main__":
+    unittest.main()
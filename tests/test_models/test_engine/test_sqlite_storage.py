@@ -0,0 +1,269 @@
+#!/usr/bin/python3
+""" Module for testing the SQLite storage engine"""
+import unittest
+
+import os
+import sqlite3
+import tempfile
+from unittest.mock import patch
+from models.engine.sqlite_storage import SQLiteStorage
+from models.city import City
+from models.place import Place
+from models.state import State
+from models.user import User
+
+
+@unittest.skipIf(os.getenv('HBNB_TYPE_STORAGE') == 'db', "skip if not db")
+class TestSQLiteStorage(unittest.TestCase):
+    """ Class to test SQLiteStorage """
+
+    def setUp(self):
+        """ Fresh database in a temporary directory """
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'hbnb.db')
+        self.storage = SQLiteStorage(self.path)
+        self.storage.reload()
+
+    def tearDown(self):
+        """ Close and remove the database """
+        self.storage.close()
+        self.tmp.cleanup()
+
+    def fresh(self):
+        """ A second storage reading the same file """
+        storage = SQLiteStorage(self.path)
+        storage.reload()
+        self.addCleanup(storage.close)
+        return storage
+
+    def test_round_trip(self):
+        """ Saved objects are read back by another storage """
+        user = User(email="a@b.c", first_name="Betty")
+        self.storage.new(user)
+        self.storage.save()
+        loaded = self.fresh().all(User)['User.' + user.id]
+        self.assertIsInstance(loaded, User)
+        self.assertEqual(loaded.to_dict(), user.to_dict())
+
+    def test_all_and_count(self):
+        """ all() and count() per class and overall """
+        self.storage.new(User())
+        self.storage.new(State(name="CA"))
+        self.assertEqual(len(self.storage.all(User)), 1)
+        self.assertEqual(len(self.storage.all('State')), 1)
+        self.assertEqual(self.storage.count(), 2)
+        self.assertEqual(self.storage.count(User), 1)
+
+    def test_identity_map(self):
+        """ Reading a row twice returns the same instance """
+        state = State(name="CA")
+        self.storage.new(state)
+        self.storage.save()
+        other = self.fresh()
+        self.assertIs(other.all(State)['State.' + state.id],
+                      other.all(State)['State.' + state.id])
+
+    def test_get(self):
+        """ get() reads one row by primary key """
+        state = State(name="CA")
+        self.storage.new(state)
+        self.storage.save()
+        other = self.fresh()
+        loaded = other.get(State, state.id)
+        self.assertEqual(loaded.name, "CA")
+        self.assertIs(other.get('State', state.id), loaded)
+        self.assertIsNone(other.get(State, "nope"))
+        other.delete(loaded)
+        self.assertIsNone(other.get(State, state.id))
+
+    def test_filter(self):
+        """ filter() matches indexed columns in SQL and others in Python """
+        state = State(name="CA")
+        city = City(state_id=state.id, name="SF")
+        self.storage.new(city)
+        self.storage.new(City(state_id=state.id, name="LA"))
+        self.storage.new(City(state_id="other", name="SF"))
+        self.assertEqual(len(self.storage.filter(City, state_id=state.id)), 2)
+        self.assertEqual(self.storage.filter(City, state_id=state.id,
+                                             name="SF"),
+                         {'City.' + city.id: city})
+
+    def test_filter_uses_index(self):
+        """ __indexes__ attributes get an SQL index """
+        self.storage.new(City(state_id="x"))
+        self.storage.save()
+        conn = sqlite3.connect(self.path)
+        plan = conn.execute('EXPLAIN QUERY PLAN SELECT id FROM "City" '
+                            'WHERE state_id = ?', ("x",)).fetchall()
+        conn.close()
+        self.assertIn('City_state_id', str(plan))
+
+    def test_query(self):
+        """ query() runs column ranges in SQL """
+        cheap = Place(price_by_night=80, max_guest=4)
+        self.storage.new(cheap)
+        self.storage.new(Place(price_by_night=80, max_guest=2))
+        self.storage.new(Place(price_by_night=300, max_guest=6))
+        self.assertEqual(self.storage.query(Place, price_by_night=(0, 120),
+                                            max_guest=(4, None)),
+                         {'Place.' + cheap.id: cheap})
+        user = User(age=30)
+        self.storage.new(user)
+        self.assertEqual(list(self.storage.query(User, age=(18, None))),
+                         ['User.' + user.id])
+
+    def test_near(self):
+        """ Radius queries use the latitude and longitude columns """
+        paris = Place(latitude=48.8566, longitude=2.3522)
+        self.storage.new(paris)
+        self.storage.new(Place(latitude=51.5072, longitude=-0.1276))
+        self.assertEqual(list(self.storage.near(Place, 48.85, 2.35, 50)),
+                         ['Place.' + paris.id])
+        self.assertEqual(len(self.storage.nearest(Place, 48.85, 2.35, 2)), 2)
+        self.assertEqual(self.storage.near(User, 1, 2, 3), {})
+        self.assertEqual(self.storage.within('User', 0, 0, 1, 1), {})
+
+    def test_search(self):
+        """ search() ranks the rows whose text matches """
+        loft = Place(name="Sunny loft", description="A loft bed")
+        barn = Place(name="Old barn", description="Quiet and sunny")
+        self.storage.new(loft)
+        self.storage.new(barn)
+        self.storage.new(Place(name="Lofty"))
+        self.storage.save()
+        other = self.fresh()
+        self.assertEqual(list(other.search(Place, "loft sunny")),
+                         ['Place.' + loft.id, 'Place.' + barn.id])
+        self.assertEqual(len(other.search(Place, "loft*")), 2)
+        self.assertEqual(other.search(User, "loft"), {})
+
+    def test_iter_pages(self):
+        """ iter() pages by limit, offset and after in key order """
+        for _ in range(3):
+            self.storage.new(User())
+            self.storage.new(State())
+        self.storage.save()
+        keys = sorted(self.storage.all())
+        other = self.fresh()
+        self.assertEqual([key for key, _ in other.iter(batch_size=2)], keys)
+        self.assertEqual([key for key, _ in other.iter(limit=2, offset=2)],
+                         keys[2:4])
+        self.assertEqual([key for key, _ in other.iter(after=keys[3])],
+                         keys[4:])
+        self.assertEqual([key for key, _ in other.iter(User, offset=1)],
+                         keys[4:])
+
+    def test_iter_order(self):
+        """ order sorts by a column or by a JSON attribute """
+        places = [Place(price_by_night=price, name=name)
+                  for price, name in [(90, "b"), (50, "c"), (70, "a")]]
+        for place in places:
+            self.storage.new(place)
+        self.assertEqual([obj.price_by_night for _, obj in
+                          self.storage.iter(Place, order='price_by_night')],
+                         [50, 70, 90])
+        self.assertEqual([obj.name for _, obj in
+                          self.storage.iter(Place, order='-name', limit=2)],
+                         ["c", "b"])
+
+    def test_bulk_new(self):
+        """ bulk_new() commits every chunk without keeping the objects """
+        users = [User(first_name=str(i)) for i in range(5)]
+        self.assertEqual(self.storage.bulk_new(iter(users), chunk_size=2), 5)
+        self.assertEqual(self.fresh().count(User), 5)
+        self.assertIsNot(self.storage.all(User)['User.' + users[0].id],
+                         users[0])
+
+    def test_update_writes_one_row(self):
+        """ save() only writes the objects passed to new() since """
+        users = [User(first_name=str(i)) for i in range(3)]
+        for user in users:
+            self.storage.new(user)
+        self.storage.save()
+        users[0].first_name = "Betty"
+        self.storage.new(users[0])
+        self.storage.save()
+        loaded = self.fresh().all(User)
+        self.assertEqual(loaded['User.' + users[0].id].first_name, "Betty")
+        self.assertEqual(loaded['User.' + users[1].id].first_name, "1")
+
+    def test_delete(self):
+        """ delete() removes the row """
+        user = User()
+        self.storage.new(user)
+        self.storage.save()
+        self.storage.delete(user)
+        self.storage.save()
+        self.assertEqual(self.storage.count(User), 0)
+        self.assertEqual(self.fresh().count(User), 0)
+
+    def test_metrics(self):
+        """ HBNB_METRICS times operations and counts statements """
+        self.assertEqual(self.storage.metrics(), {})
+        with patch.dict(os.environ, {"HBNB_METRICS": "1"}):
+            storage = SQLiteStorage(self.path)
+        self.addCleanup(storage.close)
+        storage.reload()
+        storage.new(User())
+        storage.save()
+        self.assertEqual(storage.count(User), 1)
+        data = storage.metrics()
+        self.assertEqual(data["operations"]["count"]["count"], 1)
+        self.assertGreater(data["counters"]["statements"], 0)
+
+    def test_wal_mode(self):
+        """ The database runs in write-ahead logging mode """
+        conn = sqlite3.connect(self.path)
+        mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+        conn.close()
+        self.assertEqual(mode, 'wal')
+
+    def test_batch_rollback(self):
+        """ A failed batch leaves the database untouched """
+        kept = User()
+        self.storage.new(kept)
+        self.storage.save()
+        with self.assertRaises(ValueError):
+            with self.storage.batch():
+                self.storage.new(User())
+                self.storage.save()
+                raise ValueError
+        self.assertEqual(list(self.storage.all(User)), ['User.' + kept.id])
+
+    def test_batch_commits_once(self):
+        """ Rows saved inside a batch are committed when it ends """
+        with self.storage.batch():
+            self.storage.new(User())
+            self.storage.save()
+            self.assertEqual(self.fresh().count(User), 0)
+        self.assertEqual(self.fresh().count(User), 1)
+
+    def test_checkpoint_commits_inside_batch(self):
+        """ checkpoint() commits the rows saved so far, keeping the batch """
+        with self.storage.batch():
+            self.storage.new(User())
+            self.storage.save()
+            self.storage.checkpoint()
+            self.assertEqual(self.fresh().count(User), 1)
+            self.storage.new(User())
+            self.storage.save()
+            self.assertEqual(self.fresh().count(User), 1)
+        self.assertEqual(self.fresh().count(User), 2)
+
+    def test_new_column_is_backfilled(self):
+        """ reload() adds missing columns and fills them from the JSON """
+        place = Place(price_by_night=90)
+        self.storage.new(place)
+        self.storage.save()
+        self.storage.close()
+        conn = sqlite3.connect(self.path)
+        conn.execute('ALTER TABLE "Place" DROP COLUMN price_by_night')
+        conn.commit()
+        conn.close()
+        storage = self.fresh()
+        self.assertEqual(list(storage.query(Place, price_by_night=(80, 100))),
+                         ['Place.' + place.id])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+#!/usr/bin/python3
+""" Module for testing the full-text index"""
+import unittest
+
+import json
+from models.engine.text_index import TextIndex, tokenize
+from models.place import Place
+
+
+class TestTextIndex(unittest.TestCase):
+    """ Class to test TextIndex """
+
+    def setUp(self):
+        """ Three places indexed by name and description """
+        self.index = TextIndex(("name", "description"))
+        self.places = {
+            "a": Place(name="Sunny loft", description="A loft, a loft bed"),
+            "b": Place(name="Old barn", description="Quiet and sunny"),
+            "c": Place(name="Cabin", description=None),
+        }
+        for key, place in self.places.items():
+            self.index.set(key, place)
+
+    def keys(self, query, **kwargs):
+        """ Returns the keys search() ranks for query """
+        return [key for _, key in self.index.search(query, **kwargs)]
+
+    def test_tokenize(self):
+        """ Words are lowercase runs of letters and digits """
+        self.assertEqual(tokenize("Loft, 2 BEDS!"), ["loft", "2", "beds"])
+
+    def test_ranking(self):
+        """ More occurrences and shorter texts rank first """
+        self.assertEqual(self.keys("loft"), ["a"])
+        self.assertEqual(self.keys("sunny LOFT"), ["a", "b"])
+        self.assertEqual(self.keys("sunny", limit=1), ["b"])
+        self.assertEqual(self.keys("nothing"), [])
+
+    def test_prefix(self):
+        """ A word ending with * matches the words it starts """
+        self.assertEqual(self.keys("ca*"), ["c"])
+        self.assertEqual(sorted(self.keys("b*")), ["a", "b"])
+
+    def test_set_and_remove(self):
+        """ set() replaces the words of a key and remove() drops them """
+        self.places["c"].name = "Loft"
+        self.index.set("c", self.places["c"])
+        self.assertEqual(sorted(self.keys("loft")), ["a", "c"])
+        self.assertEqual(self.keys("cab*"), [])
+        self.index.remove("a")
+        self.index.remove("missing")
+        self.assertEqual(self.keys("loft"), ["c"])
+        self.assertEqual(len(self.index), 2)
+
+    def test_entry_and_put(self):
+        """ entry() returns what put() needs to copy a key """
+        self.assertEqual(self.index.entry("a"),
+                         (7, {"sunny": 1, "loft": 3, "a": 2, "bed": 1}))
+        self.assertIsNone(self.index.entry("missing"))
+        index = TextIndex(("name", "description"))
+        for key in self.places:
+            index.put(key, *self.index.entry(key))
+        self.assertEqual(index.search("sunny loft"),
+                         self.index.search("sunny loft"))
+
+    def test_round_trip(self):
+        """ from_dict() restores an index that can still change """
+        data = json.loads(json.dumps(self.index.to_dict()))
+        index = TextIndex.from_dict(data)
+        self.assertEqual(index.search("sunny loft"),
+                         self.index.search("sunny loft"))
+        index.remove("a")
+        self.assertEqual(index.search("loft"), [])
+        self.assertEqual(index.total, self.index.total - 7)
+
+
+if __name__ == "__main__":
+    unittest.main()